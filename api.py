@@ -0,0 +1,260 @@
+"""Local HTTP API serving the Q1–Q5 aggregates as JSON or Arrow.
+
+Every aggregate DataFrame of the cached dataset gets an endpoint; nested ones
+are split by key:
+
+    GET /api/                                   index: endpoints, rows, ETags
+    GET /api/state_cancellations                Q1
+    GET /api/institution_cancellations          Q2
+    GET /api/budget_rollups/<level>/<metric>    Q3 (e.g. /institution/total)
+    GET /api/top_words                          Q4
+    GET /api/q5_counts                          Q5 (also row_totals, totals)
+
+Format is JSON records by default; append `.arrow`, pass `?format=arrow` or
+send `Accept: application/vnd.apache.arrow.stream` for an Arrow IPC stream.
+
+All bodies (both formats, plain and gzip) are serialized once per dataset
+version, so a request is a dict lookup plus a socket write. ETags are strong
+and derived from the dataset version: a client sending `If-None-Match` gets a
+304 until the sources change. A background thread polls `dataset_version()`
+and swaps in a freshly loaded catalog when it changes; requests keep being
+served from the old one meanwhile.
+
+    python api.py [--host 127.0.0.1] [--port 8502] [--poll 30]
+"""
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+import pyarrow as pa
+
+from pipeline import dataset_version, load_dataset
+
+PREFIX = "/api/"
+FORMATS = {
+    "json": "application/json",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+# bodies smaller than this are not worth compressing
+MIN_GZIP_BYTES = 512
+
+
+def aggregate_frames(aggregates):
+    """{endpoint path: DataFrame} for every aggregate, nested mappings flattened."""
+    frames = {}
+
+    def walk(path, value):
+        if isinstance(value, pd.DataFrame):
+            frames[path] = value
+        elif hasattr(value, "items"):
+            for key, item in value.items():
+                parts = key if isinstance(key, tuple) else (key,)
+                walk("/".join([path, *map(str, parts)]), item)
+
+    for name, value in aggregates.items():
+        walk(name, value)
+    return frames
+
+
+def serialize(frame, fmt):
+    if fmt == "arrow":
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue()
+    return frame.to_json(orient="records", date_format="iso").encode()
+
+
+class Representation:
+    """One pre-serialized body (plus its gzip variant) with strong ETags."""
+
+    def __init__(self, body, content_type, etag):
+        self.body = body
+        self.content_type = content_type
+        self.etag = f'"{etag}"'
+        self.gzip_body = gzip.compress(body, mtime=0) if len(body) >= MIN_GZIP_BYTES else None
+        self.gzip_etag = f'"{etag}-gz"'
+
+
+class Catalog:
+    """Every endpoint of one dataset version, serialized up front."""
+
+    def __init__(self, dataset):
+        self.version = dataset.version
+        self.loaded_at = time.time()
+        self.representations = {}
+        index = []
+        for path, frame in aggregate_frames(dataset.aggregates).items():
+            for fmt, content_type in FORMATS.items():
+                etag = hashlib.sha1(f"{self.version}|{path}|{fmt}".encode()).hexdigest()[:24]
+                self.representations[(path, fmt)] = Representation(serialize(frame, fmt), content_type, etag)
+            index.append({
+                "path": PREFIX + path,
+                "rows": len(frame),
+                "columns": list(map(str, frame.columns)),
+                "etag": self.representations[(path, "json")].etag,
+            })
+        body = json.dumps({"version": self.version, "endpoints": index}, indent=1).encode()
+        etag = hashlib.sha1(f"{self.version}|index".encode()).hexdigest()[:24]
+        self.representations[("", "json")] = Representation(body, FORMATS["json"], etag)
+
+
+class AggregateService:
+    """Holds the current Catalog and replaces it when the sources change."""
+
+    def __init__(self, poll_seconds=30):
+        self.poll_seconds = poll_seconds
+        self.catalog = Catalog(load_dataset())
+        self._stop = threading.Event()
+        self._poller = None
+
+    def refresh(self):
+        """Reload if the dataset version changed; returns True when it did."""
+        if dataset_version() == self.catalog.version:
+            return False
+        # build the new catalog completely before swapping the reference
+        self.catalog = Catalog(load_dataset())
+        return True
+
+    def _poll(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                if self.refresh():
+                    print(f"Reloaded aggregates (version {self.catalog.version})")
+            except Exception as e:
+                print(f"Refresh failed, still serving {self.catalog.version}: {e}")
+
+    def start_polling(self):
+        if self.poll_seconds and self._poller is None:
+            self._poller = threading.Thread(target=self._poll, name="api-refresh", daemon=True)
+            self._poller.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+def _etag_matches(header, etags):
+    """If-None-Match uses weak comparison, so W/ prefixes are ignored."""
+    if header.strip() == "*":
+        return True
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return bool(candidates & set(etags))
+
+
+def _accepts_gzip(header):
+    for part in header.split(","):
+        coding, _, q = part.strip().partition(";")
+        if coding.strip().lower() in ("gzip", "*"):
+            return q.strip().replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+class AggregateHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "NSFAggregates/1.0"
+
+    def do_GET(self):
+        self._respond(head=False)
+
+    def do_HEAD(self):
+        self._respond(head=True)
+
+    def _respond(self, head):
+        catalog = self.server.service.catalog
+        url = urlsplit(self.path)
+        if not (url.path + "/").startswith(PREFIX):
+            return self._error(HTTPStatus.NOT_FOUND, "unknown path", head)
+        path = url.path[len(PREFIX):].strip("/")
+        fmt = parse_qs(url.query).get("format", [None])[0]
+        for name in FORMATS:
+            if path.endswith("." + name):
+                path, fmt = path[: -len(name) - 1], name
+        if fmt is None:
+            fmt = "arrow" if FORMATS["arrow"] in self.headers.get("Accept", "") else "json"
+        if fmt not in FORMATS:
+            return self._error(HTTPStatus.BAD_REQUEST, f"format must be one of {sorted(FORMATS)}", head)
+        rep = catalog.representations.get((path, "json" if path == "" else fmt))
+        if rep is None:
+            return self._error(HTTPStatus.NOT_FOUND, f"no aggregate {path!r}; see {PREFIX}", head)
+
+        use_gzip = rep.gzip_body is not None and _accepts_gzip(self.headers.get("Accept-Encoding", ""))
+        etag = rep.gzip_etag if use_gzip else rep.etag
+        if _etag_matches(self.headers.get("If-None-Match", ""), [rep.etag, rep.gzip_etag]):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self._common_headers(etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = rep.gzip_body if use_gzip else rep.body
+        self.send_response(HTTPStatus.OK)
+        self._common_headers(etag)
+        self.send_header("Content-Type", rep.content_type)
+        if use_gzip:
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def _common_headers(self, etag):
+        self.send_header("ETag", etag)
+        # clients may store responses but must revalidate (cheap: a 304)
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Vary", "Accept, Accept-Encoding")
+        self.send_header("X-Dataset-Version", self.server.service.catalog.version)
+
+    def _error(self, status, message, head):
+        body = json.dumps({"error": message}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", FORMATS["json"])
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+def make_server(service, host="127.0.0.1", port=8502, verbose=False):
+    server = ThreadingHTTPServer((host, port), AggregateHandler)
+    server.daemon_threads = True
+    server.service = service
+    server.verbose = verbose
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the dashboard aggregates over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    parser.add_argument("--poll", type=float, default=30, help="seconds between source checks (0 disables)")
+    parser.add_argument("--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+
+    service = AggregateService(args.poll)
+    service.start_polling()
+    server = make_server(service, args.host, args.port, args.verbose)
+    print(f"Serving {len(service.catalog.representations)} representations "
+          f"(version {service.catalog.version}) on http://{args.host}:{args.port}{PREFIX}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.stop()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
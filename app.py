@@ -1,202 +1,143 @@
+import os
+
 import streamlit as st  
 import altair as alt
-import pandas as pd
 from vega_datasets import data
 
+from budget import ALL_STATES, BUDGET_LEVELS, BUDGET_METRICS, budget_view
+from density import density_splom_chart
+from geo import choose_tier, join_values, load_tier, tiers_available
+from pipeline import DatasetBuild, dataset_version, reinstated_outcome
+from server_transforms import pre_transform_spec
+from snapshots import SnapshotStore, diff_snapshots
+from spec_cache import DEFAULT_CACHE_DIR, SpecCache, spec_key
+from text_store import source_fingerprint
+from watchlists import DEFAULT_WATCHLIST_DIR, watchlist_files
 
 # Optional: avoid Altair's 5k-row limit
 alt.data_transformers.disable_max_rows()
 
-# === Load all datasets (same as notebook) ===
-nsf_data = pd.read_csv("data/raw/nsf_terminations_airtable_copy.csv")
-cruz_data = pd.read_csv("data/raw/cruz_list_copy.csv", sep=";")
-flagged_words = pd.read_csv("data/raw/flagged_words_trump_admin_copy.csv")
-
-columns_to_remove = [
-    "usa_start_date", "usa_end_date", "nsf_start_date", "nsf_end_date",
-    "status", "suspended", "nsf_url", "usaspending_url",
-    "org_city", "award_type", "nsf_primary_program", "record_sha1"
-]
-
-cleaned_nsf_data = nsf_data.drop(columns=columns_to_remove, errors="ignore")
-
-# dates
-if "termination_date" in cleaned_nsf_data.columns:
-    cleaned_nsf_data["termination_date"] = pd.to_datetime(
-        cleaned_nsf_data["termination_date"], errors="coerce"
-    )
-
-# booleans – adapt if you have a couple more in your notebook
-bool_cols = ["terminated", "reinstated", "in_cruz_list"]
-for col in bool_cols:
-    if col in cleaned_nsf_data.columns:
-        cleaned_nsf_data[col] = cleaned_nsf_data[col].astype(bool)
-
-# numerics
-numeric_columns = [
-    "nsf_total_budget", "nsf_obligated", "usaspending_obligated",
-    "usaspending_outlaid", "estimated_budget",
-    "estimated_outlays", "estimated_remaining"
-]
-for col in numeric_columns:
-    if col in cleaned_nsf_data.columns:
-        cleaned_nsf_data[col] = pd.to_numeric(
-            cleaned_nsf_data[col], errors="coerce"
-        )
-
-# convenience subset used in several questions
-terminated_grants = cleaned_nsf_data[cleaned_nsf_data["terminated"] == True]
-
-# ---------------------
-
-# Q1 data prep – cancellations by state
-terminated_grants = cleaned_nsf_data[cleaned_nsf_data['terminated'] == True]
-
-state_cancellations = (
-    terminated_grants['org_state'].value_counts().reset_index()
-)
-state_cancellations.columns = ['state', 'cancelled_grants']
-
-import re
-
-# === Prepare flagged words and add counts to cleaned_nsf_data ===
-flagged_words_clean = [
-    str(w).strip().lower().strip(",")
-    for w in flagged_words["flagged_word"]
-]
-
-def count_flagged_words(text, words):
-    """Count occurrences of flagged words in a text (word-boundary aware)."""
-    if pd.isna(text):
-        return 0
-    t = str(text).lower()
-    count = 0
-    for w in words:
-        # count how many times this word appears as a whole word
-        matches = re.findall(rf"\b{re.escape(w)}\b", t)
-        count += len(matches)
-    return count
-
-# Add flagged word counts to the main dataset
-if "abstract" in cleaned_nsf_data.columns:
-    cleaned_nsf_data["flagged_words_count"] = cleaned_nsf_data["abstract"].apply(
-        lambda x: count_flagged_words(x, flagged_words_clean)
-    )
-
-if "project_title" in cleaned_nsf_data.columns:
-    cleaned_nsf_data["title_flagged_words_count"] = cleaned_nsf_data["project_title"].apply(
-        lambda x: count_flagged_words(x, flagged_words_clean)
-    )
-
-
-import numpy as np
-
-# === Merge Cruz list into main NSF dataset ===
-if "grant_id" in cleaned_nsf_data.columns and "grant_number" in cruz_data.columns:
-    cruz_renamed = cruz_data.rename(columns={"grant_number": "grant_id"})
-    cleaned_nsf_data = cleaned_nsf_data.merge(
-        cruz_renamed[["grant_id", "in_cruz_list"]],
-        on="grant_id",
-        how="left"
-    )
-
-# If merge failed for some reason, create a safe default column
-if "in_cruz_list" not in cleaned_nsf_data.columns:
-    cleaned_nsf_data["in_cruz_list"] = False
-
-# Normalize in_cruz_list: fill NaNs and cast to bool
-cleaned_nsf_data["in_cruz_list"] = (
-    cleaned_nsf_data["in_cruz_list"]
-    .fillna(False)
-    .astype(bool)
-)
-
-
-
-
+# Evaluate Vega-Lite transforms server-side (set VI_LAB_SERVER_TRANSFORMS=0 to
+# leave them to the browser)
+SERVER_TRANSFORMS = os.environ.get("VI_LAB_SERVER_TRANSFORMS", "1") != "0"
+
+# === Shared dataset ===
+# The cleaned grants and every aggregate are computed once per server process
+# and shared read-only by all sessions (see pipeline.py); a session only holds
+# its own widget selections. The build runs in a background thread and
+# publishes aggregates stage by stage, so each panel is drawn as soon as its
+# own inputs exist instead of after the slowest one.
+@st.cache_resource(max_entries=1)
+def get_dataset_build(version):
+    return DatasetBuild()
+
+
+@st.cache_resource(max_entries=1)
+def get_dataset(version):
+    build = get_dataset_build(version)
+    shared = build.result()
+    print("=== Source load timings ===")
+    print(shared.load_timings.to_string(index=False))
+    print("=== Aggregates ready after (s) ===")
+    print(build.ready_after)
+    return shared
+
+
+build = get_dataset_build(dataset_version())
+if build.error is not None:
+    # the build failed (and re-raised in the session that hit it): start over
+    # instead of re-raising the cached error in every session from now on
+    get_dataset_build.clear()
+    build = get_dataset_build(dataset_version())
+# Q1–Q3 and the sidebar only need the first stage (cleaning + core aggregates)
+CORE_AGGREGATES = ["state_cancellations", "state_cancellations_map", "geometry",
+                   "institution_cancellations", "state_institution_cancellations",
+                   "budget_rollups", "state_budget_rollups"]
+build.wait(CORE_AGGREGATES)
+agg = build.aggregates()
 
 # Q1
-import altair as alt
-from vega_datasets import data
-
-# Load US topojson
-states = alt.topo_feature(data.us_10m.url, "states")
-
-# FIPS mapping
-state_fips = {
-    "AL": 1, "AK": 2, "AZ": 4, "AR": 5, "CA": 6, "CO": 8, "CT": 9, "DE": 10, "DC": 11,
-    "FL": 12, "GA": 13, "HI": 15, "ID": 16, "IL": 17, "IN": 18, "IA": 19, "KS": 20,
-    "KY": 21, "LA": 22, "ME": 23, "MD": 24, "MA": 25, "MI": 26, "MN": 27, "MS": 28,
-    "MO": 29, "MT": 30, "NE": 31, "NV": 32, "NH": 33, "NJ": 34, "NM": 35, "NY": 36,
-    "NC": 37, "ND": 38, "OH": 39, "OK": 40, "OR": 41, "PA": 42, "RI": 44, "SC": 45,
-    "SD": 46, "TN": 47, "TX": 48, "UT": 49, "VT": 50, "VA": 51, "WA": 53, "WV": 54,
-    "WI": 55, "WY": 56
-}
-
-# Create data copy and map FIPS IDs
-state_cancellations_map = state_cancellations.copy()
-state_cancellations_map["id"] = state_cancellations_map["state"].map(state_fips)
-state_cancellations_map["cancelled_grants"] = state_cancellations_map["cancelled_grants"].fillna(0)
-
-
-chart_map2 = (
-    alt.Chart(states)
-    .mark_geoshape(stroke="white")
-    .transform_lookup(
-        lookup="id",
-        from_=alt.LookupData(
-            state_cancellations_map, "id", ["state", "cancelled_grants"]
-        ),
-    )
-    .encode(
-        color=alt.Color(
-            "cancelled_grants:Q",
-            title="Cancelled Grants",
-            scale=alt.Scale(
-                scheme="blues",
-                domain=[1, 500],        
-                type="sqrt",            
-                interpolate="lab"
+# Cancellations per state with FIPS IDs (precomputed in pipeline.py)
+state_cancellations = agg["state_cancellations"]
+
+
+def state_map(agg, width, height, pick=None):
+    """Q1 choropleth at the geometry tier that fits `width` (see geo.py).
+
+    With a `pick` selection, clicking a state selects it.
+    """
+    state_cancellations_map = agg["state_cancellations_map"]
+    tier = choose_tier(width) if tiers_available() else None
+    if tier is not None or agg.get("geometry") is not None:
+        # coarse state tier inline (the loader's copy when it is that tier)
+        topology = load_tier(tier) if tier is not None else agg["geometry"]
+        topology = join_values(topology, "states", state_cancellations_map, "id", ["state", "cancelled_grants"])
+        source = alt.Data(values=topology, format=alt.DataFormat(type="topojson", feature="states"))
+        field = "properties.cancelled_grants"
+    else:
+        # no local geometry: fall back to the CDN file and a browser-side lookup
+        source = None
+        field = "cancelled_grants"
+
+    chart = alt.Chart(source if source is not None else alt.topo_feature(data.us_10m.url, "states"))
+    if source is None:
+        chart = chart.transform_lookup(
+            lookup="id",
+            from_=alt.LookupData(
+                state_cancellations_map, "id", ["state", "cancelled_grants"]
             ),
-        ),
-        tooltip=[
-            alt.Tooltip("state:N", title="State"),
-            alt.Tooltip("cancelled_grants:Q", title="Cancelled Grants"),
-        ],
+        )
+    state_field = "properties.state" if source is not None else "state"
+    chart = (
+        chart
+        .mark_geoshape(stroke="white")
+        .encode(
+            color=alt.Color(
+                f"{field}:Q",
+                title="Cancelled Grants",
+                scale=alt.Scale(
+                    scheme="blues",
+                    domain=[1, 500],
+                    type="sqrt",
+                    interpolate="lab"
+                ),
+            ),
+            tooltip=[
+                alt.Tooltip(f"{state_field}:N", title="State"),
+                alt.Tooltip(f"{field}:Q", title="Cancelled Grants"),
+            ],
+        )
+        .project(type="albersUsa")
+        .properties(width=width, height=height)
     )
-    .project(type="albersUsa")
-    .properties(width=560, height=460)
-)
-
-
-top10_states = state_cancellations.head(10)
-
-chart_bar = (
-    alt.Chart(top10_states)
-    .mark_bar()
-    .encode(
-        y=alt.Y("state:N", sort="-x", title=""),
-        x=alt.X("cancelled_grants:Q", title="Cancelled Grants"),
-        color=alt.Color(
-            "cancelled_grants:Q",
-            scale=alt.Scale(
-                scheme="blues",
-                domain=[1, 500],
-                type="sqrt",
-                interpolate="lab"
+    if pick is None:
+        return chart
+    if source is not None:
+        chart = chart.transform_calculate(state="datum.properties.state")
+    return chart.add_params(pick).encode(opacity=alt.condition(pick, alt.value(1), alt.value(0.4)))
+
+
+def top_states_chart(top10_states):
+    return (
+        alt.Chart(top10_states)
+        .mark_bar()
+        .encode(
+            y=alt.Y("state:N", sort="-x", title=""),
+            x=alt.X("cancelled_grants:Q", title="Cancelled Grants"),
+            color=alt.Color(
+                "cancelled_grants:Q",
+                scale=alt.Scale(
+                    scheme="blues",
+                    domain=[1, 500],
+                    type="sqrt",
+                    interpolate="lab"
+                ),
+                legend=None
             ),
-            legend=None
-        ),
-        tooltip=["state", "cancelled_grants"]
+            tooltip=["state", "cancelled_grants"]
+        )
+        .properties(width=280, height=460, title="Top 10 States")
     )
-    .properties(width=280, height=460, title="Top 10 States")
-)
-
-combined_chart = (chart_map2 | chart_bar).properties(
-    title="NSF Grant Cancellations by U.S. State (Smooth Blue Gradient — No White States)"
-)
-
-Q1 = combined_chart
 #Q1
 
 # Q2
@@ -204,8 +145,7 @@ Q1 = combined_chart
 print("=== Q2: Institutions Most Affected by Number of Cancelled Grants ===")
 
 # Count cancellations by institution
-institution_cancellations = terminated_grants['org_name'].value_counts().reset_index()
-institution_cancellations.columns = ['institution', 'cancelled_grants']
+institution_cancellations = agg["institution_cancellations"]
 
 print(f"Total institutions with cancelled grants: {len(institution_cancellations)}")
 print("\nTop 15 institutions by number of cancelled grants:")
@@ -217,231 +157,140 @@ print(f"Mean cancelled grants per institution: {institution_cancellations['cance
 print(f"Median cancelled grants per institution: {institution_cancellations['cancelled_grants'].median():.2f}")
 print(f"Max cancelled grants by single institution: {institution_cancellations['cancelled_grants'].max()}")
 
+
 # Create visualization
-chart_q2 = alt.Chart(institution_cancellations.head(20)).mark_bar().encode(
-    x=alt.X('cancelled_grants:Q', title='Number of Cancelled Grants'),
-    y=alt.Y('institution:N', sort='-x', title='Institution'),
-    color=alt.Color(
-    'cancelled_grants:Q',
-    scale=alt.Scale(scheme='blues'),
-    legend=alt.Legend(title='Cancelled Grants')
-),
-    tooltip=['institution', 'cancelled_grants']
-).properties(
-    width=700,
-    height=500,
-    title='Top 20 Institutions by Number of Cancelled NSF Grants'
-).interactive()
-
-Q2 = chart_q2
+def institutions_chart(top_institutions):
+    return alt.Chart(top_institutions).mark_bar().encode(
+        x=alt.X('cancelled_grants:Q', title='Number of Cancelled Grants'),
+        y=alt.Y('institution:N', sort='-x', title='Institution'),
+        color=alt.Color(
+        'cancelled_grants:Q',
+        scale=alt.Scale(scheme='blues'),
+        legend=alt.Legend(title='Cancelled Grants')
+    ),
+        tooltip=['institution', 'cancelled_grants']
+    ).properties(
+        width=700,
+        height=500,
+        title='Top 20 Institutions by Number of Cancelled NSF Grants'
+    ).add_params(alt.selection_interval(bind="scales", name="q2_zoom"))
 #Q2
 
 # Q3
 
-# Q3: Institutions most affected by budget losses
+# Q3: Institutions (or states / directorates) most affected by budget losses
 print("=== Q3: Institutions Most Affected by Budget Losses ===")
 
-# Calculate budget impact by institution
-budget_impact = terminated_grants.groupby('org_name').agg({
-    'nsf_total_budget': ['sum', 'count', 'mean'],
-    'nsf_obligated': 'sum',
-    'estimated_budget': 'sum'
-}).round(2)
-
-# Flatten column names
-budget_impact.columns = ['total_budget_sum', 'grant_count', 'avg_budget', 'obligated_sum', 'estimated_sum']
-budget_impact = budget_impact.reset_index()
+# Every (level, metric) rollup is precomputed in pipeline.py (see budget.py);
+# switching here only selects a table
+budget_rollups = agg["budget_rollups"]
+LEVEL_TITLES = {"institution": "Institutions", "state": "States", "directorate": "Directorates"}
+budget_level = st.sidebar.selectbox(
+    "Budget rollup",
+    [level for level in BUDGET_LEVELS if (level, "total") in budget_rollups],
+    format_func=lambda level: LEVEL_TITLES[level],
+)
+budget_metric = st.sidebar.selectbox(
+    "Budget metric", list(BUDGET_METRICS), format_func=lambda m: BUDGET_METRICS[m]["label"]
+)
+metric_label = BUDGET_METRICS[budget_metric]["label"]
+level_title = LEVEL_TITLES[budget_level]
+budget_impact = budget_view(budget_rollups, budget_level, budget_metric)
 
-# Use total budget as primary metric, fill with estimated if missing
-budget_impact['budget_impact'] = budget_impact['total_budget_sum'].fillna(budget_impact['estimated_sum'])
-budget_impact = budget_impact[budget_impact['budget_impact'] > 0].sort_values('budget_impact', ascending=False)
+print(f"{level_title} with budget data: {len(budget_impact)}")
+print(f"\nTop 15 {level_title.lower()} by {metric_label.lower()} (in dollars):")
+print(budget_impact[['name', 'value', 'grant_count', 'coverage']].head(15))
 
-print(f"Institutions with budget data: {len(budget_impact)}")
-print(f"\nTop 15 institutions by budget impact (in dollars):")
-print(budget_impact[['org_name', 'budget_impact', 'grant_count']].head(15))
+# Calculate total budget impact (grants with no reported value are left out, see coverage)
+overall = budget_rollups[("all", budget_metric)].iloc[0]
+print(f"\nTotal {metric_label.lower()} across all cancelled grants: ${overall['value']:,.0f} "
+      f"({overall['reported']} of {overall['grant_count']} grants reported)")
 
-# Calculate total budget impact
-total_budget_impact = budget_impact['budget_impact'].sum()
-print(f"\nTotal budget impact across all institutions: ${total_budget_impact:,.0f}")
 
 # Create visualization
-chart_q3 = alt.Chart(budget_impact.head(20)).mark_bar().encode(
-    x=alt.X('budget_impact:Q', title='Total Budget Impact ($)', axis=alt.Axis(format='$,.0f')),
-    y=alt.Y('org_name:N', sort='-x', title='Institution'),
-    color=alt.Color(
-    'budget_impact:Q',
-    scale=alt.Scale(scheme='blues'),
-    legend=alt.Legend(title='Budget Impact ($)', format='$,.0f')
-),
-    tooltip=[
-        alt.Tooltip('org_name', title='Institution'),
-        alt.Tooltip('budget_impact:Q', title='Budget Impact', format='$,.0f'),
-        alt.Tooltip('grant_count:Q', title='Number of Grants')
-    ]
-).properties(
-    width=700,
-    height=500,
-    title='Top 20 Institutions by Total Budget Impact from Cancelled NSF Grants'
-).interactive()
-
-Q3 = chart_q3
+def budget_chart(top_budgets):
+    return alt.Chart(top_budgets).mark_bar().encode(
+        x=alt.X('value:Q', title=f'{metric_label} ($)', axis=alt.Axis(format='$,.0f')),
+        y=alt.Y('name:N', sort='-x', title=budget_level.title()),
+        color=alt.Color(
+        'value:Q',
+        scale=alt.Scale(scheme='blues'),
+        legend=alt.Legend(title=f'{metric_label} ($)', format='$,.0f')
+    ),
+        tooltip=[
+            alt.Tooltip('name', title=budget_level.title()),
+            alt.Tooltip('value:Q', title=metric_label, format='$,.0f'),
+            alt.Tooltip('grant_count:Q', title='Number of Grants'),
+            alt.Tooltip('coverage:Q', title='Grants with a value', format='.0%')
+        ]
+    ).properties(
+        width=700,
+        height=500,
+        title=f'Top 20 {level_title} by {metric_label} of Cancelled NSF Grants'
+    ).add_params(alt.selection_interval(bind="scales", name="q3_zoom"))
 ##Q3
 
-# Q4
-# Q4 Re-redesgin : Frequency polygon (line) for the left chart
-import numpy as np
-import pandas as pd
-import altair as alt
+# Q4 (Redesign): Distribution + Top Flagged Words in Cancelled Grants
+# Collaborative awards repeat one abstract across institutions (see dedup.py);
+# optionally count each project once (applies once the text stage is ready)
+dedup_projects = st.sidebar.checkbox("Count collaborative awards once")
 
-df_q4 = cleaned_nsf_data.copy()
-vals = df_q4["flagged_words_count"].fillna(0).clip(upper=40)
-
-# 1-bin per integer count (0..40)
-bins = np.arange(0, 41, 1)
-hist, edges = np.histogram(vals, bins=bins)
-
-df_bins = pd.DataFrame({
-    "bin_start": edges[:-1],
-    "bin_end": edges[1:],
-    "count": hist
-})
-df_bins["mid"] = (df_bins["bin_start"] + df_bins["bin_end"]) / 2  # frequency polygon x
-
-# frequency polygon (points + line through bin midpoints)
-chart_q4_hist = (
-    alt.Chart(df_bins)
-    .mark_line(point=True)
-    .encode(
-        x=alt.X("mid:Q", title="Number of Flagged Words per Grant"),
-        y=alt.Y("count:Q", title="Number of Grants"),
-    )
-    .properties(width=350, height=250,
-                title="Distribution of Flagged Word Counts in Cancelled Grants (Frequency Polygon)")
-)
-# Q4 (Redesign)
 
-import altair as alt
-import pandas as pd
-from collections import Counter
-import re
+def q4_suffix(agg):
+    return "_dedup" if dedup_projects and "top_words_dedup" in agg else ""
 
-print("=== Q4 (Redesign): Distribution + Top Flagged Words in Cancelled Grants ===")
-
-# Base dataset (already filtered to terminated grants)
-df_q4 = cleaned_nsf_data.copy()
-df_q4["flagged_words_count"] = df_q4["flagged_words_count"].fillna(0)
 
 # Left panel — distribution of how many flagged words appear per cancelled grant
-chart_q4_hist = (
-    alt.Chart(df_q4)
-    .transform_filter(alt.datum.flagged_words_count < 40)
-    .mark_bar(opacity=0.8)
-    .encode(
-        x=alt.X(
-            "flagged_words_count:Q",
-            bin=alt.Bin(maxbins=40),
-            title="Number of Flagged Words per Grant"
-        ),
-        y=alt.Y("count():Q", title="Number of Grants"),
-        color=alt.value("#1d4ed8"),
-        tooltip=[
-            alt.Tooltip("flagged_words_count:Q", title="Flagged words (binned)"),
-            alt.Tooltip("count():Q", title="Grants in bin")
-        ]
-    )
-    .properties(
-        width=350,
-        height=250,
-        title="Distribution of Flagged Word Counts in Cancelled Grants"
+def flagged_counts_chart(df_q4):
+    return (
+        alt.Chart(df_q4)
+        .transform_filter(alt.datum.flagged_words_count < 40)
+        .mark_bar(opacity=0.8)
+        .encode(
+            x=alt.X(
+                "flagged_words_count:Q",
+                bin=alt.Bin(maxbins=40),
+                title="Number of Flagged Words per Grant"
+            ),
+            y=alt.Y("count():Q", title="Number of Grants"),
+            color=alt.value("#1d4ed8"),
+            tooltip=[
+                alt.Tooltip("flagged_words_count:Q", title="Flagged words (binned)"),
+                alt.Tooltip("count():Q", title="Grants in bin")
+            ]
+        )
+        .properties(
+            width=350,
+            height=250,
+            title="Distribution of Flagged Word Counts in Cancelled Grants"
+        )
     )
-)
 
-# 2
-flagged_words_list = flagged_words_clean  
-
-# Count flagged word occurrences in title + abstract for terminated grants
-all_texts = (
-    df_q4.get("project_title", df_q4.get("title", pd.Series("", index=df_q4.index))).fillna("") 
-    + " " 
-    + df_q4.get("abstract", pd.Series("", index=df_q4.index)).fillna("")
-).str.lower()
-
-word_counter = Counter()
-for text in all_texts:
-    for word in flagged_words_list:
-        if re.search(rf"\b{re.escape(word)}\b", text):
-            word_counter[word] += 1
-
-# Convert to DataFrame for plotting
-df_top_words = (
-    pd.DataFrame(word_counter.items(), columns=["word", "count"])
-    .sort_values("count", ascending=False)
-    .head(15)
-)
 
-chart_q4_words = (
-    alt.Chart(df_top_words)
-    .mark_bar()
-    .encode(
-        y=alt.Y("word:N", sort="-x", title="Flagged Word"),
-        x=alt.X("count:Q", title="Occurrences in Cancelled Grants"),
-        color=alt.Color("count:Q", scale=alt.Scale(scheme="blues")),
-        tooltip=[
-            alt.Tooltip("word:N", title="Word"),
-            alt.Tooltip("count:Q", title="Occurrences")
-        ]
-    )
-    .properties(
-        width=350,
-        height=250,
-        title="Top 15 Flagged Words Found in Cancelled Grants"
+# Grants containing each flagged word in their title or abstract (top 15)
+def top_words_chart(df_top_words):
+    return (
+        alt.Chart(df_top_words)
+        .mark_bar()
+        .encode(
+            y=alt.Y("word:N", sort="-x", title="Flagged Word"),
+            x=alt.X("count:Q", title="Occurrences in Cancelled Grants"),
+            color=alt.Color("count:Q", scale=alt.Scale(scheme="blues")),
+            tooltip=[
+                alt.Tooltip("word:N", title="Word"),
+                alt.Tooltip("count:Q", title="Occurrences")
+            ]
+        )
+        .properties(
+            width=350,
+            height=250,
+            title="Top 15 Flagged Words Found in Cancelled Grants"
+        )
     )
-)
-
-
-chart_q4_final = chart_q4_hist | chart_q4_words
-#chart_q4_final
-
-
-chart_q4_final = chart_q4_hist | chart_q4_words
-##chart_q4_final
-##Q4 = chart_q4_final
 
 
 # Q5
-import altair as alt
-import pandas as pd
-
-df = cleaned_nsf_data.copy()
-
-# Labels + explicit stack order
-df["cruz_label"] = df["in_cruz_list"].map({True: "Yes", False: "No"})
-df["status_label"] = df["reinstated"].map({True: "Reinstated", False: "Terminated"})
-df["status_order"] = df["status_label"].map({"Terminated": 0, "Reinstated": 1})
-
-# Counts per (Cruz, Status) + row totals and percentages
-q5_counts = (
-    df.groupby(["cruz_label", "status_label", "status_order"])
-    .size()
-    .reset_index(name="count")
-)
-row_totals = (
-    q5_counts.groupby("cruz_label")["count"].sum().reset_index(name="row_total")
-)
-q5_counts = q5_counts.merge(row_totals, on="cruz_label", how="left")
-q5_counts["percentage"] = (q5_counts["count"] / q5_counts["row_total"] * 100).round(1)
-
-# Overall totals
-totals = (
-    df.groupby(["status_label", "status_order"])
-    .size()
-    .reset_index(name="count")
-    .sort_values("status_order")
-)
-totals["one"] = "Totals"
-total_sum = int(totals["count"].sum())
-totals["percentage"] = (totals["count"] / total_sum * 100).round(1)
-
+# Counts per (Cruz, Status) + row totals and percentages, and overall totals
 # ---- Enhanced palette ----
 BLUE_DARK = "#3182bd"   
 BLUE_LIGHT = "#9ecae1"  
@@ -453,172 +302,288 @@ x_max = 1600
 tick_step = 200
 axis_values = list(range(0, x_max + tick_step, tick_step))
 
-# Left panel: stacked bars with percentages
 
-base_left = alt.Chart(q5_counts).properties(width=580, height=250)
+# Left panel: stacked bars with percentages
+def cruz_status_chart(q5_counts, row_totals):
+    base_left = alt.Chart(q5_counts).properties(width=580, height=250)
 
-stack = base_left.mark_bar().encode(
-    y=alt.Y(
-        "cruz_label:N",
-        title="In Ted Cruz's List",
-        sort=["No", "Yes"],
-        axis=alt.Axis(labelFontSize=13, titleFontSize=14, titleFontWeight=600),
-    ),
-    x=alt.X(
-        "count:Q",
-        title="Number of Grants",
-        scale=alt.Scale(domain=[0, x_max], nice=False, zero=True),
-        axis=alt.Axis(
-            values=axis_values,
-            labelExpr='format(datum.value, ",")',
-            labelFontSize=12,
-            titleFontSize=14,
-            titleFontWeight=600,
+    stack = base_left.mark_bar().encode(
+        y=alt.Y(
+            "cruz_label:N",
+            title="In Ted Cruz's List",
+            sort=["No", "Yes"],
+            axis=alt.Axis(labelFontSize=13, titleFontSize=14, titleFontWeight=600),
         ),
+        x=alt.X(
+            "count:Q",
+            title="Number of Grants",
+            scale=alt.Scale(domain=[0, x_max], nice=False, zero=True),
+            axis=alt.Axis(
+                values=axis_values,
+                labelExpr='format(datum.value, ",")',
+                labelFontSize=12,
+                titleFontSize=14,
+                titleFontWeight=600,
+            ),
+        ),
+        color=alt.Color(
+        "status_label:N",
+        title=None,
+        scale=alt.Scale(
+            domain=["Terminated", "Reinstated"],
+            range=[BLUE_DARK, BLUE_LIGHT]
+        ),
+        legend=None,
     ),
-    color=alt.Color(
-    "status_label:N",
-    title=None,
-    scale=alt.Scale(
-        domain=["Terminated", "Reinstated"],
-        range=[BLUE_DARK, BLUE_LIGHT]
-    ),
-    legend=None,
-),
-    order=alt.Order("status_order:Q"),
-    tooltip=[
-        alt.Tooltip("cruz_label:N", title="In Cruz's List"),
-        alt.Tooltip("status_label:N", title="Status"),
-        alt.Tooltip("count:Q", title="Count", format=","),
-        alt.Tooltip("percentage:Q", title="Percentage", format=".1f"),
-    ],
-)
-
-# Percentage labels inside bars (centered in each segment)
-percentage_labels = (
-    base_left.transform_joinaggregate(total="sum(count)", groupby=["cruz_label"])
-    .transform_window(
-        cum="sum(count)",
-        sort=[alt.SortField("status_order", order="ascending")],
-        groupby=["cruz_label"],
-    )
-    .transform_calculate(center="datum.cum - datum.count / 2")
-    .mark_text(
-        align="center", baseline="middle", fontSize=14, fontWeight=600, color="white"
+        order=alt.Order("status_order:Q"),
+        tooltip=[
+            alt.Tooltip("cruz_label:N", title="In Cruz's List"),
+            alt.Tooltip("status_label:N", title="Status"),
+            alt.Tooltip("count:Q", title="Count", format=","),
+            alt.Tooltip("percentage:Q", title="Percentage", format=".1f"),
+        ],
     )
-    .encode(
-        y=alt.Y("cruz_label:N", sort=["No", "Yes"]),
-        x=alt.X("center:Q"),
-        text=alt.Text("percentage:Q", format=".1f"),
-        opacity=alt.condition(
-            alt.datum.count > 50,  # Only show percentage if segment is large enough
-            alt.value(1),
-            alt.value(0),
-        ),
+
+    # Percentage labels inside bars (centered in each segment)
+    percentage_labels = (
+        base_left.transform_joinaggregate(total="sum(count)", groupby=["cruz_label"])
+        .transform_window(
+            cum="sum(count)",
+            sort=[alt.SortField("status_order", order="ascending")],
+            groupby=["cruz_label"],
+        )
+        .transform_calculate(center="datum.cum - datum.count / 2")
+        .mark_text(
+            align="center", baseline="middle", fontSize=14, fontWeight=600, color="white"
+        )
+        .encode(
+            y=alt.Y("cruz_label:N", sort=["No", "Yes"]),
+            x=alt.X("center:Q"),
+            text=alt.Text("percentage:Q", format=".1f"),
+            opacity=alt.condition(
+                alt.datum.count > 50,  # Only show percentage if segment is large enough
+                alt.value(1),
+                alt.value(0),
+            ),
+        )
     )
-)
 
-# Row totals at right edge
-totals_labels = (
-    alt.Chart(row_totals)
-    .mark_text(align="left", dx=10, fontSize=13, fontWeight=600, color=DARK_TEXT)
-    .encode(
-        y=alt.Y("cruz_label:N", sort=["No", "Yes"], title=None),
-        x=alt.X("row_total:Q"),
-        text=alt.Text("row_total:Q", format=","),
+    # Row totals at right edge
+    totals_labels = (
+        alt.Chart(row_totals)
+        .mark_text(align="left", dx=10, fontSize=13, fontWeight=600, color=DARK_TEXT)
+        .encode(
+            y=alt.Y("cruz_label:N", sort=["No", "Yes"], title=None),
+            x=alt.X("row_total:Q"),
+            text=alt.Text("row_total:Q", format=","),
+        )
     )
-)
 
-left_panel = (stack + percentage_labels + totals_labels).properties(
-    title=alt.TitleParams(
-        "Grants by Cruz List Status", fontSize=16, fontWeight=600, anchor="start"
+    left_panel = (stack + percentage_labels + totals_labels).properties(
+        title=alt.TitleParams(
+            "Grants by Cruz List Status", fontSize=16, fontWeight=600, anchor="start"
+        )
     )
-)
+    return left_panel
 
-# Right panel: Totals with centered labels and percentages
 
-right_base = (
-    alt.Chart(totals)
-    .transform_joinaggregate(total="sum(count)")
-    .transform_window(
-        cum="sum(count)", sort=[alt.SortField("status_order", order="ascending")]
+# Right panel: Totals with centered labels and percentages
+def status_totals_chart(totals):
+    total_sum = int(totals["count"].sum())
+    right_base = (
+        alt.Chart(totals)
+        .transform_joinaggregate(total="sum(count)")
+        .transform_window(
+            cum="sum(count)", sort=[alt.SortField("status_order", order="ascending")]
+        )
+        .transform_calculate(center="datum.cum - datum.count / 2")
     )
-    .transform_calculate(center="datum.cum - datum.count / 2")
-)
 
-totals_bar = (
-    right_base.mark_bar()
-    .encode(
-        x=alt.X("one:N", axis=None, title=""),
-        y=alt.Y(
-            "count:Q",
-            stack="zero",
-            axis=None,
-            title="",
-            scale=alt.Scale(domain=[0, total_sum], nice=False, zero=True),
+    totals_bar = (
+        right_base.mark_bar()
+        .encode(
+            x=alt.X("one:N", axis=None, title=""),
+            y=alt.Y(
+                "count:Q",
+                stack="zero",
+                axis=None,
+                title="",
+                scale=alt.Scale(domain=[0, total_sum], nice=False, zero=True),
+            ),
+            color=alt.Color(
+        "status_label:N",
+        scale=alt.Scale(
+            domain=["Terminated", "Reinstated"],
+            range=[BLUE_DARK, BLUE_LIGHT]
         ),
-        color=alt.Color(
-    "status_label:N",
-    scale=alt.Scale(
-        domain=["Terminated", "Reinstated"],
-        range=[BLUE_DARK, BLUE_LIGHT]
+        legend=None,
     ),
-    legend=None,
-),
-        order=alt.Order("status_order:Q"),
+            order=alt.Order("status_order:Q"),
+        )
+        .properties(
+            width=200,
+            height=250,
+            title=alt.TitleParams(
+                "Overall Totals", fontSize=16, fontWeight=600, anchor="middle"
+            ),
+        )
     )
-    .properties(
-        width=200,
-        height=250,
-        title=alt.TitleParams(
-            "Overall Totals", fontSize=16, fontWeight=600, anchor="middle"
-        ),
+
+    # Status labels with percentages
+    totals_labels_text = (
+        right_base.transform_calculate(
+            label='datum.status_label + " (" + toString(datum.percentage) + "%)"'
+        )
+        .mark_text(baseline="middle", fontSize=14, fontWeight=600, color="white")
+        .encode(
+            x=alt.X("one:N"),
+            y=alt.Y(
+                "center:Q",
+                axis=None,
+                scale=alt.Scale(domain=[0, total_sum], nice=False, zero=True),
+            ),
+            text=alt.Text("label:N"),
+        )
     )
-)
 
-# Status labels with percentages
-totals_labels_text = (
-    right_base.transform_calculate(
-        label='datum.status_label + " (" + toString(datum.percentage) + "%)"'
+    right_panel = totals_bar + totals_labels_text
+    return right_panel
+#Q5
+
+
+# Q6
+# Research topics of the cancelled grants (TF-IDF + minibatch k-means, see topics.py)
+def topics_chart(topic_cancellations):
+    return (
+        alt.Chart(topic_cancellations)
+        .mark_bar()
+        .encode(
+            y=alt.Y("label:N", sort="-x", title="Topic"),
+            x=alt.X("cancelled_grants:Q", title="Cancelled Grants"),
+            color=alt.Color(
+                "total_budget:Q",
+                title="Total Budget ($)",
+                scale=alt.Scale(scheme="blues"),
+            ),
+            tooltip=[
+                alt.Tooltip("label:N", title="Topic"),
+                alt.Tooltip("terms:N", title="Top terms"),
+                alt.Tooltip("cancelled_grants:Q", title="Cancelled grants"),
+                alt.Tooltip("total_budget:Q", title="Total budget", format="$,.0f"),
+            ],
+        )
+        .properties(width=350, height=250, title="Cancelled Grants by Research Topic")
     )
-    .mark_text(baseline="middle", fontSize=14, fontWeight=600, color="white")
-    .encode(
-        x=alt.X("one:N"),
-        y=alt.Y(
-            "center:Q",
-            axis=None,
-            scale=alt.Scale(domain=[0, total_sum], nice=False, zero=True),
-        ),
-        text=alt.Text("label:N"),
+
+
+# --- Mini-panels for dashboard -----------------------------------------------------------------------
+# Each panel: (aggregates it needs, builder from the published aggregates to
+# (chart, input frames, spec-cache params)); a builder returns None when the
+# export has no data for its panel (e.g. no abstracts, so no topics).
+# Panels linked by a selection share one chart, drawn as a full-width row.
+LINKED_PANELS = {"F1–F4": ["F1", "F2", "F3", "F4"]}
+
+
+def state_filter(pick):
+    """Rows of the picked state, or the ALL_STATES rows while none is picked."""
+    return (f"isValid({pick.name}.state) ? indexof({pick.name}.state, datum.state) >= 0 "
+            f": datum.state == '{ALL_STATES}'")
+
+
+def panel_linked(agg):
+    # Clicking a state on the map or the top-10 bar filters Q2 and Q3 in the
+    # browser, from per-state tables with the top LINKED_TOP rows of each state
+    # (pipeline.py), never from the grant rows
+    pick = alt.selection_point(name="state_pick", fields=["state"], toggle=False)
+    highlight = alt.condition(pick, alt.value(1), alt.value(0.4))
+    f1 = state_map(agg, 260, 200, pick).properties(title="Q1 – Cancellations by State (Map)")
+
+    top10 = agg["state_cancellations"].head(10)
+    f2 = (top_states_chart(top10).add_params(pick).encode(opacity=highlight)
+          .properties(width=260, height=200, title="Q1 – Top 10 States by Cancellations"))
+
+    per_state = agg["state_institution_cancellations"]
+    f3 = (institutions_chart(per_state).transform_filter(state_filter(pick))
+          .properties(width=260, height=200, title="Q2 – Top Institutions by # Cancellations"))
+
+    if budget_level == "state":
+        # one row per state already: highlight the picked one
+        budgets = budget_view(agg["budget_rollups"], budget_level, budget_metric).head(20)
+        f4 = budget_chart(budgets).transform_calculate(state="datum.name").encode(opacity=highlight)
+    else:
+        budgets = agg["state_budget_rollups"][(budget_level, budget_metric)]
+        f4 = budget_chart(budgets).transform_filter(state_filter(pick))
+    f4 = f4.properties(width=260, height=200, title=f"Q3 – Top {level_title} by {metric_label}")
+
+    chart = alt.hconcat(f1, f2, f3, f4).properties(
+        title=alt.TitleParams("Click a state on the map or the bars to filter Q2 and Q3 (double-click to clear)",
+                              fontSize=12, fontWeight="normal", anchor="start")
     )
-)
+    return (chart, [agg["state_cancellations_map"], top10, per_state, budgets],
+            {"geometry": build.version, "level": budget_level, "metric": budget_metric})
 
-right_panel = totals_bar + totals_labels_text
 
-# Combine with enhanced styling
+def panel_f5(agg):
+    # Flagged-word count per grant (only this column is shipped to the chart)
+    df_q4 = agg["q4_flagged_counts" + q4_suffix(agg)]
+    return (flagged_counts_chart(df_q4).properties(width=260, height=200, title="Q4 – Flagged Words per Grant"),
+            [df_q4], {})
 
-Q5 = (left_panel | right_panel).resolve_scale(color="shared")
 
-#Q5
+def panel_f6(agg):
+    df_top_words = agg["top_words" + q4_suffix(agg)]
+    return (top_words_chart(df_top_words).properties(width=260, height=200, title="Q4 – Top Flagged Words in Cancelled Grants"),
+            [df_top_words], {})
 
 
-# --- Mini-panels for dashboard -----------------------------------------------------------------------
-F1 = chart_map2.properties(width=260, height=200, title="Q1 – Cancellations by State (Map)")
-F2 = chart_bar.properties(width=260, height=200, title="Q1 – Top 10 States by Cancellations")
-F3 = chart_q2.properties(width=260, height=200, title="Q2 – Top Institutions by # Cancellations")
-F4 = chart_q3.properties(width=260, height=200, title="Q3 – Top Institutions by Budget Loss")
-F5 = chart_q4_hist.properties(width=260, height=200, title="Q4 – Flagged Words per Grant")
-F6 = chart_q4_words.properties(width=260, height=200, title="Q4 – Top Flagged Words in Cancelled Grants")
-F7 = left_panel.properties(width=260, height=200, title="Q5 – Grants by Cruz List Status")
-F8 = right_panel.properties(width=260, height=200, title="Q5 – Overall Totals")
-
-final_dashboard = (
-    alt.concat(
-        F1, F2, F3, F4,
-        F5, F6, F7, F8,
-        columns=4
-    )
-    .properties(title="NSF Grant Cancellations — Final Overview (Q1–Q5)")
+def panel_f7(agg):
+    q5_counts, row_totals = agg["q5_counts"], agg["row_totals"]
+    return (cruz_status_chart(q5_counts, row_totals).properties(width=260, height=200, title="Q5 – Grants by Cruz List Status"),
+            [q5_counts, row_totals], {})
+
+
+def panel_f8(agg):
+    totals = agg["totals"]
+    return (status_totals_chart(totals).properties(width=260, height=200, title="Q5 – Overall Totals"),
+            [totals], {})
+
+
+def panel_f9(agg):
+    topic_cancellations = agg.get("topic_cancellations")
+    if topic_cancellations is None:
+        return None
+    return (topics_chart(topic_cancellations).properties(width=260, height=200, title="Q6 – Cancellations by Research Topic"),
+            [topic_cancellations], {})
+
+
+PANELS = {
+    "F1–F4": (CORE_AGGREGATES, panel_linked),
+    "F5": (["q4_flagged_counts", "q4_flagged_counts_dedup"], panel_f5),
+    "F6": (["top_words", "top_words_dedup"], panel_f6),
+    "F7": (["q5_counts", "row_totals"], panel_f7),
+    "F8": (["totals"], panel_f8),
+    "F9": (["topic_cancellations"], panel_f9),
+}
+
+# --- Serialized specs, cached per panel on the content of their inputs -------------------------------
+@st.cache_resource
+def get_spec_cache():
+    return SpecCache(max_entries=64, directory=DEFAULT_CACHE_DIR)
+
+
+spec_cache = get_spec_cache()
+APP_VERSION = source_fingerprint(__file__)
+
+
+def build_panel_spec(chart):
+    spec = chart.to_dict()
+    # evaluate filter/bin/joinaggregate/window/calculate here instead of in each browser
+    return pre_transform_spec(spec) if SERVER_TRANSFORMS else spec
+
+
+# Dashboard-level config (the second configure_axis replaces the first one)
+dashboard_config = (
+    alt.concat(alt.Chart())
     .configure_view(strokeWidth=0)
     .configure_axis(
         grid=True,
@@ -630,12 +595,170 @@ final_dashboard = (
         titleColor="#111827",
     )
     .configure_concat(spacing=40)
+    .configure_view(strokeWidth=0)
+    .configure_axis(labelColor='white', titleColor='white')
+    .to_dict(validate=False)["config"]
 )
 
-final_dashboard = final_dashboard.configure_view(strokeWidth=0).configure_axis(labelColor='white', titleColor='white')
-
-
-st.title("NSF Grant Cancellations — Final Overview (Q1–Q5)")
-st.altair_chart(final_dashboard, use_container_width=True)
-
 
+@st.fragment
+def dashboard_panel(name):
+    """One mini-panel; its refresh button reruns just this panel against the
+    latest build (a new export included), not the whole script."""
+    needs, build_chart = PANELS[name]
+    current = get_dataset_build(dataset_version())
+    current.wait(needs)
+    panel = build_chart(current.aggregates())
+    if panel is None:
+        return
+    chart, frames, params = panel
+    key = spec_key(name, frames, dict(params, app=APP_VERSION, server_transforms=SERVER_TRANSFORMS))
+    # cached specs are shared: add the config on a copy
+    spec = dict(spec_cache.get_or_build(key, lambda: build_panel_spec(chart)),
+                config=dashboard_config, usermeta={"panels": LINKED_PANELS.get(name, [name])})
+    st.vega_lite_chart(spec, use_container_width=True)
+    st.button("↻", key=f"refresh_{name}", help=f"Redraw {name} from the latest data")
+
+
+st.title("NSF Grant Cancellations — Final Overview (Q1–Q6)")
+
+# Placeholders (linked panels first, then a 4-column grid), filled in
+# whatever order the data arrives
+slots = {}
+for name in LINKED_PANELS:
+    slots[name] = st.empty()
+    slots[name].caption(f"{name} – loading…")
+names = [name for name in PANELS if name not in LINKED_PANELS]
+for row in range(0, len(names), 4):
+    for column, name in zip(st.columns(4), names[row:row + 4]):
+        slots[name] = column.empty()
+        slots[name].caption(f"{name} – loading…")
+
+pending = list(PANELS)
+while pending:
+    for i in reversed(build.wait_any([PANELS[name][0] for name in pending])):
+        name = pending.pop(i)
+        with slots[name].container():
+            dashboard_panel(name)
+print("=== Spec cache ===")
+print(spec_cache.stats())
+
+agg = build.aggregates()
+topic_cancellations = agg.get("topic_cancellations")
+if topic_cancellations is not None:
+    print("=== Q6: Cancellations and Budget by Research Topic ===")
+    print(topic_cancellations[["label", "cancelled_grants", "total_budget", "terms"]].to_string(index=False))
+
+
+# Density SPLOM: bins are precomputed (pipeline.py), so the spec size does not grow with the data
+if st.sidebar.checkbox("Density scatterplot matrix"):
+    show_outliers = st.sidebar.checkbox("Overlay sampled outliers", value=True)
+    build.wait(["splom"])
+    splom = build.get("splom")
+    splom_spec = spec_cache.get_or_build(
+        spec_key(
+            "splom", [splom["cells"], splom["hist"], splom["outliers"]],
+            {"outliers": show_outliers, "app": APP_VERSION},
+        ),
+        lambda: density_splom_chart(splom, show_outliers=show_outliers),
+    )
+    st.vega_lite_chart(splom_spec)
+
+# --- Q4/Q5 association tests (computed with the aggregates, see stats.py) ----------------------------
+# The last stage of the build; everything above is already on the page
+dataset = get_dataset(build.version)
+statistics = dataset.aggregates["statistics"]
+print("=== Q4/Q5: Association with reinstatement / termination ===")
+print(statistics.to_string(index=False))
+
+st.subheader("Q4/Q5 – Do flagged words and the Cruz list go with reinstatement?")
+st.caption(
+    "Estimates with 95% bootstrap intervals; p-values from chi-square, Fisher's exact test and Wald tests. "
+    "Reinstatement as in Q5 (from the grant history). `ci_dropped` counts resamples without a finite "
+    "value (e.g. a separated fit), which the interval leaves out."
+)
+st.dataframe(statistics.round(4), hide_index=True)
+
+
+# --- Watchlists vs outcomes (membership bitsets, see watchlists.py) ----------------------------------
+# Lists dropped into data/watchlists after the build are registered without a
+# rebuild: once per state of the directory, on a copy, so the shared dataset's
+# watchlists are never modified while other sessions read them
+@st.cache_resource(max_entries=4)
+def synced_watchlists(version, files):
+    watchlists = get_dataset(version).watchlists.copy()
+    watchlists.sync(DEFAULT_WATCHLIST_DIR)
+    return watchlists
+
+
+@st.cache_resource(max_entries=1)
+def watchlist_outcome(version):
+    # the reinstatement Q5 counts (event snapshot), not the export column
+    shared = get_dataset(version)
+    return reinstated_outcome(shared.grants, shared.events)
+
+
+WATCHLIST_HOW = {"any": "any of the chosen lists", "all": "all of the chosen lists"}
+watchlists = synced_watchlists(build.version, tuple(watchlist_files(DEFAULT_WATCHLIST_DIR).items()))
+st.subheader("Watchlists – overlap and reinstatement")
+for name, error in watchlists.errors.items():
+    st.caption(f"Skipped watchlist {name}: {error}")
+chosen = st.multiselect("Watchlists", watchlists.names, default=watchlists.names)
+if chosen:
+    how = st.radio("Grants on", list(WATCHLIST_HOW), horizontal=True, format_func=WATCHLIST_HOW.__getitem__)
+    reinstated = watchlist_outcome(build.version)
+    left, right = st.columns(2)
+    left.dataframe(watchlists.outcome_rates(reinstated, chosen), hide_index=True)
+    left.dataframe(watchlists.breakdown(reinstated, chosen, how), hide_index=True)
+    right.dataframe(watchlists.overlap(chosen))
+
+
+# --- What changed since an earlier export (see snapshots.py) -----------------------------------------
+def change_chart(rollup, field, title, top=15):
+    """Grants changed per `field`, stacked by kind of change (top `top` by grants)."""
+    largest = rollup.groupby(field)["grants"].sum().nlargest(top).index
+    return alt.Chart(rollup[rollup[field].isin(largest)]).mark_bar().encode(
+        x=alt.X("sum(grants):Q", title="Grants"),
+        y=alt.Y(f"{field}:N", sort="-x", title=""),
+        color=alt.Color("label:N", title="Change"),
+        tooltip=[
+            alt.Tooltip(f"{field}:N", title=title),
+            alt.Tooltip("label:N", title="Change"),
+            alt.Tooltip("grants:Q", title="Grants"),
+            alt.Tooltip("budget_delta:Q", title="Budget change", format="$,.0f"),
+        ],
+    ).properties(width=320, height=300, title=f"Changes by {title.lower()}")
+
+
+st.subheader("What changed since an earlier export")
+# the manifest is re-read on every run: exports added with `snapshots.py add`
+# do not change the dataset version, so the cached build would not see them
+snapshots = SnapshotStore(dataset.snapshots.directory)
+earlier = [v for v in reversed(snapshots.versions()) if v != dataset.snapshot_id]
+if not earlier:
+    st.caption(
+        "Only the current export has been snapshotted. Changes show up once a newer export is loaded, "
+        "or after adding an older one with `python snapshots.py add <csv>`."
+    )
+else:
+    previous = snapshots.previous(dataset.snapshot_id)
+    baseline = st.sidebar.selectbox(
+        "Compare export with", earlier, index=earlier.index(previous) if previous in earlier else 0
+    )
+    diff = diff_snapshots(baseline, dataset.snapshot_id, snapshots.directory)
+    summary = diff["summary"]
+    print(f"=== Changes {baseline} -> {dataset.snapshot_id} ===")
+    print(summary.to_string(index=False))
+    if not len(diff["changes"]):
+        st.caption(f"No grant changed between {baseline} and {dataset.snapshot_id}.")
+    else:
+        st.caption(" · ".join(f"{row.label}: {row.grants:,}" for row in summary.itertuples()))
+        changes_spec = spec_cache.get_or_build(
+            spec_key("changes", [diff["by_state"], diff["by_institution"]], {"app": APP_VERSION}),
+            lambda: alt.hconcat(
+                change_chart(diff["by_state"], "org_state", "State"),
+                change_chart(diff["by_institution"], "institution", "Institution"),
+            ).resolve_scale(color="shared"),
+        )
+        st.vega_lite_chart(changes_spec)
+        st.dataframe(diff["changes"], hide_index=True)
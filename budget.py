@@ -0,0 +1,193 @@
+"""Budget impact of cancelled grants, per money metric and rollup level.
+
+Q3 used to sum `nsf_total_budget`, `nsf_obligated` and `estimated_budget` per
+institution and then `fillna` the total from the estimate. A pandas sum of
+missing values is 0, not NaN, so that fallback never applied, and the outlaid
+and remaining amounts were not reported at all.
+
+Here every metric states its missing-value policy explicitly:
+
+- `columns` are tried in order per grant (the first non-missing value wins),
+  so the fallback happens before summing, where it can actually fire;
+- `missing="skip"` leaves grants with no value out of the sum (a group with no
+  reported grant gets NaN, not $0); `missing="zero"` counts them as $0.
+
+Every rollup also reports how many grants had a value (`reported`) and the
+share of the group they represent (`coverage`), so a low total caused by
+missing data is visible as such.
+
+`compute_budget_rollups` evaluates all metrics for all levels up front; the
+dashboard picks a (level, metric) table from the result instead of running a
+groupby on every rerun.
+
+`compute_state_rollups` does the same per state, keeping only each state's
+top groups, so the dashboard can filter Q3 by a state picked on the map in the
+browser: the tables grow with the number of states, not of grants.
+"""
+import numpy as np
+import pandas as pd
+
+BUDGET_METRICS = {
+    "total": {
+        "label": "Total budget",
+        "columns": ["nsf_total_budget", "estimated_budget"],
+        "missing": "skip",
+    },
+    "obligated": {
+        "label": "Obligated",
+        "columns": ["nsf_obligated", "usaspending_obligated"],
+        "missing": "skip",
+    },
+    "outlaid": {
+        "label": "Outlaid",
+        "columns": ["usaspending_outlaid", "estimated_outlays"],
+        "missing": "skip",
+    },
+    "remaining": {
+        "label": "Remaining (not yet paid out)",
+        "columns": ["estimated_remaining"],
+        "missing": "skip",
+    },
+    "estimated": {
+        "label": "Estimated budget",
+        "columns": ["estimated_budget"],
+        "missing": "skip",
+    },
+}
+
+# rollup level -> grant columns to group by, in order of preference
+BUDGET_LEVELS = {
+    "institution": ["org_canonical", "org_name"],
+    "state": ["org_state"],
+    "directorate": ["directorate", "dir"],
+}
+UNKNOWN_GROUP = "Unknown"
+STATE_COLUMN = "org_state"
+# pseudo-state of the rows ranked over all states
+ALL_STATES = "All states"
+
+
+def metric_values(grants, metrics=BUDGET_METRICS):
+    """(grants x metrics) float matrix after applying each metric's fallbacks."""
+    values = np.full((len(grants), len(metrics)), np.nan)
+    for j, spec in enumerate(metrics.values()):
+        for col in spec["columns"]:
+            if col in grants.columns:
+                column = pd.to_numeric(grants[col], errors="coerce").to_numpy(dtype=float)
+                values[:, j] = np.where(np.isnan(values[:, j]), column, values[:, j])
+    return values
+
+
+def _summable(grants, metrics):
+    """Per-grant metric values with missing ones as 0, and whether each is reported."""
+    values = metric_values(grants, metrics)
+    reported = ~np.isnan(values)
+    zero_missing = np.array([metrics[m]["missing"] == "zero" for m in metrics])
+    # "zero" metrics count every grant as reported
+    return np.where(reported, values, 0.0), reported | zero_missing
+
+
+def _level_column(grants, level):
+    for col in BUDGET_LEVELS[level]:
+        if col in grants.columns:
+            return col
+    return None
+
+
+def compute_budget_rollups(grants, metrics=BUDGET_METRICS, levels=BUDGET_LEVELS):
+    """Sorted rollup tables keyed by (level, metric), plus ("all", metric) totals.
+
+    Each table has columns name, value, grant_count, reported, coverage and is
+    sorted by value, largest first (groups with no reported value last).
+    """
+    names = list(metrics)
+    summable, reported = _summable(grants, metrics)
+
+    rollups = {}
+    for level in levels:
+        col = _level_column(grants, level)
+        if col is None:
+            continue
+        keys = grants[col].astype(object).where(grants[col].notna(), UNKNOWN_GROUP)
+        codes, uniques = pd.factorize(keys)
+        n_groups = len(uniques)
+        # one pass over the rows for every metric at once
+        sums = np.zeros((n_groups, len(names)))
+        counts = np.zeros((n_groups, len(names)))
+        np.add.at(sums, codes, summable)
+        np.add.at(counts, codes, reported)
+        sizes = np.bincount(codes, minlength=n_groups)
+        for j, metric in enumerate(names):
+            rollups[(level, metric)] = _rollup_table(uniques, sums[:, j], counts[:, j], sizes)
+
+    sizes = np.array([len(grants)])
+    for j, metric in enumerate(names):
+        rollups[("all", metric)] = _rollup_table(
+            ["All grants"], summable[:, j].sum(keepdims=True), reported[:, j].sum(keepdims=True), sizes
+        )
+    return rollups
+
+
+def compute_state_rollups(grants, top=20, metrics=BUDGET_METRICS, levels=BUDGET_LEVELS):
+    """Per-state rollup tables keyed by (level, metric), `top` groups per state.
+
+    Same columns as `compute_budget_rollups` plus `state`; rows of the
+    pseudo-state ALL_STATES rank the groups over all states. Groups with no
+    positive value are left out. The state level itself is skipped.
+    """
+    if STATE_COLUMN not in grants.columns:
+        return {}
+    names = list(metrics)
+    summable, reported = _summable(grants, metrics)
+    states = grants[STATE_COLUMN].astype(object).where(grants[STATE_COLUMN].notna(), UNKNOWN_GROUP)
+    state_codes, state_names = pd.factorize(states)
+    state_names = np.append(np.asarray(state_names, dtype=object), ALL_STATES)
+    # every grant counts once for its state and once for ALL_STATES
+    state_codes = np.concatenate([state_codes, np.full(len(grants), len(state_names) - 1)])
+    summable, reported = np.vstack([summable, summable]), np.vstack([reported, reported])
+
+    rollups = {}
+    for level in levels:
+        col = _level_column(grants, level)
+        if col is None or col == STATE_COLUMN:
+            continue
+        keys = grants[col].astype(object).where(grants[col].notna(), UNKNOWN_GROUP)
+        group_codes, uniques = pd.factorize(keys)
+        pairs, codes = np.unique(
+            state_codes * len(uniques) + np.tile(group_codes, 2), return_inverse=True
+        )
+        sums = np.zeros((len(pairs), len(names)))
+        counts = np.zeros((len(pairs), len(names)))
+        np.add.at(sums, codes, summable)
+        np.add.at(counts, codes, reported)
+        sizes = np.bincount(codes, minlength=len(pairs))
+        pair_states = state_names[pairs // len(uniques)]
+        pair_names = np.asarray(uniques, dtype=object)[pairs % len(uniques)]
+        for j, metric in enumerate(names):
+            table = _rollup_table(pair_names, sums[:, j], counts[:, j], sizes, pair_states)
+            table = table[table["value"] > 0]
+            # sorted by value, so the first rows of each state are its top groups
+            rollups[(level, metric)] = table.groupby("state", sort=False).head(top).reset_index(drop=True)
+    return rollups
+
+
+def _rollup_table(names, sums, counts, sizes, states=None):
+    table = pd.DataFrame({
+        "name": np.asarray(names, dtype=object),
+        "value": np.where(counts > 0, sums, np.nan).round(2),
+        "grant_count": sizes.astype(int),
+        "reported": counts.astype(int),
+    })
+    table["coverage"] = (table["reported"] / table["grant_count"]).round(3)
+    if states is not None:
+        table.insert(0, "state", states)
+    return table.sort_values("value", ascending=False, na_position="last").reset_index(drop=True)
+
+
+def budget_view(rollups, level="institution", metric="total", top=None):
+    """The precomputed (level, metric) table, optionally cut to the `top` rows with a value."""
+    if (level, metric) not in rollups:
+        raise KeyError(f"No budget rollup for level={level!r}, metric={metric!r}")
+    table = rollups[(level, metric)]
+    table = table[table["value"] > 0]
+    return table.head(top) if top else table
@@ -0,0 +1,211 @@
+"""Near-duplicate abstracts (collaborative awards) via MinHash + LSH.
+
+A collaborative NSF project is split into one award per institution, and the
+awards share (nearly) the same abstract. Counting each of them separately
+inflates the Q4 flagged-word figures, and scanning each copy repeats work.
+
+`duplicate_clusters(corpus)` groups documents of a TokenCorpus:
+
+1. every document is reduced to its set of 5-token shingles, hashed to
+   uint64 with the token IDs the corpus already holds;
+2. a MinHash signature (`NUM_PERM` multiply-shift hashes, minimum per
+   document) approximates the Jaccard similarity of two shingle sets as the
+   fraction of equal signature entries;
+3. LSH splits signatures into `BANDS` bands; documents sharing any band
+   bucket become candidate pairs (16 bands of 8 rows catch a pair at the
+   threshold with probability ~1, and start catching pairs from ~0.7);
+4. candidates whose estimate is within ESTIMATE_MARGIN of `threshold` are
+   verified with the exact Jaccard similarity of their shingle sets, and kept
+   when it reaches `threshold`. With 128 permutations the estimate alone is
+   off by about ±0.03, enough to drop near-identical pairs or merge
+   different abstracts, and a member's flagged-word counts are taken from its
+   representative (see pipeline.py), so a wrong merge miscounts;
+5. connected components of the kept pairs are the clusters.
+
+Every step is vectorized over the corpus, so the cost grows with the number
+of tokens rather than with the number of document pairs. The result maps each
+document to its cluster's representative (its lowest document number);
+singletons map to themselves. `ensure_duplicate_clusters` caches it on disk
+next to the token corpus.
+"""
+import json
+import os
+
+import numpy as np
+
+DEFAULT_DEDUP_DIR = "data/cache/dedup"
+SHINGLE = 5
+NUM_PERM = 128
+BANDS = 16
+# exact Jaccard similarity of the shingle sets; collaborative copies are
+# near-identical, so this stays high enough to reuse one copy's word counts
+DEFAULT_THRESHOLD = 0.9
+# candidates estimated this far below the threshold are still verified
+# (over 5 standard deviations of the estimate at 128 permutations)
+ESTIMATE_MARGIN = 0.15
+# shingles hashed per block (bounds the temporary arrays to a few MB each)
+BLOCK_SHINGLES = 1_000_000
+MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+def shingle_hashes(corpus, k=SHINGLE):
+    """uint64 hash of every k-token shingle, with the document it belongs to.
+
+    Documents shorter than `k` tokens contribute one shingle of all their tokens.
+    """
+    ids = np.asarray(corpus.ids, dtype=np.uint64) + np.uint64(1)
+    n = len(ids)
+    doc = corpus.doc_of_token
+    ends = np.asarray(corpus.offsets)[doc + 1]
+    starts = np.arange(n)
+    valid = (starts + k <= ends) | (starts == np.asarray(corpus.offsets)[doc])
+    h = np.zeros(n, dtype=np.uint64)
+    for j in range(k):
+        inside = starts + j < ends
+        h[inside] = h[inside] * MIX + ids[(starts + j)[inside]]
+    return h[valid], doc[valid]
+
+
+def shingle_sets(corpus, k=SHINGLE):
+    """Sorted distinct shingle hashes of every document, as (values, offsets)."""
+    shingles, doc = shingle_hashes(corpus, k)
+    order = np.lexsort((shingles, doc))
+    shingles, doc = shingles[order], doc[order]
+    keep = np.r_[True, (shingles[1:] != shingles[:-1]) | (doc[1:] != doc[:-1])]
+    offsets = np.r_[0, np.cumsum(np.bincount(doc[keep], minlength=len(corpus)))]
+    return shingles[keep], offsets
+
+
+def _ranges(starts, lengths):
+    """Concatenation of arange(start, start + length) for every pair."""
+    if not lengths.sum():
+        return np.zeros(0, dtype=np.int64)
+    shift = np.repeat(starts - np.r_[0, np.cumsum(lengths)[:-1]], lengths)
+    return np.arange(lengths.sum()) + shift
+
+
+def exact_jaccard(sets, pairs):
+    """Jaccard similarity of the shingle sets of each document pair (`sets` from `shingle_sets`)."""
+    values, offsets = sets
+    sizes = np.diff(offsets)
+    a, b = pairs[:, 0], pairs[:, 1]
+    # the two sets of a pair, tagged with the pair; a value occurring twice within a pair is shared
+    items = np.concatenate([values[_ranges(offsets[a], sizes[a])], values[_ranges(offsets[b], sizes[b])]])
+    pair = np.concatenate([np.repeat(np.arange(len(pairs)), sizes[a]), np.repeat(np.arange(len(pairs)), sizes[b])])
+    order = np.lexsort((items, pair))
+    items, pair = items[order], pair[order]
+    shared = (items[1:] == items[:-1]) & (pair[1:] == pair[:-1])
+    intersection = np.bincount(pair[1:][shared], minlength=len(pairs))
+    union = sizes[a] + sizes[b] - intersection
+    return np.where(union > 0, intersection / np.maximum(union, 1), 1.0)
+
+
+def minhash_signatures(corpus, num_perm=NUM_PERM, k=SHINGLE, seed=1):
+    """(documents x num_perm) uint32 MinHash signatures; empty documents get all-max rows."""
+    shingles, doc = shingle_hashes(corpus, k)
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+    signatures = np.full((len(corpus), num_perm), np.iinfo(np.uint32).max, dtype=np.uint32)
+    # blocks end on document boundaries so each document's minimum is taken once
+    cut = 0
+    while cut < len(shingles):
+        end = min(cut + BLOCK_SHINGLES, len(shingles))
+        if end < len(shingles):
+            end = cut + max(1, int(np.searchsorted(doc[cut:], doc[end], side="left")))
+        block, block_doc = shingles[cut:end], doc[cut:end]
+        first = np.flatnonzero(np.r_[True, block_doc[1:] != block_doc[:-1]])
+        docs = block_doc[first]
+        for i in range(num_perm):
+            # multiply-shift hashing: the high 32 bits of a*x + b (mod 2^64)
+            hashed = ((block * a[i] + b[i]) >> np.uint64(32)).astype(np.uint32)
+            signatures[docs, i] = np.minimum.reduceat(hashed, first)
+        cut = end
+    return signatures
+
+
+def candidate_pairs(signatures, bands=BANDS):
+    """Document pairs that share at least one LSH band bucket (may repeat)."""
+    n, num_perm = signatures.shape
+    rows = num_perm // bands
+    empty = np.all(signatures == np.iinfo(np.uint32).max, axis=1)
+    docs = np.flatnonzero(~empty)
+    pairs = []
+    for band in range(bands):
+        cols = signatures[docs, band * rows:(band + 1) * rows].astype(np.uint64)
+        key = np.zeros(len(docs), dtype=np.uint64)
+        for j in range(rows):
+            key = key * MIX + cols[:, j]
+        order = np.argsort(key, kind="stable")
+        sorted_key, sorted_docs = key[order], docs[order]
+        same = sorted_key[1:] == sorted_key[:-1]
+        if not same.any():
+            continue
+        # each member pairs with its bucket's first member and with its predecessor
+        bucket_start = np.maximum.accumulate(np.where(np.r_[True, ~same], np.arange(len(order)), 0))
+        member = np.flatnonzero(np.r_[False, same])
+        pairs.append(np.stack([sorted_docs[bucket_start[member]], sorted_docs[member]], axis=1))
+        pairs.append(np.stack([sorted_docs[member - 1], sorted_docs[member]], axis=1))
+    if not pairs:
+        return np.zeros((0, 2), dtype=np.int64)
+    return np.unique(np.sort(np.vstack(pairs), axis=1), axis=0)
+
+
+def connected_components(n, pairs):
+    """Smallest node of each node's component, given undirected edges `pairs`."""
+    labels = np.arange(n)
+    if not len(pairs):
+        return labels
+    a, b = pairs[:, 0], pairs[:, 1]
+    while True:
+        low = np.minimum(labels[a], labels[b])
+        before = labels.copy()
+        np.minimum.at(labels, a, low)
+        np.minimum.at(labels, b, low)
+        # pointer jumping: follow labels to their own label until stable
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+        if np.array_equal(labels, before):
+            return labels
+
+
+def duplicate_clusters(corpus, threshold=DEFAULT_THRESHOLD, num_perm=NUM_PERM, bands=BANDS, seed=1):
+    """Representative document of every document's near-duplicate cluster."""
+    signatures = minhash_signatures(corpus, num_perm, seed=seed)
+    pairs = candidate_pairs(signatures, bands)
+    if len(pairs):
+        estimate = (signatures[pairs[:, 0]] == signatures[pairs[:, 1]]).mean(axis=1)
+        pairs = pairs[estimate >= threshold - ESTIMATE_MARGIN]
+    if len(pairs):
+        pairs = pairs[exact_jaccard(shingle_sets(corpus), pairs) >= threshold]
+    return connected_components(len(corpus), pairs)
+
+
+def cluster_sizes(clusters):
+    """Size of each document's cluster."""
+    counts = np.bincount(clusters, minlength=len(clusters))
+    return counts[clusters]
+
+
+def ensure_duplicate_clusters(text_store, corpus, field, path=DEFAULT_DEDUP_DIR, threshold=DEFAULT_THRESHOLD):
+    """Load the cached clusters for a text-store field, recomputing them if stale."""
+    os.makedirs(path, exist_ok=True)
+    clusters_path = os.path.join(path, f"{field}.npy")
+    manifest_path = os.path.join(path, f"{field}.json")
+    manifest = {
+        "source_key": text_store.source_key, "docs": len(corpus),
+        "threshold": threshold, "shingle": SHINGLE, "num_perm": NUM_PERM, "bands": BANDS,
+        "similarity": "exact",
+    }
+    if os.path.exists(manifest_path) and os.path.exists(clusters_path):
+        with open(manifest_path) as f:
+            if json.load(f) == manifest:
+                return np.load(clusters_path)
+    clusters = duplicate_clusters(corpus, threshold)
+    np.save(clusters_path, clusters)
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f)
+    return clusters
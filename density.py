@@ -0,0 +1,140 @@
+"""Density scatterplot matrix (SPLOM) for the budget and flagged-word fields.
+
+The notebooks' Q5 scatterplot matrix shipped every grant to the browser once
+per matrix cell, which stops being usable after a few thousand rows. Here each
+variable pair is binned server-side into a 2D histogram (drawn as rects with
+log-count color), and each variable into a 1D histogram for the diagonal. The
+payload depends only on the number of fields and bins, not on the number of
+grants.
+
+Bin ranges cover the 0.5th–99.5th percentile of each field; grants outside
+that range in a pair are the outliers, and a fixed-size random sample of them
+can be overlaid as points.
+"""
+import altair as alt
+import numpy as np
+import pandas as pd
+
+SPLOM_FIELDS = {
+    "nsf_total_budget": "Total budget ($)",
+    "usaspending_outlaid": "Outlaid ($)",
+    "estimated_remaining": "Remaining ($)",
+    "flagged_words_count": "Flagged words (abstract)",
+    "title_flagged_words_count": "Flagged words (title)",
+}
+SPLOM_BINS = 30
+MAX_OUTLIERS = 100
+CLIP_PERCENTILES = (0.5, 99.5)
+
+
+def field_edges(values, bins=SPLOM_BINS, clip=CLIP_PERCENTILES):
+    """Bin edges over the clipped range; integer fields get one bin per value when they fit."""
+    finite = values[np.isfinite(values)]
+    if not len(finite):
+        return np.linspace(0, 1, bins + 1)
+    lo, hi = np.percentile(finite, clip)
+    if np.all(finite == np.round(finite)) and hi - lo + 1 <= bins:
+        return np.arange(np.floor(lo), np.ceil(hi) + 2) - 0.5
+    if hi <= lo:
+        hi = lo + 1
+    return np.linspace(lo, hi, bins + 1)
+
+
+def compute_density_splom(frame, fields=None, bins=SPLOM_BINS, max_outliers=MAX_OUTLIERS, seed=0):
+    """Binned SPLOM tables for the lower triangle and diagonal of `fields`.
+
+    Returns a dict with
+        fields    the fields used, in matrix order
+        cells     x_field, y_field, x, x2, y, y2, count (non-empty 2D bins only)
+        hist      field, x, x2, count
+        outliers  x_field, y_field, x, y (at most `max_outliers` per pair)
+        n         number of grants binned
+    """
+    fields = [f for f in (fields or SPLOM_FIELDS) if f in frame.columns]
+    values = {f: pd.to_numeric(frame[f], errors="coerce").to_numpy(dtype=float) for f in fields}
+    # 6 significant digits keep the spec small without moving any bin visibly
+    edges = {f: np.array([float(f"{e:.6g}") for e in field_edges(values[f], bins)]) for f in fields}
+    rng = np.random.default_rng(seed)
+
+    hist_rows, cell_frames, outlier_frames = [], [], []
+    for i, fy in enumerate(fields):
+        counts, ex = np.histogram(values[fy][np.isfinite(values[fy])], bins=edges[fy])
+        hist_rows.append(pd.DataFrame({"field": fy, "x": ex[:-1], "x2": ex[1:], "count": counts}))
+        for fx in fields[:i]:
+            x, y = values[fx], values[fy]
+            both = np.isfinite(x) & np.isfinite(y)
+            inside = (
+                both
+                & (x >= edges[fx][0]) & (x <= edges[fx][-1])
+                & (y >= edges[fy][0]) & (y <= edges[fy][-1])
+            )
+            grid, ex, ey = np.histogram2d(x[inside], y[inside], bins=[edges[fx], edges[fy]])
+            ix, iy = np.nonzero(grid)
+            cell_frames.append(pd.DataFrame({
+                "x_field": fx, "y_field": fy,
+                "x": ex[ix], "x2": ex[ix + 1], "y": ey[iy], "y2": ey[iy + 1],
+                "count": grid[ix, iy].astype(int),
+            }))
+            outside = np.flatnonzero(both & ~inside)
+            if len(outside) and max_outliers:
+                pick = rng.choice(outside, size=min(max_outliers, len(outside)), replace=False)
+                outlier_frames.append(pd.DataFrame({"x_field": fx, "y_field": fy, "x": x[pick], "y": y[pick]}))
+
+    def concat(frames, columns):
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+    return {
+        "fields": fields,
+        "cells": concat(cell_frames, ["x_field", "y_field", "x", "x2", "y", "y2", "count"]),
+        "hist": concat(hist_rows, ["field", "x", "x2", "count"]),
+        "outliers": concat(outlier_frames, ["x_field", "y_field", "x", "y"]),
+        "n": len(frame),
+    }
+
+
+def density_splom_chart(splom, titles=None, size=130, show_outliers=True):
+    """Lower-triangle matrix: 1D histograms on the diagonal, log-count rects below it."""
+    titles = titles or SPLOM_FIELDS
+    fields = splom["fields"]
+    cells, hist, outliers = splom["cells"], splom["hist"], splom["outliers"]
+    color = alt.Color(
+        "count:Q",
+        title="Grants",
+        scale=alt.Scale(type="log", scheme="blues"),
+    )
+
+    rows = []
+    for i, fy in enumerate(fields):
+        row = []
+        for j, fx in enumerate(fields[:i + 1]):
+            x_title = titles.get(fx, fx) if i == len(fields) - 1 else ""
+            y_title = titles.get(fy, fy) if j == 0 else ""
+            if fx == fy:
+                bars = hist.loc[hist["field"] == fx, ["x", "x2", "count"]]
+                chart = alt.Chart(bars).mark_rect(color="#1d4ed8").encode(
+                    x=alt.X("x:Q", title=x_title, scale=alt.Scale(zero=False, nice=False)),
+                    x2="x2:Q",
+                    y=alt.Y("count:Q", title="Grants" if j == 0 else ""),
+                    tooltip=[alt.Tooltip("x:Q", title="From"), alt.Tooltip("x2:Q", title="To"), "count:Q"],
+                )
+            else:
+                in_pair = (cells["x_field"] == fx) & (cells["y_field"] == fy)
+                pair = cells.loc[in_pair, ["x", "x2", "y", "y2", "count"]]
+                chart = alt.Chart(pair).mark_rect().encode(
+                    x=alt.X("x:Q", title=x_title, scale=alt.Scale(zero=False, nice=False)),
+                    x2="x2:Q",
+                    y=alt.Y("y:Q", title=y_title, scale=alt.Scale(zero=False, nice=False)),
+                    y2="y2:Q",
+                    color=color,
+                    tooltip=["count:Q"],
+                )
+                points = outliers.loc[(outliers["x_field"] == fx) & (outliers["y_field"] == fy), ["x", "y"]]
+                if show_outliers and len(points):
+                    chart = chart + alt.Chart(points).mark_point(
+                        size=12, color="#b91c1c", opacity=0.6
+                    ).encode(x="x:Q", y="y:Q")
+            row.append(chart.properties(width=size, height=size))
+        rows.append(alt.hconcat(*row))
+    return alt.vconcat(*rows).properties(
+        title=f"Density scatterplot matrix ({splom['n']:,} grants; red: sampled outliers)"
+    )
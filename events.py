@@ -0,0 +1,226 @@
+"""Append-only log of grant status transitions plus a current-state snapshot.
+
+Each NSF export flattens a grant's history into one row (`terminated`,
+`reinstated`, `termination_date`, `reinstatement_date`) and overwrites the
+previous export, so earlier states are lost. `GrantEventStore` keeps them:
+
+- `events.jsonl` is append-only. `ingest(grants, source_key)` diffs an export
+  against the snapshot and appends one event per changed grant and field
+  (terminated / reinstated / reinstatement_revoked / unterminated /
+  dropped_from_export / returned_to_export), plus `first_seen` for every grant
+  the store has not seen before. An export that was already ingested appends
+  nothing.
+- `snapshot.parquet` is the materialized current state, indexed by
+  `grant_id`, with a row for every grant seen so far. Ingesting replaces only
+  the rows that changed in memory; the file is then rewritten as a whole
+  (parquet has no in-place update), which happens once per new export and
+  takes milliseconds at this size. Reading a grant's status is one index
+  lookup.
+- `sources.json` lists the exports ingested so far. The app and api.py may
+  ingest the same export from two processes, so `ingest` holds a file lock
+  (`.lock`) while it re-reads sources.json, picks up another process's
+  snapshot, and appends.
+- `state_as_of(date)` replays the log up to a date (by the event's effective
+  date, falling back to when it was recorded) for historical questions.
+
+Unlike data/cache, this directory is history: deleting it loses the
+transitions seen so far.
+"""
+import contextlib
+import fcntl
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+import pandas as pd
+
+DEFAULT_EVENTS_DIR = "data/events"
+STATUS_FIELDS = ["terminated", "reinstated"]
+SNAPSHOT_COLUMNS = [
+    "terminated", "reinstated", "termination_date", "reinstatement_date",
+    "in_export", "last_event", "last_seq", "updated_at",
+]
+# (field, new value) -> event name
+TRANSITIONS = {
+    ("terminated", True): "terminated",
+    ("terminated", False): "unterminated",
+    ("reinstated", True): "reinstated",
+    ("reinstated", False): "reinstatement_revoked",
+}
+EFFECTIVE_DATE = {"terminated": "termination_date", "reinstated": "reinstatement_date"}
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+class GrantEventStore:
+    """Event log + snapshot for grant statuses, stored under `directory`."""
+
+    def __init__(self, directory=DEFAULT_EVENTS_DIR):
+        self.directory = directory
+        self.log_path = os.path.join(directory, "events.jsonl")
+        self.snapshot_path = os.path.join(directory, "snapshot.parquet")
+        self.sources_path = os.path.join(directory, "sources.json")
+        self.lock_path = os.path.join(directory, ".lock")
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.snapshot = self._load_snapshot()
+        self.sources = self._load_sources()
+        self.next_seq = int(self.snapshot["last_seq"].max()) + 1 if len(self.snapshot) else 0
+
+    def _load_snapshot(self):
+        if os.path.exists(self.snapshot_path):
+            snapshot = pd.read_parquet(self.snapshot_path)
+            # plain object ids: the arrow-backed string index makes lookups/isin slow
+            snapshot.index = snapshot.index.astype(object)
+            return snapshot
+        empty = pd.DataFrame(columns=SNAPSHOT_COLUMNS, index=pd.Index([], name="grant_id", dtype=object))
+        return empty.astype({"terminated": bool, "reinstated": bool, "in_export": bool, "last_seq": "int64"})
+
+    def _load_sources(self):
+        if os.path.exists(self.sources_path):
+            with open(self.sources_path) as f:
+                return json.load(f)
+        return {}
+
+    # === Writing ===
+
+    @contextlib.contextmanager
+    def _exclusive(self):
+        """Hold the store for this thread and, through the lock file, this process."""
+        with self._lock, open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        """Pick up exports another process ingested since this store was loaded."""
+        sources = self._load_sources()
+        if sources.keys() != self.sources.keys():
+            self.snapshot = self._load_snapshot()
+            self.next_seq = int(self.snapshot["last_seq"].max()) + 1 if len(self.snapshot) else 0
+        self.sources = sources
+
+    def ingest(self, grants, source_key, observed_at=None):
+        """Append the transitions in export `grants` and update the snapshot.
+
+        Returns the number of events appended (0 if `source_key` was seen before,
+        by this store or by another process).
+        """
+        with self._exclusive():
+            self._refresh()
+            if source_key in self.sources:
+                return 0
+            observed_at = observed_at or _now()
+            current = grants.assign(grant_id=grants["grant_id"].astype(str)).drop_duplicates("grant_id")
+            current = current.set_index("grant_id")
+            for field in STATUS_FIELDS:
+                current[field] = current[field].fillna(False).astype(bool) if field in current else False
+            for date_col in EFFECTIVE_DATE.values():
+                current[date_col] = pd.to_datetime(current.get(date_col), errors="coerce")
+
+            previous = self.snapshot.reindex(current.index)
+            is_new = previous["last_seq"].isna()
+            frames = []
+            for field in STATUS_FIELDS:
+                old = previous[field].where(~is_new, False).astype(bool)
+                changed = current.loc[current[field] != old]
+                for value in (True, False):
+                    rows = changed[changed[field] == value]
+                    name = TRANSITIONS[(field, value)]
+                    date_col = EFFECTIVE_DATE.get(name)
+                    frames.append(pd.DataFrame({
+                        "grant_id": rows.index.to_numpy(),
+                        "event": name,
+                        "effective_date": rows[date_col].dt.strftime("%Y-%m-%d").to_numpy() if date_col else None,
+                    }))
+            back = current.index[~is_new & ~previous["in_export"].fillna(True).astype(bool)]
+            gone = self.snapshot.index[self.snapshot["in_export"] & ~self.snapshot.index.isin(current.index)]
+            # first, so a new grant's status event stays its last_event
+            frames.insert(0, pd.DataFrame({"grant_id": current.index[is_new], "event": "first_seen",
+                                           "effective_date": None}))
+            frames.append(pd.DataFrame({"grant_id": back, "event": "returned_to_export", "effective_date": None}))
+            frames.append(pd.DataFrame({"grant_id": gone, "event": "dropped_from_export", "effective_date": None}))
+            events = pd.concat(frames, ignore_index=True)
+            events["effective_date"] = events["effective_date"].astype(object).where(events["effective_date"].notna(), None)
+            events["seq"] = range(self.next_seq, self.next_seq + len(events))
+            events["source"] = source_key
+            events["recorded_at"] = observed_at
+            self.next_seq += len(events)
+            if len(events):
+                with open(self.log_path, "a") as f:
+                    events.to_json(f, orient="records", lines=True)
+            self._apply(current, events, observed_at)
+            self.sources[source_key] = {"recorded_at": observed_at, "events": len(events)}
+            tmp = self.sources_path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(self.sources, f, indent=1)
+            os.replace(tmp, self.sources_path)
+            return len(events)
+
+    def _apply(self, current, events, observed_at):
+        """Update only the snapshot rows touched by `events`."""
+        if not len(events):
+            return
+        touched = events.drop_duplicates("grant_id", keep="last").set_index("grant_id")
+        in_export = touched.index[touched.index.isin(current.index)]
+        rows = current.loc[in_export, STATUS_FIELDS + list(EFFECTIVE_DATE.values())].copy()
+        rows["in_export"] = True
+        dropped = touched.index.difference(in_export)
+        if len(dropped):
+            kept = self.snapshot.loc[dropped].copy()
+            kept["in_export"] = False
+            rows = pd.concat([rows, kept[rows.columns]])
+        rows["last_event"] = touched.loc[rows.index, "event"]
+        rows["last_seq"] = touched.loc[rows.index, "seq"].astype("int64")
+        rows["updated_at"] = observed_at
+        snapshot = self.snapshot.drop(index=rows.index, errors="ignore")
+        snapshot = pd.concat([snapshot, rows[SNAPSHOT_COLUMNS]])
+        snapshot.index = snapshot.index.astype(object).rename("grant_id")
+        for col in EFFECTIVE_DATE.values():
+            snapshot[col] = pd.to_datetime(snapshot[col])
+        self.snapshot = snapshot.astype({f: bool for f in STATUS_FIELDS + ["in_export"]})
+        tmp = self.snapshot_path + ".tmp"
+        self.snapshot.to_parquet(tmp)
+        os.replace(tmp, self.snapshot_path)
+
+    # === Reading ===
+
+    def status(self, grant_id):
+        """Current state of one grant (a Series), or None if it was never seen."""
+        grant_id = str(grant_id)
+        return self.snapshot.loc[grant_id] if grant_id in self.snapshot.index else None
+
+    def statuses(self, grant_ids):
+        """Current state aligned with `grant_ids` (missing grants give NaN rows)."""
+        return self.snapshot.reindex(pd.Index(grant_ids, dtype=object).astype(str))
+
+    def events(self):
+        """The full log as a DataFrame, in append order."""
+        if not os.path.exists(self.log_path):
+            return pd.DataFrame(columns=["seq", "grant_id", "event", "effective_date", "source", "recorded_at"])
+        return pd.read_json(self.log_path, lines=True, dtype={"grant_id": str})
+
+    def state_as_of(self, date):
+        """terminated / reinstated per grant as of `date`, replayed from the log."""
+        log = self.events()
+        cutoff = pd.Timestamp(date)
+        when = pd.to_datetime(log["effective_date"], errors="coerce")
+        recorded = pd.to_datetime(log["recorded_at"], errors="coerce", utc=True).dt.tz_localize(None)
+        log = log[when.fillna(recorded) <= cutoff].sort_values("seq")
+        state = pd.DataFrame(index=pd.Index(log["grant_id"].unique(), name="grant_id"))
+        for field in STATUS_FIELDS:
+            names = {TRANSITIONS[(field, True)]: True, TRANSITIONS[(field, False)]: False}
+            last = log[log["event"].isin(names)].drop_duplicates("grant_id", keep="last")
+            state[field] = last.set_index("grant_id")["event"].map(names).reindex(state.index).fillna(False)
+        return state
+
+    def reinstatement_days(self):
+        """Days from termination to reinstatement for currently reinstated grants."""
+        s = self.snapshot[self.snapshot["reinstated"]]
+        days = (s["reinstatement_date"] - s["termination_date"]).dt.days
+        return days.dropna().rename("days_to_reinstatement")
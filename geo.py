@@ -0,0 +1,244 @@
+"""Level-of-detail geometry tiers for the Q1 choropleth.
+
+The raw us-10m TopoJSON carries every state and county at full resolution;
+shipping it inline for a 260px map makes the spec (and the browser's
+projection work) far heavier than the view needs. `build_geometry_tiers`
+turns it into small, pre-simplified state TopoJSON files under data/geo/tiers:
+
+    states_small.json      states, coarse (mini panels)
+    states.json            states, finer (full-size map)
+
+Arcs are simplified once (Douglas-Peucker on each shared arc, endpoints kept),
+so neighbouring shapes still meet exactly. The app picks a state tier with
+`choose_tier` from the view width, loads only that file (`load_tier`), and
+attaches the aggregate values to the geometries server-side with
+`join_values`, so the browser needs no lookup transform.
+
+The tiers are not bundled; build them once from a local copy of the geometry
+(until then the app uses the CDN copy of us-10m):
+
+    python geo.py data/geo/us-10m.json
+"""
+import argparse
+import copy
+import json
+import os
+from functools import lru_cache
+
+import numpy as np
+
+from loader import GEOMETRY_PATH
+
+DEFAULT_TIER_DIR = "data/geo/tiers"
+MANIFEST_NAME = "manifest.json"
+
+# tolerance is in degrees (the source is unprojected lon/lat)
+TIERS = {
+    "states_small": {"object": "states", "tolerance": 0.08, "max_width": 320},
+    "states": {"object": "states", "tolerance": 0.02, "max_width": None},
+}
+QUANTIZATION = 1e5
+
+
+# === TopoJSON arcs ===
+
+def decode_arcs(topology):
+    """Absolute float coordinates of every arc (undoes quantization/delta encoding)."""
+    transform = topology.get("transform")
+    arcs = []
+    for arc in topology["arcs"]:
+        points = np.asarray(arc, dtype=float)[:, :2]
+        if transform:
+            points = np.cumsum(points, axis=0) * transform["scale"] + transform["translate"]
+        arcs.append(points)
+    return arcs
+
+
+def simplify_arc(points, tolerance):
+    """Douglas-Peucker on one arc; the endpoints (arc junctions) are always kept."""
+    n = len(points)
+    if n <= 2 or tolerance <= 0:
+        return points
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    closed = np.allclose(points[0], points[-1])
+    stack = [(0, n - 1)]
+    if closed:
+        # a ring has no baseline: split at the point farthest from its start
+        far = int(np.argmax(np.hypot(*(points - points[0]).T)))
+        keep[far] = True
+        stack = [(0, far), (far, n - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        a, b = points[start], points[end]
+        seg = points[start + 1:end]
+        d = b - a
+        length = np.hypot(*d)
+        if length == 0:
+            dist = np.hypot(*(seg - a).T)
+        else:
+            dist = np.abs(d[0] * (seg[:, 1] - a[1]) - d[1] * (seg[:, 0] - a[0])) / length
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            mid = start + 1 + i
+            keep[mid] = True
+            stack.extend([(start, mid), (mid, end)])
+    if closed and keep.sum() < 4:
+        # keep degenerate rings drawable
+        keep[np.linspace(0, n - 1, min(n, 4)).astype(int)] = True
+    return points[keep]
+
+
+def _arc_indices(geometry):
+    """Every arc index (non-negative) a geometry references."""
+    arcs = geometry.get("arcs")
+    out = set()
+
+    def walk(node):
+        if isinstance(node, list):
+            for item in node:
+                walk(item)
+        else:
+            out.add(node if node >= 0 else ~node)
+
+    if arcs is not None:
+        walk(arcs)
+    return out
+
+
+def _remap_arcs(node, mapping):
+    if isinstance(node, list):
+        return [_remap_arcs(item, mapping) for item in node]
+    return mapping[node] if node >= 0 else ~mapping[~node]
+
+
+def encode_topology(objects, arcs, quantization=QUANTIZATION):
+    """Quantized, delta-encoded TopoJSON holding `objects` and only the arcs they use."""
+    used = sorted(set().union(*(_arc_indices(g) for obj in objects.values() for g in obj["geometries"])))
+    mapping = {old: new for new, old in enumerate(used)}
+    kept = [arcs[i] for i in used]
+    if kept:
+        stacked = np.vstack(kept)
+        lo, hi = stacked.min(axis=0), stacked.max(axis=0)
+    else:
+        lo, hi = np.zeros(2), np.ones(2)
+    scale = np.where(hi > lo, (hi - lo) / (quantization - 1), 1.0)
+    encoded = []
+    for points in kept:
+        q = np.round((points - lo) / scale).astype(np.int64)
+        # drop points that collapse onto their predecessor after quantization
+        q = q[np.r_[True, np.any(np.diff(q, axis=0) != 0, axis=1)]]
+        if len(q) == 1:
+            q = np.vstack([q, q])
+        deltas = np.vstack([q[:1], np.diff(q, axis=0)])
+        encoded.append(deltas.tolist())
+    out_objects = {}
+    for name, obj in objects.items():
+        geometries = []
+        for g in obj["geometries"]:
+            g = dict(g)
+            if "arcs" in g:
+                g["arcs"] = _remap_arcs(g["arcs"], mapping)
+            geometries.append(g)
+        out_objects[name] = {"type": "GeometryCollection", "geometries": geometries}
+    return {
+        "type": "Topology",
+        "transform": {"scale": scale.tolist(), "translate": lo.tolist()},
+        "objects": out_objects,
+        "arcs": encoded,
+    }
+
+
+# === Building the tiers ===
+
+def tier_path(tier, tier_dir=DEFAULT_TIER_DIR):
+    return os.path.join(tier_dir, f"{tier}.json")
+
+
+def _write(path, topology):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(topology, f, separators=(",", ":"))
+    return os.path.getsize(path)
+
+
+def build_geometry_tiers(source_path=GEOMETRY_PATH, tier_dir=DEFAULT_TIER_DIR):
+    """Write every tier from the raw TopoJSON; returns the manifest (file sizes)."""
+    with open(source_path) as f:
+        topology = json.load(f)
+
+    manifest = {"source": os.path.basename(source_path), "tiers": {}}
+    decoded = decode_arcs(topology)
+    for tier, spec in TIERS.items():
+        arcs = [simplify_arc(a, spec["tolerance"]) for a in decoded]
+        geometries = topology["objects"][spec["object"]]["geometries"]
+        size = _write(
+            tier_path(tier, tier_dir),
+            encode_topology({spec["object"]: {"geometries": geometries}}, arcs),
+        )
+        manifest["tiers"][tier] = {"object": spec["object"], "bytes": size}
+    with open(os.path.join(tier_dir, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+
+# === Using the tiers ===
+
+def tiers_available(tier_dir=DEFAULT_TIER_DIR):
+    return os.path.exists(os.path.join(tier_dir, MANIFEST_NAME))
+
+
+def choose_tier(width):
+    """Coarsest tier that still looks right at `width` px."""
+    for tier, spec in TIERS.items():
+        if spec["max_width"] is None or width <= spec["max_width"]:
+            return tier
+    return None
+
+
+@lru_cache(maxsize=8)
+def load_tier(tier, tier_dir=DEFAULT_TIER_DIR):
+    """One tier file (cached; treat the result as read-only and use `join_values` to add data)."""
+    with open(tier_path(tier, tier_dir)) as f:
+        return json.load(f)
+
+
+def join_values(topology, object_name, frame, key, fields, id_key="id"):
+    """Copy of `topology` whose geometries carry `fields` from `frame` as properties.
+
+    Rows are matched on `frame[key] == geometry[id_key]`; geometries without a
+    row get nulls. Arcs are shared with the input, not copied.
+    """
+    rows = frame.set_index(key)[list(fields)]
+    rows = rows[~rows.index.duplicated()]
+    lookup = {int(k): v for k, v in rows.to_dict("index").items() if k == k}
+    out = dict(topology)
+    out["objects"] = dict(topology["objects"])
+    obj = copy.copy(topology["objects"][object_name])
+    geometries = []
+    for g in obj["geometries"]:
+        g = dict(g)
+        values = lookup.get(int(g[id_key])) if id_key in g else None
+        g["properties"] = dict(g.get("properties") or {}, **{
+            f: (None if values is None or values[f] != values[f] else values[f]) for f in fields
+        })
+        geometries.append(g)
+    obj["geometries"] = geometries
+    out["objects"][object_name] = obj
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the Q1 geometry tiers.")
+    parser.add_argument("source", nargs="?", default=GEOMETRY_PATH, help="raw us-10m TopoJSON")
+    parser.add_argument("--out", default=DEFAULT_TIER_DIR)
+    args = parser.parse_args(argv)
+    manifest = build_geometry_tiers(args.source, args.out)
+    for tier, info in manifest["tiers"].items():
+        print(f"{tier:<14}{info['bytes'] / 1024:>10.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
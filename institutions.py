@@ -0,0 +1,218 @@
+"""Entity resolution for `org_name`.
+
+The export spells the same institution several ways ("Regents of the
+University of Michigan - Ann Arbor", "University of Michigan", "The Ohio State
+University" / "Ohio State University", ...), which splits its losses across
+several bars in Q2/Q3. Names are resolved to canonical IDs in three steps:
+
+1. normalization (case, accents, punctuation, legal prefixes such as
+   "Regents of the", abbreviations such as "Univ"); ambiguous ones such as
+   "St" (State or Saint) are left alone;
+2. a campus rule: "<base> - <campus>" folds into "<base>" only when that base
+   has a single campus variant (so the UC campuses stay separate);
+3. fuzzy matching against existing canonicals, restricted to candidates found
+   through a character-trigram blocking index, which keeps the work close to
+   linear in the number of distinct names.
+
+New names are resolved in a fixed order (bare names first, then by frequency
+and name), and a campus folded into its base is split off again once a
+second campus of that base shows up, so the IDs do not depend on the order of
+the input or on how earlier runs batched it. The raw name -> canonical ID
+mapping is cached on disk, so later runs only resolve names they have never
+seen.
+"""
+import json
+import os
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+import pandas as pd
+
+DEFAULT_MAPPING_PATH = "data/cache/institutions.json"
+
+LEGAL_PREFIXES = [
+    "the board of regents of the ", "board of regents of the ", "the regents of the ",
+    "regents of the ", "board of trustees of the ", "trustees of the ",
+    "president and fellows of ", "the trustees of ", "the ",
+]
+ABBREVIATIONS = {
+    "univ": "university", "u": "university", "inst": "institute",
+    "coll": "college",
+}
+LEGAL_SUFFIXES = {"inc", "incorporated", "corp", "corporation", "llc", "the"}
+GENERIC_WORDS = {"university", "of", "the", "and", "at", "college", "institute", "for", "in"}
+INSTITUTION_WORDS = {"university", "college", "institute"}
+_SORTED_INSTITUTION_WORDS = {"".join(sorted(w)): w for w in INSTITUTION_WORDS}
+CAMPUS_SEPARATOR = re.compile(r"\s+-\s+|\s*[-–]\s*|,\s*|\s+at\s+")
+
+
+def _ascii(text):
+    return unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode()
+
+
+def _clean(text):
+    words = re.sub(r"[^a-z0-9 ]+", " ", text.replace("&", " and ")).split()
+    words = [ABBREVIATIONS.get(w, w) for w in words]
+    # transposition typos of the institution words ("univeristy")
+    words = [_SORTED_INSTITUTION_WORDS.get("".join(sorted(w)), w) for w in words]
+    while words and words[-1] in LEGAL_SUFFIXES:
+        words.pop()
+    return " ".join(words)
+
+
+def split_name(name):
+    """Normalize a raw org name into (base, campus); campus is "" if absent."""
+    text = _ascii(str(name)).lower().strip()
+    text = re.sub(r"\s+", " ", text)
+    for prefix in LEGAL_PREFIXES:
+        if text.startswith(prefix):
+            text = text[len(prefix):]
+    # split at the last separator whose left side already names an institution,
+    # so "Winston-Salem State University" is not cut but "... - Ann Arbor" is
+    for m in reversed(list(CAMPUS_SEPARATOR.finditer(text))):
+        left, right = text[:m.start()], text[m.end():]
+        if INSTITUTION_WORDS & set(_clean(left).split()) and _clean(right):
+            return _clean(left), _clean(right)
+    return _clean(text), ""
+
+
+def normalize_name(name):
+    base, campus = split_name(name)
+    return f"{base} {campus}".strip()
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _distinctive(key):
+    return " ".join(w for w in key.split() if w not in GENERIC_WORDS)
+
+
+def similarity(a, b):
+    """Trigram Jaccard on the full keys, capped by the distinctive words' similarity."""
+    def jaccard(x, y):
+        tx, ty = trigrams(x), trigrams(y)
+        return len(tx & ty) / len(tx | ty) if tx or ty else 1.0
+    return min(jaccard(a, b), jaccard(_distinctive(a), _distinctive(b)))
+
+
+class InstitutionResolver:
+    """Incremental org_name -> canonical ID resolver with a trigram blocking index."""
+
+    def __init__(self, path=DEFAULT_MAPPING_PATH, threshold=0.85, max_postings=200):
+        self.path = path
+        self.threshold = threshold
+        self.max_postings = max_postings
+        self.aliases = {}        # raw name -> canonical id
+        self.key_to_id = {}      # normalized key -> canonical id
+        self.id_keys = defaultdict(set)  # canonical id -> normalized keys
+        self.index = defaultdict(set)  # trigram -> canonical ids
+        self.campuses = defaultdict(set)  # base -> campus variants seen
+        self.n_ids = 0
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for raw, cid in json.load(f)["aliases"].items():
+                    self._add(raw, cid)
+
+    def _add(self, raw, cid):
+        base, campus = split_name(raw)
+        key = f"{base} {campus}".strip()
+        self.aliases[raw] = cid
+        self.key_to_id.setdefault(key, cid)
+        self.id_keys[cid].add(key)
+        if campus:
+            self.campuses[base].add(campus)
+        for gram in trigrams(key):
+            self.index[gram].add(cid)
+        self.n_ids = max(self.n_ids, cid + 1)
+
+    def _candidates(self, key):
+        grams = trigrams(key)
+        shared = Counter()
+        for gram in grams:
+            postings = self.index.get(gram, ())
+            # very common trigrams ("uni", "ver", ...) carry no blocking signal
+            if len(postings) <= self.max_postings:
+                shared.update(postings)
+        # Jaccard >= t needs at least t * |grams| shared trigrams
+        need = self.threshold * len(grams) - sum(
+            1 for g in grams if len(self.index.get(g, ())) > self.max_postings
+        )
+        return [cid for cid, n in shared.items() if n >= need]
+
+    def _match(self, raw):
+        base, campus = split_name(raw)
+        key = f"{base} {campus}".strip()
+        if key in self.key_to_id:
+            return self.key_to_id[key]
+        if campus and self.campuses[base] <= {campus} and base in self.key_to_id:
+            return self.key_to_id[base]
+        best, best_score = None, self.threshold
+        for cid in self._candidates(key):
+            score = max(similarity(key, k) for k in self.id_keys[cid])
+            if score >= best_score:
+                best, best_score = cid, score
+        return best
+
+    def _unfold(self, bases):
+        """Drop aliases folded into one of `bases` by the campus rule; returns them."""
+        folded = []
+        for raw, cid in list(self.aliases.items()):
+            base, campus = split_name(raw)
+            if campus and base in bases and self.key_to_id.get(base) == cid:
+                key = f"{base} {campus}"
+                del self.aliases[raw]
+                self.id_keys[cid].discard(key)
+                if self.key_to_id.get(key) == cid:
+                    del self.key_to_id[key]
+                folded.append(raw)
+        return folded
+
+    def resolve(self, names):
+        """Return canonical IDs aligned with `names`, resolving unseen names first."""
+        names = pd.Series(names, dtype=object).fillna("")
+        counts = names.value_counts()
+        new = [n for n in counts.index if n not in self.aliases]
+        if new:
+            single = {base for base, seen in self.campuses.items() if len(seen) == 1}
+            for raw in new:
+                base, campus = split_name(raw)
+                if campus:
+                    self.campuses[base].add(campus)
+            # a base that now has several campuses no longer folds the earlier one
+            grown = {base for base in single if len(self.campuses[base]) > 1}
+            new += self._unfold(grown) if grown else []
+            # bare names first so campus variants can fold into them; then
+            # frequent first, ties by name so the input order does not matter
+            new.sort(key=lambda n: (bool(split_name(n)[1]), -counts.get(n, 0), n))
+            for raw in new:
+                cid = self._match(raw)
+                self._add(raw, self.n_ids if cid is None else cid)
+            self.save()
+        return names.map(self.aliases)
+
+    def canonical_names(self, names):
+        """Canonical display name per row: the most frequent raw spelling of its ID."""
+        names = pd.Series(names, dtype=object).fillna("")
+        ids = self.resolve(names)
+        display = (
+            pd.DataFrame({"id": ids, "name": names})
+            .groupby(["id", "name"]).size()
+            .reset_index(name="n")
+            .sort_values(["n", "name"], ascending=[False, True])
+            .drop_duplicates("id")
+            .set_index("id")["name"]
+        )
+        return ids.map(display)
+
+    def save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"aliases": self.aliases}, f)
+        os.replace(tmp, self.path)
@@ -0,0 +1,81 @@
+"""Concurrent startup loading of the dashboard's source files.
+
+The NSF export, the Cruz list, the flagged-word list and the (optional) local
+geometry asset are read in a thread pool. Callers ask for each source with
+`result(name)`, so a stage can start as soon as the inputs it needs are ready
+while the other files are still being parsed.
+"""
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+NSF_PATH = "data/raw/nsf_terminations_airtable_copy.csv"
+CRUZ_PATH = "data/raw/cruz_list_copy.csv"
+FLAGGED_WORDS_PATH = "data/raw/flagged_words_trump_admin_copy.csv"
+GEOMETRY_PATH = "data/geo/us-10m.json"
+
+
+def read_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+class SourceLoader:
+    """Thread-pool loader that records how long each source took."""
+
+    def __init__(self, max_workers=4):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="loader")
+        self._futures = {}
+        self._started = time.perf_counter()
+        self._finished = {}
+        self.timings = {}
+
+    def submit(self, name, fn, *args, **kwargs):
+        def timed():
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                end = time.perf_counter()
+                self.timings[name] = end - start
+                self._finished[name] = end
+
+        self._futures[name] = self._pool.submit(timed)
+
+    def has(self, name):
+        return name in self._futures
+
+    def result(self, name):
+        """Block until `name` is loaded and return it (re-raises load errors)."""
+        return self._futures[name].result()
+
+    def report(self):
+        """Per-source load time plus the wall time from the loader's start until
+        its last source finished (NaN while some are still loading)."""
+        rows = [
+            {"source": name, "seconds": round(self.timings.get(name, float("nan")), 4)}
+            for name in self._futures
+        ]
+        if self._futures and len(self._finished) == len(self._futures):
+            wall = max(self._finished.values()) - self._started
+        else:
+            wall = float("nan")
+        rows.append({"source": "wall", "seconds": round(wall, 4)})
+        return pd.DataFrame(rows)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=True)
+
+
+def start_source_loader(nsf_usecols=None, geometry_path=GEOMETRY_PATH):
+    """Submit every startup source and return the running loader."""
+    loader = SourceLoader()
+    loader.submit("nsf", pd.read_csv, NSF_PATH, usecols=nsf_usecols)
+    loader.submit("cruz", pd.read_csv, CRUZ_PATH, sep=";")
+    loader.submit("flagged_words", pd.read_csv, FLAGGED_WORDS_PATH)
+    if geometry_path and os.path.exists(geometry_path):
+        loader.submit("geometry", read_json, geometry_path)
+    return loader
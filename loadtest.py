@@ -0,0 +1,292 @@
+"""Headless load testing for the Streamlit dashboard.
+
+Drives many simulated sessions of app.py with `streamlit.testing.v1.AppTest`
+(no browser, no server socket) and records, per scenario:
+
+- per-rerun latency percentiles (p50/p95/p99),
+- server CPU time and utilisation,
+- RSS growth of the process,
+- payload bytes each session receives (serialized element protos).
+
+Scenarios:
+    cold         before every session all caches are cleared (Streamlit's, the
+                 in-process ones and the disk caches under data/cache), then
+                 the session runs the script once; sessions run one at a
+                 time, since a concurrent one would find the caches warm
+    warm         sessions run once to warm up, then `--reruns` measured reruns
+    widget_storm every measured rerun first changes each widget on the page
+
+Examples:
+    python loadtest.py run --scenario warm --sessions 50 --out reports/warm.json
+    python loadtest.py compare reports/old.json reports/new.json
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+APP_PATH = "app.py"
+CACHE_DIR = "data/cache"
+SCENARIOS = ("cold", "warm", "widget_storm")
+
+
+def rss_mb():
+    """Current resident set size of this process, in MB."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # peak RSS is the best portable fallback (KB on Linux, bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def payload_bytes(node):
+    """Serialized size of every element the session received."""
+    children = getattr(node, "children", None)
+    if children:
+        return sum(payload_bytes(child) for child in children.values())
+    proto = getattr(node, "proto", None)
+    return proto.ByteSize() if proto is not None else 0
+
+
+def accepts_label(widget, label):
+    """Whether `set_value(label)` selects that option.
+
+    AppTest only exposes the formatted option labels. A label is taken as-is
+    when the widget's `format_func` rejects it (e.g. a dict lookup) or maps it
+    to itself; any other `format_func` would format it a second time.
+    """
+    try:
+        return widget.format_func(label) == label
+    except Exception:
+        return True
+
+
+def change_widgets(at, step):
+    """Move every supported widget on the page to another value."""
+    changed = 0
+    for kind in ("selectbox", "radio"):
+        for widget in getattr(at, kind):
+            options = [label for label in widget.options if accepts_label(widget, label)]
+            if len(options) > 1:
+                widget.set_value(options[step % len(options)])
+                changed += 1
+    for kind in ("checkbox", "toggle"):
+        for widget in getattr(at, kind):
+            widget.set_value(not widget.value)
+            changed += 1
+    for widget in at.slider:
+        lo, hi = widget.min, widget.max
+        if isinstance(lo, (int, float)) and not isinstance(widget.value, (list, tuple)):
+            widget.set_value(lo + (hi - lo) * ((step % 4) / 4))
+            changed += 1
+    return changed
+
+
+def _timed_run(at, timeout):
+    start = time.perf_counter()
+    at.run(timeout=timeout)
+    elapsed = time.perf_counter() - start
+    if at.exception:
+        raise RuntimeError(f"Script raised: {at.exception[0].value}")
+    return elapsed
+
+
+def run_session(app_path, scenario, reruns, timeout):
+    """One simulated viewer. Returns its latencies, payload and widget changes."""
+    from streamlit.testing.v1 import AppTest
+
+    if scenario == "cold":
+        clear_caches()
+    at = AppTest.from_file(app_path, default_timeout=timeout)
+    latencies = [_timed_run(at, timeout)]
+    if scenario == "cold":
+        return {"latencies": latencies, "payload_bytes": payload_bytes(at._tree), "widget_changes": 0}
+
+    measured, widget_changes = [], 0
+    for step in range(reruns):
+        if scenario == "widget_storm":
+            widget_changes += change_widgets(at, step + 1)
+        measured.append(_timed_run(at, timeout))
+    return {
+        "latencies": measured,
+        "payload_bytes": payload_bytes(at._tree),
+        "widget_changes": widget_changes,
+    }
+
+
+def clear_caches(cache_dir=CACHE_DIR):
+    """Forget everything the app has cached, in memory and on disk."""
+    import streamlit as st
+
+    import geo
+    import server_transforms
+    import snapshots
+
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    with server_transforms._cache_lock:
+        server_transforms._cache.clear()
+    geo.load_tier.cache_clear()
+    snapshots.diff_snapshots.cache_clear()
+    # text store, token corpora, dedup, specs, statistics, topics, institutions
+    if os.path.isdir(cache_dir):
+        shutil.rmtree(cache_dir)
+
+
+def percentiles(values):
+    arr = np.asarray(values, dtype=float) * 1000
+    if not len(arr):
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "mean_ms": None, "max_ms": None}
+    return {
+        "p50_ms": round(float(np.percentile(arr, 50)), 2),
+        "p95_ms": round(float(np.percentile(arr, 95)), 2),
+        "p99_ms": round(float(np.percentile(arr, 99)), 2),
+        "mean_ms": round(float(arr.mean()), 2),
+        "max_ms": round(float(arr.max()), 2),
+    }
+
+
+def git_version():
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_scenario(scenario, sessions, reruns=5, concurrency=8, app_path=APP_PATH, timeout=600, label=None):
+    """Run one scenario and return its report dict."""
+    if scenario not in SCENARIOS:
+        raise ValueError(f"Unknown scenario {scenario!r}; expected one of {SCENARIOS}")
+    # sys.stdout is process-wide, so the app's prints are silenced once here
+    # rather than per session thread
+    if scenario == "cold":
+        concurrency = 1
+    with contextlib.redirect_stdout(io.StringIO()):
+        if scenario != "cold":
+            # warm the shared caches once so the measurement starts from steady state
+            run_session(app_path, "warm", 0, timeout)
+
+        gc.collect()
+        rss_start = rss_mb()
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(
+                lambda _: run_session(app_path, scenario, reruns, timeout), range(sessions)
+            ))
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+    gc.collect()
+    rss_end = rss_mb()
+
+    latencies = [t for r in results for t in r["latencies"]]
+    payloads = [r["payload_bytes"] for r in results]
+    return {
+        "label": label or git_version(),
+        "scenario": scenario,
+        "sessions": sessions,
+        "reruns_per_session": 1 if scenario == "cold" else reruns,
+        "concurrency": concurrency,
+        "python": platform.python_version(),
+        "latency": percentiles(latencies),
+        "reruns": len(latencies),
+        "throughput_reruns_per_s": round(len(latencies) / wall, 2) if wall else None,
+        "wall_s": round(wall, 3),
+        "cpu_s": round(cpu, 3),
+        "cpu_utilisation": round(cpu / wall, 3) if wall else None,
+        "rss_start_mb": round(rss_start, 1),
+        "rss_end_mb": round(rss_end, 1),
+        "rss_growth_per_session_mb": round((rss_end - rss_start) / sessions, 3),
+        "payload_bytes_per_session": int(np.mean(payloads)) if payloads else 0,
+        "widget_changes": sum(r["widget_changes"] for r in results),
+    }
+
+
+COMPARE_METRICS = [
+    ("latency", "p50_ms"), ("latency", "p95_ms"), ("latency", "p99_ms"),
+    (None, "throughput_reruns_per_s"), (None, "cpu_utilisation"),
+    (None, "rss_growth_per_session_mb"), (None, "payload_bytes_per_session"),
+]
+
+
+def compare_reports(old, new):
+    """Rows of (scenario, metric, old, new, change %) for two report files."""
+    old_by = {r["scenario"]: r for r in old["runs"]}
+    rows = []
+    for run in new["runs"]:
+        base = old_by.get(run["scenario"])
+        if base is None:
+            continue
+        for group, metric in COMPARE_METRICS:
+            a = base[group][metric] if group else base[metric]
+            b = run[group][metric] if group else run[metric]
+            change = round((b - a) / a * 100, 1) if a not in (None, 0) and b is not None else None
+            rows.append((run["scenario"], metric, a, b, change))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="run one or more scenarios")
+    run.add_argument("--scenario", action="append", choices=SCENARIOS,
+                     help="repeatable; default runs all scenarios")
+    run.add_argument("--sessions", type=int, default=20)
+    run.add_argument("--reruns", type=int, default=5)
+    run.add_argument("--concurrency", type=int, default=8)
+    run.add_argument("--app", default=APP_PATH)
+    run.add_argument("--timeout", type=float, default=600)
+    run.add_argument("--label", help="version label stored in the report (default: git describe)")
+    run.add_argument("--out", help="write the JSON report here")
+
+    compare = sub.add_parser("compare", help="compare two reports")
+    compare.add_argument("old")
+    compare.add_argument("new")
+
+    args = parser.parse_args(argv)
+    if args.command == "compare":
+        with open(args.old) as f:
+            old = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        print(f"{'scenario':<14}{'metric':<28}{old['label']:>14}{new['label']:>14}{'change %':>10}")
+        for scenario, metric, a, b, change in compare_reports(old, new):
+            print(f"{scenario:<14}{metric:<28}{str(a):>14}{str(b):>14}{str(change):>10}")
+        return
+
+    scenarios = args.scenario or list(SCENARIOS)
+    runs = []
+    for scenario in scenarios:
+        report = run_scenario(
+            scenario, args.sessions, args.reruns, args.concurrency, args.app, args.timeout, args.label
+        )
+        runs.append(report)
+        print(json.dumps(report, indent=2))
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w") as f:
+            json.dump({"label": runs[0]["label"], "runs": runs}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,462 @@
+"""Data pipeline behind the dashboard.
+
+Loads the sources, cleans the NSF export, enriches it (text store, flagged
+word counts, near-duplicate abstracts, canonical institutions, watchlists),
+snapshots it and computes the Q1–Q5 aggregates, the research topics of the
+cancelled grants and the Q4/Q5 association statistics. `load_dataset`
+returns everything as one immutable `Dataset`; app.py keeps a single
+instance per server process (st.cache_resource) and every browser session
+reads from it without copying.
+
+Nothing here imports Streamlit, so the same pipeline can be reused by scripts
+and services.
+"""
+import os
+import threading
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+from budget import ALL_STATES, compute_budget_rollups, compute_state_rollups
+from dedup import DEFAULT_DEDUP_DIR, ensure_duplicate_clusters
+from density import compute_density_splom
+from events import DEFAULT_EVENTS_DIR, GrantEventStore
+from geo import DEFAULT_TIER_DIR, MANIFEST_NAME, tier_path, tiers_available
+from institutions import DEFAULT_MAPPING_PATH, InstitutionResolver
+from loader import (
+    CRUZ_PATH, FLAGGED_WORDS_PATH, GEOMETRY_PATH, NSF_PATH, start_source_loader,
+)
+from snapshots import DEFAULT_SNAPSHOT_DIR, SnapshotStore
+from stats import association_statistics
+from text_store import (
+    DEFAULT_STORE_DIR, TEXT_FIELDS, build_text_store, open_text_store,
+    source_fingerprint,
+)
+from tokens import DEFAULT_CORPUS_DIR, ensure_token_corpus
+from topics import DEFAULT_TOPIC_DIR, compute_topics
+from watchlists import DEFAULT_WATCHLIST_DIR, Watchlists
+
+COLUMNS_TO_REMOVE = [
+    "usa_start_date", "usa_end_date", "nsf_start_date", "nsf_end_date",
+    "status", "suspended", "nsf_url", "usaspending_url",
+    "org_city", "award_type", "nsf_primary_program"
+]
+BOOL_COLUMNS = ["terminated", "reinstated", "in_cruz_list"]
+NUMERIC_COLUMNS = [
+    "nsf_total_budget", "nsf_obligated", "usaspending_obligated",
+    "usaspending_outlaid", "estimated_budget",
+    "estimated_outlays", "estimated_remaining"
+]
+
+# FIPS mapping
+STATE_FIPS = {
+    "AL": 1, "AK": 2, "AZ": 4, "AR": 5, "CA": 6, "CO": 8, "CT": 9, "DE": 10, "DC": 11,
+    "FL": 12, "GA": 13, "HI": 15, "ID": 16, "IL": 17, "IN": 18, "IA": 19, "KS": 20,
+    "KY": 21, "LA": 22, "ME": 23, "MD": 24, "MA": 25, "MI": 26, "MN": 27, "MS": 28,
+    "MO": 29, "MT": 30, "NE": 31, "NV": 32, "NH": 33, "NJ": 34, "NM": 35, "NY": 36,
+    "NC": 37, "ND": 38, "OH": 39, "OK": 40, "OR": 41, "PA": 42, "RI": 44, "SC": 45,
+    "SD": 46, "TN": 47, "TX": 48, "UT": 49, "VT": 50, "VA": 51, "WA": 53, "WV": 54,
+    "WI": 55, "WY": 56
+}
+# Q2/Q3 rows kept per state for the dashboard's linked state selection
+LINKED_TOP = 20
+
+
+@dataclass(frozen=True)
+class Dataset:
+    """Cleaned grants plus precomputed aggregates, shared read-only across sessions."""
+
+    version: str
+    grants: pd.DataFrame
+    text_store: object
+    events: object
+    snapshots: object
+    snapshot_id: str
+    watchlists: object
+    flagged_words: tuple
+    flagged_matrix: MappingProxyType
+    aggregates: MappingProxyType
+    geometry: object
+    load_timings: pd.DataFrame
+
+
+def dataset_version():
+    """Identity of the current inputs; changes whenever a source file changes."""
+    paths = [
+        NSF_PATH, CRUZ_PATH, FLAGGED_WORDS_PATH, GEOMETRY_PATH,
+        os.path.join(DEFAULT_TIER_DIR, MANIFEST_NAME),
+    ]
+    return "|".join(source_fingerprint(p) for p in paths if os.path.exists(p))
+
+
+def clean_nsf_data(nsf_data):
+    """Drop unused columns and normalize dates, booleans and numerics."""
+    cleaned = nsf_data.drop(columns=COLUMNS_TO_REMOVE, errors="ignore")
+
+    # dates
+    for col in ["termination_date", "reinstatement_date"]:
+        if col in cleaned.columns:
+            cleaned[col] = pd.to_datetime(cleaned[col], errors="coerce")
+
+    # booleans
+    for col in BOOL_COLUMNS:
+        if col in cleaned.columns:
+            cleaned[col] = cleaned[col].astype(bool)
+
+    # numerics
+    for col in NUMERIC_COLUMNS:
+        if col in cleaned.columns:
+            cleaned[col] = pd.to_numeric(cleaned[col], errors="coerce")
+    return cleaned.reset_index(drop=True)
+
+
+def load_watchlists(grants, cruz_data, directory=DEFAULT_WATCHLIST_DIR):
+    """Membership bitsets of the Cruz list and every list file in `directory`."""
+    ids = grants["grant_id"] if "grant_id" in grants.columns else pd.Series([None] * len(grants))
+    watchlists = Watchlists(ids)
+    watchlists.register_frame("cruz", cruz_data)
+    watchlists.sync(directory)
+    return watchlists
+
+
+def core_aggregates(grants):
+    """Q1–Q3 tables; they only need the cleaned frame with canonical institutions."""
+    terminated_grants = grants[grants["terminated"]]
+    agg = {}
+
+    # Q1 – cancellations by state
+    state_cancellations = terminated_grants["org_state"].value_counts().reset_index()
+    state_cancellations.columns = ["state", "cancelled_grants"]
+    state_cancellations_map = state_cancellations.copy()
+    state_cancellations_map["id"] = state_cancellations_map["state"].map(STATE_FIPS)
+    state_cancellations_map["cancelled_grants"] = state_cancellations_map["cancelled_grants"].fillna(0)
+    agg["state_cancellations"] = state_cancellations
+    agg["state_cancellations_map"] = state_cancellations_map
+
+    # Q2 – institutions by number of cancelled grants
+    institution_cancellations = terminated_grants["org_canonical"].value_counts().reset_index()
+    institution_cancellations.columns = ["institution", "cancelled_grants"]
+    agg["institution_cancellations"] = institution_cancellations
+
+    # Q2 per state (top LINKED_TOP institutions each), for filtering by a state
+    # picked on the map; ALL_STATES rows are the overall ranking
+    per_state = (
+        terminated_grants.groupby(["org_state", "org_canonical"]).size()
+        .rename("cancelled_grants").reset_index()
+        .rename(columns={"org_state": "state", "org_canonical": "institution"})
+        .sort_values("cancelled_grants", ascending=False, kind="stable")
+        .groupby("state", sort=False).head(LINKED_TOP)
+    )
+    agg["state_institution_cancellations"] = pd.concat(
+        [institution_cancellations.head(LINKED_TOP).assign(state=ALL_STATES), per_state],
+        ignore_index=True,
+    )[["state", "institution", "cancelled_grants"]]
+
+    # Q3 – budget impact per money metric, by institution / state / directorate
+    agg["budget_rollups"] = MappingProxyType(compute_budget_rollups(terminated_grants))
+    agg["state_budget_rollups"] = MappingProxyType(compute_state_rollups(terminated_grants, LINKED_TOP))
+    return agg
+
+
+def text_aggregates(grants, flagged_words, flagged_matrix):
+    """Q4 tables and the SPLOM; they need the flagged-word scan."""
+    agg = {}
+
+    # Q4 – flagged words per grant, and grants containing each flagged word
+    agg["q4_flagged_counts"] = grants[["flagged_words_count"]].fillna(0)
+    n_words = len(flagged_words)
+    presence = np.zeros((len(grants), n_words), dtype=bool)
+    for matrix in flagged_matrix.values():
+        presence |= matrix[grants["text_row"]] > 0
+
+    def top_words(presence):
+        counts = pd.DataFrame({"word": list(flagged_words), "count": presence.sum(axis=0)})
+        counts = counts[counts["count"] > 0].drop_duplicates("word")
+        return counts.sort_values("count", ascending=False).head(15)
+
+    agg["top_words"] = top_words(presence)
+    # the same, counting each collaborative project (duplicate cluster) once
+    if "duplicate_cluster" in grants.columns:
+        first = ~grants["duplicate_cluster"].duplicated().to_numpy()
+        agg["q4_flagged_counts_dedup"] = agg["q4_flagged_counts"][first]
+        agg["top_words_dedup"] = top_words(presence[first])
+
+    # Q5 – density scatterplot matrix of the budget / flagged-word fields (binned)
+    agg["splom"] = MappingProxyType(compute_density_splom(grants))
+    return agg
+
+
+def reinstated_outcome(grants, events=None):
+    """Reinstatement per grant row, as Q5 counts it.
+
+    Taken from the event snapshot when there is one, else from the export's
+    `reinstated` column.
+    """
+    if events is None:
+        return grants["reinstated"].fillna(False).astype(bool).to_numpy()
+    return events.statuses(grants["grant_id"])["reinstated"].fillna(False).astype(bool).to_numpy()
+
+
+def status_aggregates(grants, events=None, watchlists=None):
+    """Q5 tables (Cruz list vs status).
+
+    With an event store, Q5 takes each grant's status from its snapshot.
+    Without watchlists, Cruz membership comes from the `in_cruz_list` column.
+    """
+    agg = {}
+    if watchlists is None:
+        watchlists = Watchlists(grants.index)
+        watchlists.register_mask("cruz", grants["in_cruz_list"].fillna(False).astype(bool))
+
+    # Q5 – Cruz list vs status, with row totals and percentages
+    reinstated = reinstated_outcome(grants, events)
+    if events is not None:
+        agg["reinstatement_days"] = events.reinstatement_days().reset_index()
+    q5_counts = watchlists.breakdown(reinstated, ["cruz"]).rename(columns={"member": "cruz_label"})
+    row_totals = q5_counts.groupby("cruz_label")["count"].sum().reset_index(name="row_total")
+    totals = (
+        q5_counts.groupby(["status_label", "status_order"])["count"].sum()
+        .reset_index()
+        .sort_values("status_order")
+    )
+    totals["one"] = "Totals"
+    totals["percentage"] = (totals["count"] / int(totals["count"].sum()) * 100).round(1)
+    agg["q5_counts"] = q5_counts
+    agg["row_totals"] = row_totals
+    agg["totals"] = totals
+    return agg
+
+
+def compute_aggregates(grants, flagged_words, flagged_matrix, events=None):
+    """Every table the Q1–Q5 panels draw from."""
+    agg = core_aggregates(grants)
+    agg.update(text_aggregates(grants, flagged_words, flagged_matrix))
+    agg.update(status_aggregates(grants, events))
+    return agg
+
+
+def load_dataset(on_stage=None, on_ready=None):
+    """Run the whole pipeline once and return an immutable Dataset.
+
+    `on_stage(name, frame)`, if given, is called with the grants frame after
+    each stage (used by size_report.py). `on_ready(name, value)` is called
+    with every aggregate (and the geometry) as soon as it is computed, cheap
+    ones first (used by DatasetBuild).
+    """
+    on_stage = on_stage or (lambda name, frame: None)
+    on_ready = on_ready or (lambda name, value: None)
+
+    def publish(aggregates):
+        for name, value in aggregates.items():
+            on_ready(name, value)
+        return aggregates
+
+    version = dataset_version()
+    # The text columns live in a memory-mapped store (see text_store.py). When
+    # the store is up to date with the export we skip parsing them altogether.
+    text_store = open_text_store(
+        DEFAULT_STORE_DIR, source_fingerprint(NSF_PATH), fields=TEXT_FIELDS
+    )
+    # All sources load concurrently; each stage waits only for the inputs it uses
+    # The coarse state tier is all the default view needs (see geo.py); the raw
+    # geometry is only loaded when the tiers have not been built
+    loader = start_source_loader(
+        nsf_usecols=(lambda c: c not in TEXT_FIELDS) if text_store is not None else None,
+        geometry_path=tier_path("states_small") if tiers_available() else GEOMETRY_PATH,
+    )
+    on_stage("nsf_raw", loader.result("nsf"))
+    grants = clean_nsf_data(loader.result("nsf"))
+    on_stage("nsf_cleaned", grants)
+
+    # Move the text columns out of the main frame; rows reference the store by position
+    if text_store is None:
+        text_store = build_text_store(
+            grants,
+            [c for c in TEXT_FIELDS if c in grants.columns],
+            DEFAULT_STORE_DIR,
+            source_fingerprint(NSF_PATH),
+        )
+    grants = grants.drop(columns=TEXT_FIELDS, errors="ignore")
+    grants["text_row"] = np.arange(len(grants))
+    on_stage("text_moved_out", grants)
+
+    # Canonical institution names (spelling variants resolved, see institutions.py)
+    if "org_name" in grants.columns:
+        grants["org_canonical"] = InstitutionResolver(
+            DEFAULT_MAPPING_PATH
+        ).canonical_names(grants["org_name"])
+
+    # Q1–Q3 need nothing else: publish them before the slower stages
+    aggregates = publish(core_aggregates(grants))
+    geometry = loader.result("geometry") if loader.has("geometry") else None
+    on_ready("geometry", geometry)
+
+    # Status history: append this export's transitions, Q5 reads the snapshot
+    # Watchlists as bitsets over the grant rows (no merge, see watchlists.py)
+    watchlists = load_watchlists(grants, loader.result("cruz"))
+    grants["in_cruz_list"] = watchlists.mask("cruz")
+    events = GrantEventStore(DEFAULT_EVENTS_DIR)
+    if "grant_id" in grants.columns:
+        events.ingest(grants, source_fingerprint(NSF_PATH))
+    aggregates.update(publish(status_aggregates(grants, events, watchlists)))
+
+    # Tokenize titles/abstracts once (cached on disk) and count flagged words as
+    # integer matches over the token-ID arrays
+    flagged_words = tuple(
+        str(w).strip().lower().strip(",")
+        for w in loader.result("flagged_words")["flagged_word"]
+    )
+    corpora = {field: ensure_token_corpus(text_store, field, DEFAULT_CORPUS_DIR) for field in text_store.fields}
+    # Collaborative awards share near-identical abstracts (see dedup.py); each
+    # text_row maps to the first text_row of its duplicate cluster
+    clusters = (
+        ensure_duplicate_clusters(text_store, corpora["abstract"], "abstract", DEFAULT_DEDUP_DIR)
+        if "abstract" in corpora else np.arange(len(text_store))
+    )
+    representatives, members = np.unique(clusters, return_inverse=True)
+    # (documents x flagged words) occurrence matrices, indexed by text_row; the
+    # abstracts are scanned once per duplicate cluster and the counts reused
+    flagged_matrix = {}
+    for field, corpus in corpora.items():
+        if field == "abstract":
+            flagged_matrix[field] = corpus.subset(representatives).count_matrix(list(flagged_words))[members]
+        else:
+            flagged_matrix[field] = corpus.count_matrix(list(flagged_words))
+    grants["duplicate_cluster"] = clusters[grants["text_row"]]
+    if "abstract" in flagged_matrix:
+        grants["flagged_words_count"] = flagged_matrix["abstract"][grants["text_row"]].sum(axis=1)
+    if "project_title" in flagged_matrix:
+        grants["title_flagged_words_count"] = flagged_matrix["project_title"][grants["text_row"]].sum(axis=1)
+    on_stage("grants", grants)
+    loader.shutdown()
+
+    for matrix in flagged_matrix.values():
+        matrix.setflags(write=False)
+    aggregates.update(publish(text_aggregates(grants, flagged_words, flagged_matrix)))
+
+    # Dated columnar copy of this export, for diffs against earlier ones
+    snapshots = SnapshotStore(DEFAULT_SNAPSHOT_DIR)
+    snapshot_id = snapshots.save(
+        grants, source_fingerprint(NSF_PATH), pd.Timestamp(os.path.getmtime(NSF_PATH), unit="s")
+    )
+    # Research topics of the cancelled abstracts; the model is persisted and
+    # only learns from grants it has not seen (see topics.py)
+    if "abstract" in corpora:
+        grants["topic"], topic_cancellations = compute_topics(grants, corpora["abstract"], DEFAULT_TOPIC_DIR)
+        aggregates.update(publish({"topic_cancellations": topic_cancellations}))
+    # Q4/Q5 association tests with bootstrap intervals (cached on disk per
+    # version); reinstatement counted as in Q5 and the watchlists
+    statistics = association_statistics(grants.assign(reinstated=reinstated_outcome(grants, events)), version)
+    aggregates.update(publish({"statistics": statistics}))
+    return Dataset(
+        version=version,
+        grants=grants,
+        text_store=text_store,
+        events=events,
+        snapshots=snapshots,
+        snapshot_id=snapshot_id,
+        watchlists=watchlists,
+        flagged_words=flagged_words,
+        flagged_matrix=MappingProxyType(flagged_matrix),
+        aggregates=MappingProxyType(aggregates),
+        geometry=geometry,
+        load_timings=loader.report(),
+    )
+
+
+class DatasetBuild:
+    """`load_dataset` running in a background thread.
+
+    Aggregates become readable one by one as their stage finishes, so callers
+    can draw the Q1–Q3 panels while the flagged-word scan, the topics and the
+    statistics are still being computed. `wait(names)` blocks until the named
+    aggregates exist; `result()` until the whole Dataset is built. Errors in
+    the build are re-raised by both and kept in `error`; a failed build stays
+    failed, so callers that cache it should drop it and start a new one.
+
+    `load` is called as `load(on_ready=...)` in the thread (`load_dataset` by
+    default).
+    """
+
+    def __init__(self, load=load_dataset):
+        self.version = dataset_version()
+        self._load = load
+        self.started = time.perf_counter()
+        self.ready_after = {}
+        self.dataset = None
+        self.error = None
+        self._ready = {}
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="dataset-build", daemon=True)
+        self._thread.start()
+
+    def _publish(self, name, value):
+        with self._cond:
+            self._ready[name] = value
+            self.ready_after[name] = round(time.perf_counter() - self.started, 4)
+            self._cond.notify_all()
+
+    def _run(self):
+        try:
+            dataset = self._load(on_ready=self._publish)
+        except BaseException as e:
+            with self._cond:
+                self.error = e
+                self._cond.notify_all()
+            return
+        with self._cond:
+            self.dataset = dataset
+            self._cond.notify_all()
+
+    def _has(self, names):
+        return self.dataset is not None or all(name in self._ready for name in names)
+
+    def ready(self, names):
+        """Whether `names` can be read without blocking (see `wait`)."""
+        with self._cond:
+            return self._has(names)
+
+    def wait(self, names, timeout=None):
+        """Block until every name in `names` is published; False on timeout.
+
+        A name the pipeline does not produce for this export (e.g. the topic
+        tables without abstracts) counts as ready once the build finished.
+        """
+        with self._cond:
+            done = self._cond.wait_for(lambda: self.error is not None or self._has(names), timeout)
+            if self.error is not None:
+                raise self.error
+            return done
+
+    def wait_any(self, groups, timeout=None):
+        """Block until at least one of `groups` (lists of names) is ready.
+
+        Returns the positions of the ready groups (empty on timeout).
+        """
+        with self._cond:
+            self._cond.wait_for(
+                lambda: self.error is not None or any(self._has(names) for names in groups), timeout
+            )
+            if self.error is not None:
+                raise self.error
+            return [i for i, names in enumerate(groups) if self._has(names)]
+
+    def get(self, name, default=None):
+        with self._cond:
+            return self._ready.get(name, default)
+
+    def aggregates(self):
+        """Snapshot of everything published so far."""
+        with self._cond:
+            return MappingProxyType(dict(self._ready))
+
+    def result(self, timeout=None):
+        """The finished Dataset (blocks until the build is done)."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.error is not None or self.dataset is not None, timeout)
+            if self.error is not None:
+                raise self.error
+            return self.dataset
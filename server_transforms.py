@@ -0,0 +1,447 @@
+"""Server-side evaluation of Vega-Lite data transforms (VegaFusion-style).
+
+The Q4 histogram (`filter` + `bin` + `count()`) and the Q5 label layers
+(`joinaggregate`, `window`, `calculate`) used to be evaluated in every
+viewer's browser. `pre_transform_spec` walks a serialized Vega-Lite spec,
+evaluates the transforms and encoding-level bin/aggregate of each view with
+pandas, and replaces the view's data with the pre-computed rows, so the
+browser only draws.
+
+Only a subset of Vega-Lite is understood; any view using something outside it
+(selection-driven filters, lookups, unsupported expressions, ...) is left
+untouched and keeps being evaluated client-side. Results are memoized per
+(input dataset, transforms) so every session reuses them.
+"""
+import ast
+import hashlib
+import json
+import math
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+VIEW_KEYS = ("layer", "concat", "hconcat", "vconcat")
+AGGREGATE_OPS = {
+    "count": "count", "valid": "count", "sum": "sum", "mean": "mean",
+    "average": "mean", "median": "median", "min": "min", "max": "max",
+    "distinct": "nunique",
+}
+COUNT_FIELD = "__count"
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+CACHE_SIZE = 256
+
+
+class Unsupported(Exception):
+    """Raised when a view uses a feature this engine does not evaluate."""
+
+
+# === Expressions ===============================================================
+
+_TOKEN = re.compile(
+    r"""\s*(?:
+        (?P<num>\d+\.?\d*(?:[eE][-+]?\d+)?)
+      | (?P<str>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+      | datum\.(?P<field>[A-Za-z_]\w*)
+      | datum\[(?P<qfield>"[^"]*"|'[^']*')\]
+      | (?P<func>toString|toNumber|abs|round|floor|ceil|sqrt|log|exp)\s*\(
+      | (?P<op>===|!==|==|!=|<=|>=|<|>|\+|-|\*|/|%|\(|\)|,)
+    )""",
+    re.VERBOSE,
+)
+_OPS = {"===": "==", "!==": "!="}
+_FUNCS = {
+    "toString": "_to_string", "toNumber": "_to_number", "abs": "_np.abs",
+    "round": "_np.round", "floor": "_np.floor", "ceil": "_np.ceil",
+    "sqrt": "_np.sqrt", "log": "_np.log", "exp": "_np.exp",
+}
+
+
+def _js_string(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return "null"
+    if isinstance(value, (bool, np.bool_)):
+        return "true" if value else "false"
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _to_string(x):
+    if isinstance(x, pd.Series):
+        return x.map(_js_string)
+    return _js_string(x)
+
+
+def _to_number(x):
+    return pd.to_numeric(x, errors="coerce")
+
+
+def translate_expression(expr):
+    """Translate the supported Vega expression subset into a pandas expression."""
+    out = []
+    pos = 0
+    expr = expr.strip()
+    while pos < len(expr):
+        m = _TOKEN.match(expr, pos)
+        if not m or m.end() == pos:
+            raise Unsupported(f"Cannot evaluate expression: {expr!r}")
+        pos = m.end()
+        if m.group("num"):
+            out.append(m.group("num"))
+        elif m.group("str"):
+            out.append(repr(ast.literal_eval(m.group("str"))))
+        elif m.group("field"):
+            out.append(f"_d[{m.group('field')!r}]")
+        elif m.group("qfield"):
+            out.append(f"_d[{m.group('qfield')[1:-1]!r}]")
+        elif m.group("func"):
+            out.append(_FUNCS[m.group("func")] + "(")
+        else:
+            out.append(_OPS.get(m.group("op"), m.group("op")))
+    return " ".join(out)
+
+
+def evaluate_expression(expr, frame):
+    code = translate_expression(expr)
+    env = {"_d": frame, "_to_string": _to_string, "_to_number": _to_number, "_np": np}
+    result = eval(code, {"__builtins__": {}}, env)
+    if not isinstance(result, pd.Series):
+        result = pd.Series(result, index=frame.index)
+    return result
+
+
+# === Binning (mirrors vega-util's bin()) =======================================
+
+def bin_params(extent, maxbins=10, base=10, divide=(5, 2), minstep=0, nice=True, step=None):
+    """Return (start, stop, step) exactly as Vega's bin transform computes them."""
+    lo, hi = extent
+    logb = math.log(base)
+    span = (hi - lo) or abs(lo) or 1
+    if step is None:
+        level = math.ceil(math.log(maxbins) / logb)
+        step = max(minstep, base ** (round(math.log(span) / logb) - level))
+        while math.ceil(span / step) > maxbins:
+            step *= base
+        for div in divide:
+            v = step / div
+            if v >= minstep and span / v <= maxbins:
+                step = v
+    v = math.log(step)
+    precision = 0 if v >= 0 else int(-v / logb) + 1
+    eps = base ** (-precision - 1)
+    if nice:
+        v = math.floor(lo / step + eps) * step
+        lo = v - step if lo < v else v
+        hi = math.ceil(hi / step) * step
+    return lo, (lo + step if hi == lo else hi), step
+
+
+def bin_values(values, start, stop, step):
+    v = pd.to_numeric(values, errors="coerce").to_numpy(dtype=float)
+    clipped = np.clip(v, start, stop - step)
+    binned = start + step * np.floor(1e-14 + (clipped - start) / step)
+    binned = np.where(v < start, -np.inf, np.where(v > stop, np.inf, binned))
+    return binned
+
+
+def _bin_options(bin_def):
+    opts = {} if bin_def is True else dict(bin_def)
+    if opts.get("binned"):
+        raise Unsupported("Pre-binned fields are already evaluated")
+    unknown = set(opts) - {"maxbins", "base", "divide", "minstep", "nice", "step", "extent"}
+    if unknown:
+        raise Unsupported(f"Unsupported bin options: {sorted(unknown)}")
+    opts.setdefault("maxbins", 10)
+    return opts
+
+
+def _apply_bin(frame, field, opts, as_start, as_end):
+    values = pd.to_numeric(frame[field], errors="coerce")
+    extent = opts.pop("extent", None) or (values.min(), values.max())
+    if pd.isna(extent[0]):
+        extent = (0, 0)
+    start, stop, step = bin_params(extent, **opts)
+    frame[as_start] = bin_values(values, start, stop, step)
+    frame[as_end] = frame[as_start] + step
+    return step
+
+
+# === Transforms ================================================================
+
+def _aggregate_frame(frame, groupby, ops):
+    if groupby:
+        grouped = frame.groupby(groupby, dropna=False, sort=False)
+    result = {}
+    for op, field, as_ in ops:
+        if op not in AGGREGATE_OPS:
+            raise Unsupported(f"Unsupported aggregate op: {op}")
+        if op == "count" and field is None:
+            col = grouped.size() if groupby else len(frame)
+        else:
+            col = grouped[field].agg(AGGREGATE_OPS[op]) if groupby else frame[field].agg(AGGREGATE_OPS[op])
+        result[as_] = col
+    if groupby:
+        return pd.DataFrame(result).reset_index()
+    return pd.DataFrame({k: [v] for k, v in result.items()})
+
+
+def _window(frame, t):
+    frame_spec = t.get("frame", [None, 0])
+    if list(frame_spec) != [None, 0]:
+        raise Unsupported("Only cumulative window frames are supported")
+    groupby = t.get("groupby", [])
+    sort = t.get("sort", [])
+    by = [s["field"] for s in sort]
+    ascending = [s.get("order", "ascending") == "ascending" for s in sort]
+    ordered = frame.sort_values(by, ascending=ascending, kind="stable") if by else frame
+    keys = [ordered[g] for g in groupby] if groupby else np.zeros(len(ordered))
+    grouped = ordered.groupby(keys, dropna=False, sort=False)
+    for w in t["window"]:
+        op, as_ = w["op"], w["as"]
+        if op == "sum":
+            col = grouped[w["field"]].cumsum()
+        elif op == "count":
+            col = grouped.cumcount() + 1
+        elif op == "row_number":
+            col = grouped.cumcount() + 1
+        else:
+            raise Unsupported(f"Unsupported window op: {op}")
+        if op != "row_number" and by and not t.get("ignorePeers", False):
+            # peers (equal sort keys) share the frame end
+            peer_keys = ([ordered[g] for g in groupby] if groupby else []) + [ordered[b] for b in by]
+            col = col.groupby(peer_keys, dropna=False, sort=False).transform("last")
+        frame[as_] = col.reindex(frame.index)
+    return frame
+
+
+def _filter(frame, predicate):
+    if isinstance(predicate, str):
+        mask = evaluate_expression(predicate, frame)
+    elif isinstance(predicate, dict) and "field" in predicate:
+        col = frame[predicate["field"]]
+        if "equal" in predicate:
+            mask = col == predicate["equal"]
+        elif "oneOf" in predicate:
+            mask = col.isin(predicate["oneOf"])
+        elif "range" in predicate:
+            lo, hi = predicate["range"]
+            mask = (col >= lo) & (col <= hi)
+        else:
+            ops = {"lt": "__lt__", "lte": "__le__", "gt": "__gt__", "gte": "__ge__"}
+            key = next((k for k in ops if k in predicate), None)
+            if key is None:
+                raise Unsupported(f"Unsupported filter predicate: {predicate}")
+            mask = getattr(col, ops[key])(predicate[key])
+    else:
+        raise Unsupported(f"Unsupported filter predicate: {predicate}")
+    return frame[mask.fillna(False).astype(bool)]
+
+
+def apply_transforms(frame, transforms):
+    """Evaluate a Vega-Lite transform array on a DataFrame."""
+    frame = frame.copy()
+    for t in transforms:
+        if "filter" in t:
+            frame = _filter(frame, t["filter"])
+        elif "calculate" in t:
+            frame[t["as"]] = evaluate_expression(t["calculate"], frame)
+        elif "joinaggregate" in t:
+            groupby = t.get("groupby", [])
+            for a in t["joinaggregate"]:
+                op = AGGREGATE_OPS.get(a["op"])
+                if op is None:
+                    raise Unsupported(f"Unsupported joinaggregate op: {a['op']}")
+                if "field" not in a:
+                    op = "size"  # count() of rows
+                if groupby:
+                    column = frame[a["field"]] if "field" in a else frame.index.to_series(index=frame.index)
+                    frame[a["as"]] = column.groupby([frame[g] for g in groupby], dropna=False).transform(op)
+                else:
+                    frame[a["as"]] = frame[a["field"]].agg(op) if "field" in a else len(frame)
+        elif "window" in t:
+            frame = _window(frame, t)
+        elif "aggregate" in t:
+            frame = _aggregate_frame(
+                frame,
+                t.get("groupby", []),
+                [(a["op"], a.get("field"), a["as"]) for a in t["aggregate"]],
+            )
+        elif "bin" in t:
+            as_ = t["as"] if isinstance(t["as"], list) else [t["as"], t["as"] + "_end"]
+            _apply_bin(frame, t["field"], _bin_options(t["bin"]), as_[0], as_[1])
+        else:
+            raise Unsupported(f"Unsupported transform: {sorted(t)}")
+    return frame.reset_index(drop=True)
+
+
+# === Encoding-level bin / aggregate ============================================
+
+def _channel_defs(encoding):
+    for channel, value in encoding.items():
+        defs = value if isinstance(value, list) else [value]
+        for d in defs:
+            if isinstance(d, dict):
+                yield channel, d
+
+
+def _bin_field_names(field, opts):
+    name = "bin_" + "_".join(f"{k}_{v}" for k, v in sorted(opts.items())) + f"_{field}"
+    return name, name + "_end"
+
+
+def aggregate_encoding(frame, encoding):
+    """Evaluate bin + aggregate declared in the encoding; returns (rows, encoding)."""
+    defs = list(_channel_defs(encoding))
+    if not any("aggregate" in d for _, d in defs):
+        return frame, encoding
+    for _, d in defs:
+        if {"condition", "timeUnit", "param"} & set(d) or isinstance(d.get("sort"), dict):
+            raise Unsupported("Conditional/timeUnit/sorted encodings stay client-side")
+        if isinstance(d.get("aggregate"), dict):
+            raise Unsupported("argmin/argmax aggregates stay client-side")
+
+    frame = frame.copy()
+    groupby, ops, binned = [], [], {}
+    for _, d in defs:
+        if "aggregate" in d:
+            op, field = d["aggregate"], d.get("field")
+            as_ = COUNT_FIELD if op == "count" else f"{op}_{field}"
+            ops.append((op, None if op == "count" else field, as_))
+        elif "field" in d and d.get("bin"):
+            opts = _bin_options(d["bin"])
+            start, end = _bin_field_names(d["field"], opts)
+            if start not in binned:
+                binned[start] = _apply_bin(frame, d["field"], dict(opts), start, end)
+                groupby += [start, end]
+        elif "field" in d and d["field"] not in groupby:
+            groupby.append(d["field"])
+    rows = _aggregate_frame(frame, groupby, list(dict.fromkeys(ops)))
+
+    new_encoding = {}
+    for channel, value in encoding.items():
+        defs_in = value if isinstance(value, list) else [value]
+        defs_out = []
+        for d in defs_in:
+            if not isinstance(d, dict):
+                defs_out.append(d)
+                continue
+            d = dict(d)
+            if "aggregate" in d:
+                op = d.pop("aggregate")
+                d["field"] = COUNT_FIELD if op == "count" else f"{op}_{d['field']}"
+                d["type"] = "quantitative"
+            elif "field" in d and d.get("bin"):
+                start, end = _bin_field_names(d["field"], _bin_options(d["bin"]))
+                if channel in ("x", "y"):
+                    d["bin"] = {"binned": True, "step": binned[start]}
+                    new_encoding[channel + "2"] = {"field": end}
+                else:
+                    d.pop("bin")
+                d["field"] = start
+            defs_out.append(d)
+        new_encoding[channel] = defs_out if isinstance(value, list) else defs_out[0]
+    return rows, new_encoding
+
+
+# === Spec walking ==============================================================
+
+def _records(frame):
+    return json.loads(frame.to_json(orient="records", date_format="iso"))
+
+
+def _dataset_name(rows):
+    digest = hashlib.sha1(json.dumps(rows, sort_keys=True).encode()).hexdigest()
+    return "data-" + digest[:32]
+
+
+def _evaluate_view(view, data, datasets, parent_encoding):
+    """Evaluate one view in place. Returns the data name its children inherit."""
+    transforms = view.get("transform", [])
+    encoding = view.get("encoding", {})
+    is_unit = "mark" in view
+    needs_encoding = is_unit and not parent_encoding and any(
+        "aggregate" in d for _, d in _channel_defs(encoding)
+    )
+    if not transforms and not needs_encoding:
+        return data
+    if data is None or data not in datasets:
+        return data
+
+    key = hashlib.sha1(
+        json.dumps([data, transforms, encoding if needs_encoding else None], sort_keys=True).encode()
+    ).hexdigest()
+    with _cache_lock:
+        cached = _cache.get(key)
+        if cached is not None:
+            _cache.move_to_end(key)
+    if cached is None:
+        try:
+            frame = apply_transforms(pd.DataFrame(datasets[data]), transforms)
+            if needs_encoding:
+                frame, encoding = aggregate_encoding(frame, encoding)
+        except Exception:
+            # unsupported, or a transform that fails here (missing field, type
+            # error, ...): leave the view to Vega-Lite unchanged
+            return data
+        cached = (_records(frame), encoding)
+        with _cache_lock:
+            _cache[key] = cached
+            while len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
+
+    rows, encoding = cached
+    name = _dataset_name(rows)
+    datasets[name] = rows
+    view.pop("transform", None)
+    view["data"] = {"name": name}
+    if needs_encoding:
+        view["encoding"] = encoding
+    return name
+
+
+def _walk(view, data, datasets, parent_encoding):
+    if isinstance(view.get("data"), dict) and "name" in view["data"]:
+        data = view["data"]["name"]
+    elif "data" in view:
+        data = None  # inline values / urls stay client-side
+    data = _evaluate_view(view, data, datasets, parent_encoding)
+    # facet/repeat inner specs are evaluated per cell by Vega-Lite; leave them alone
+    encoding = parent_encoding or bool(view.get("encoding"))
+    for key in VIEW_KEYS:
+        for child in view.get(key, []):
+            _walk(child, data, datasets, encoding and key == "layer")
+
+
+def _referenced_datasets(node, found):
+    if isinstance(node, dict):
+        data = node.get("data")
+        if isinstance(data, dict) and "name" in data:
+            found.add(data["name"])
+        for key, value in node.items():
+            if key != "datasets":
+                _referenced_datasets(value, found)
+    elif isinstance(node, list):
+        for value in node:
+            _referenced_datasets(value, found)
+    return found
+
+
+def pre_transform_spec(spec):
+    """Return a copy of a top-level Vega-Lite spec with supported transforms evaluated."""
+    spec = json.loads(json.dumps(spec))
+    datasets = spec.setdefault("datasets", {})
+    _walk(spec, None, datasets, False)
+    # drop datasets no view references any more
+    used = _referenced_datasets(spec, set())
+    spec["datasets"] = {k: v for k, v in datasets.items() if k in used}
+    return spec
+
+
+def cache_info():
+    with _cache_lock:
+        return {"entries": len(_cache), "max_entries": CACHE_SIZE}
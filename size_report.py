@@ -0,0 +1,242 @@
+"""Memory and payload size report with enforceable budgets.
+
+Measures
+- deep memory per column of the grants frame after each pipeline stage
+  (`load_dataset(on_stage=...)`), plus every precomputed aggregate;
+- serialized size per dashboard panel, split into spec bytes and data bytes,
+  for every Vega-Lite chart the app renders (run headless through AppTest);
+- the wire size of each chart element as Streamlit sends it (summed over
+  the dashboard's panels for `wire.final_dashboard`).
+
+Each measurement has a key such as `memory.stage.grants`, `memory.aggregate.splom`,
+`chart.final_dashboard.F4` or `wire.final_dashboard`. Budgets map key patterns (fnmatch-style) to a
+maximum size; a report with any measurement over budget fails:
+
+    python size_report.py                       # default budgets
+    python size_report.py --budgets budgets.json --json reports/sizes.json
+
+budgets.json example: {"memory.stage.grants": "64MB", "chart.*": "150KB"}
+"""
+import argparse
+import contextlib
+import fnmatch
+import io
+import json
+import re
+import sys
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_BUDGETS = {
+    "memory.stage.nsf_raw": "256MB",
+    "memory.stage.grants": "64MB",
+    "memory.aggregate.*": "16MB",
+    "memory.flagged_matrix.*": "64MB",
+    "chart.*": "200KB",
+    "wire.*": "2MB",
+}
+UNITS = {"B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3}
+
+
+def parse_size(value):
+    """Bytes from an int or a string such as "150KB" / "1.5 MB"."""
+    if isinstance(value, (int, float)):
+        return int(value)
+    m = re.fullmatch(r"\s*([\d.]+)\s*([KMG]?B)\s*", str(value).upper())
+    if not m:
+        raise ValueError(f"Unrecognized size {value!r}")
+    return int(float(m.group(1)) * UNITS[m.group(2)])
+
+
+def format_size(n):
+    for unit in ("GB", "MB", "KB"):
+        if n >= UNITS[unit]:
+            return f"{n / UNITS[unit]:.1f} {unit}"
+    return f"{n} B"
+
+
+# === Memory ===
+
+def column_memory(frame):
+    """Deep bytes per column (index included as "<index>")."""
+    usage = frame.memory_usage(deep=True)
+    return usage.rename({"Index": "<index>"})
+
+
+def object_memory(obj):
+    """Deep bytes of a frame, array, or (nested) mapping/sequence of them."""
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True).sum())
+    if isinstance(obj, pd.Series):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if hasattr(obj, "items"):
+        return sum(object_memory(v) for _, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return sum(object_memory(v) for v in obj)
+    return sys.getsizeof(obj)
+
+
+# === Chart specs ===
+
+def _json_bytes(obj):
+    return len(json.dumps(obj, separators=(",", ":"), default=str).encode())
+
+
+def _data_refs(node, names, inline):
+    """Collect dataset names and inline `values` bytes referenced under `node`."""
+    if isinstance(node, dict):
+        data = node.get("data")
+        if isinstance(data, dict):
+            if "name" in data:
+                names.add(data["name"])
+            if "values" in data:
+                inline.append(_json_bytes(data["values"]))
+        for key, value in node.items():
+            if key not in ("data", "datasets"):
+                _data_refs(value, names, inline)
+    elif isinstance(node, list):
+        for item in node:
+            _data_refs(item, names, inline)
+
+
+def panel_sizes(spec, dataset_bytes=None):
+    """Spec and data bytes per top-level panel of a (concat) spec.
+
+    `dataset_bytes` maps dataset names to their size; by default the sizes of
+    the spec's own top-level `datasets`. A dataset shared by several panels
+    counts toward each of them.
+    """
+    if dataset_bytes is None:
+        dataset_bytes = {name: _json_bytes(v) for name, v in spec.get("datasets", {}).items()}
+    panels = None
+    for key in ("concat", "hconcat", "vconcat"):
+        if key in spec:
+            panels = spec[key]
+            break
+    if panels is None:
+        panels = [spec]
+    rows = []
+    for i, panel in enumerate(panels):
+        names, inline = set(), []
+        _data_refs(panel, names, inline)
+        data = sum(inline) + sum(dataset_bytes.get(n, 0) for n in names)
+        rows.append({
+            "panel": f"F{i + 1}",
+            "title": panel.get("title") if isinstance(panel.get("title"), str) else None,
+            "spec_bytes": _json_bytes(panel) - sum(inline),
+            "data_bytes": data,
+            "total_bytes": _json_bytes(panel) - sum(inline) + data,
+        })
+    return pd.DataFrame(rows)
+
+
+def app_chart_sizes(app_path="app.py", timeout=600):
+    """Run the app headless; per-panel sizes and the wire size of every chart element."""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(app_path, default_timeout=timeout)
+    with contextlib.redirect_stdout(io.StringIO()):
+        at.run()
+    if at.exception:
+        raise RuntimeError(f"app raised: {at.exception[0].value}")
+    panels, wire = [], {}
+    for i, element in enumerate(at.get("vega_lite_chart")):
+        proto = element.proto
+        spec = json.loads(proto.spec)
+        sizes = panel_sizes(spec, {d.name: d.data.ByteSize() for d in proto.datasets})
+        # dashboard elements are tagged with the panels they draw (see app.py)
+        names = spec.get("usermeta", {}).get("panels")
+        name = "final_dashboard" if names else f"chart{i}"
+        if names and len(names) == len(sizes):
+            sizes["panel"] = names
+        sizes.insert(0, "chart", name)
+        panels.append(sizes)
+        wire[name] = wire.get(name, 0) + proto.ByteSize()
+    return pd.concat(panels, ignore_index=True) if panels else pd.DataFrame(), wire
+
+
+# === Report ===
+
+def build_report(app_path="app.py"):
+    """All measurements as a DataFrame with columns key, bytes, detail."""
+    from pipeline import load_dataset
+
+    stages = {}
+    rows = []
+    dataset = load_dataset(on_stage=lambda name, frame: stages.__setitem__(name, column_memory(frame)))
+    for stage, usage in stages.items():
+        rows.append({"key": f"memory.stage.{stage}", "bytes": int(usage.sum()), "detail": ""})
+        for column, n in usage.sort_values(ascending=False).items():
+            rows.append({"key": f"memory.column.{stage}.{column}", "bytes": int(n), "detail": ""})
+    for name, value in dataset.aggregates.items():
+        rows.append({"key": f"memory.aggregate.{name}", "bytes": object_memory(value), "detail": ""})
+    for field, matrix in dataset.flagged_matrix.items():
+        rows.append({"key": f"memory.flagged_matrix.{field}", "bytes": int(matrix.nbytes), "detail": str(matrix.shape)})
+    for field in dataset.text_store.fields:
+        rows.append({
+            "key": f"memory.text_store.{field}", "bytes": int(dataset.text_store.nbytes(field)),
+            "detail": "memory-mapped, shared through the page cache",
+        })
+
+    panels, wire = app_chart_sizes(app_path)
+    for _, p in panels.iterrows():
+        rows.append({
+            "key": f"chart.{p['chart']}.{p['panel']}", "bytes": int(p["total_bytes"]),
+            "detail": f"spec {format_size(p['spec_bytes'])}, data {format_size(p['data_bytes'])}; {p['title'] or ''}",
+        })
+    for name, n in wire.items():
+        rows.append({"key": f"wire.{name}", "bytes": int(n), "detail": "serialized Streamlit element"})
+    return pd.DataFrame(rows)
+
+
+def check_budgets(report, budgets=None):
+    """Add `budget` and `over` columns; a key takes the most specific matching pattern."""
+    budgets = {k: parse_size(v) for k, v in (budgets or DEFAULT_BUDGETS).items()}
+
+    def budget_for(key):
+        matches = [p for p in budgets if fnmatch.fnmatchcase(key, p)]
+        # an exact key beats a pattern; among patterns, the longest wins
+        best = max(matches, key=lambda p: (p == key, len(p)), default=None)
+        return budgets[best] if best else None
+
+    report = report.copy()
+    report["budget"] = report["key"].map(budget_for)
+    report["over"] = report["budget"].notna() & (report["bytes"] > report["budget"])
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Memory and payload size report.")
+    parser.add_argument("--budgets", help="JSON file mapping key patterns to sizes (replaces the defaults)")
+    parser.add_argument("--app", default="app.py")
+    parser.add_argument("--json", help="also write the report here")
+    parser.add_argument("--columns", action="store_true", help="list per-column memory too")
+    args = parser.parse_args(argv)
+
+    budgets = DEFAULT_BUDGETS
+    if args.budgets:
+        with open(args.budgets) as f:
+            budgets = json.load(f)
+    report = check_budgets(build_report(args.app), budgets)
+
+    shown = report if args.columns else report[~report["key"].str.startswith("memory.column.")]
+    print(f"{'key':<48}{'size':>12}{'budget':>12}  detail")
+    for _, r in shown.iterrows():
+        budget = format_size(int(r["budget"])) if pd.notna(r["budget"]) else "-"
+        flag = "  OVER BUDGET" if r["over"] else ""
+        print(f"{r['key']:<48}{format_size(r['bytes']):>12}{budget:>12}  {r['detail']}{flag}")
+    if args.json:
+        report.to_json(args.json, orient="records", indent=1)
+
+    over = report[report["over"]]
+    if len(over):
+        print(f"\n{len(over)} measurement(s) over budget: {', '.join(over['key'])}")
+        sys.exit(1)
+    print("\nAll measurements within budget.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+"""Dated snapshots of the termination export and diffs between them.
+
+The airtable export is replaced wholesale each time it is downloaded, so the
+pipeline only ever sees the latest version. `SnapshotStore` keeps one
+columnar (parquet, zstd) copy of the cleaned grants per export under
+data/snapshots, without the text fields (they stay in the text store) and
+with `record_sha1` kept as the export's own row fingerprint. Snapshots are
+keyed by content (`content_key`, a hash of the sorted `record_sha1` values),
+so downloading an unchanged export again does not add a snapshot that would
+hide the last real change. The manifest is replaced atomically and re-read
+before every save, so `snapshots.py add` and the pipeline can both add to it.
+
+`diff_snapshots(old, new)` reads only the key and tracked columns of both
+versions, hashes grant ids and rows to uint64 (record_sha1 plus the tracked
+columns), and joins on the hashed key once, so the cost is linear in the
+number of grants. Only rows whose hashes differ are compared column by
+column. The result lists each change (added, removed, newly terminated,
+reinstated, budget changed, ...) and rolls it up per state and institution
+for the app's "What changed" panel.
+
+    python snapshots.py list
+    python snapshots.py add old_export.csv --date 2025-05-01
+    python snapshots.py diff <old id> <new id>
+"""
+import argparse
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_SNAPSHOT_DIR = "data/snapshots"
+MANIFEST_NAME = "manifest.json"
+# positional or derived from the text store, so meaningless across versions
+EXCLUDED_COLUMNS = ["text_row", "abstract", "project_title"]
+DIFF_COLUMNS = ["grant_id", "record_sha1", "terminated", "reinstated", "org_state", "org_canonical", "nsf_total_budget"]
+# (column, old value, new value) -> change; added/removed/budget_changed/other are handled separately
+STATUS_CHANGES = {
+    ("terminated", False, True): "newly_terminated",
+    ("terminated", True, False): "unterminated",
+    ("reinstated", False, True): "reinstated",
+    ("reinstated", True, False): "reinstatement_revoked",
+}
+CHANGE_LABELS = {
+    "added": "Added",
+    "removed": "Removed",
+    "newly_terminated": "Newly terminated",
+    "unterminated": "Termination lifted",
+    "reinstated": "Reinstated",
+    "reinstatement_revoked": "Reinstatement revoked",
+    "budget_changed": "Budget changed",
+    "other": "Other fields changed",
+}
+# budgets are whole dollars; smaller differences are float noise
+BUDGET_TOLERANCE = 0.5
+
+
+def content_key(grants):
+    """Fingerprint of an export's rows, independent of the file and of row order.
+
+    Uses the export's own `record_sha1` per row when it has one, else a hash
+    of the tracked columns.
+    """
+    if "record_sha1" in grants.columns:
+        rows = np.sort(grants["record_sha1"].astype(str).to_numpy())
+        return hashlib.sha1("\n".join(rows).encode()).hexdigest()
+    columns = [c for c in DIFF_COLUMNS if c in grants.columns]
+    rows = np.sort(pd.util.hash_pandas_object(grants[columns].astype(str), index=False).to_numpy())
+    return hashlib.sha1(rows.tobytes()).hexdigest()
+
+
+class SnapshotStore:
+    """One parquet file per export version plus a manifest, under `directory`."""
+
+    def __init__(self, directory=DEFAULT_SNAPSHOT_DIR):
+        self.directory = directory
+        self.manifest_path = os.path.join(directory, MANIFEST_NAME)
+        os.makedirs(directory, exist_ok=True)
+        self.manifest = self._read_manifest()
+
+    def _read_manifest(self):
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        return {}
+
+    def path(self, snapshot_id):
+        return os.path.join(self.directory, f"{snapshot_id}.parquet")
+
+    def save(self, grants, source_key, exported_at=None):
+        """Store `grants` as the snapshot of export `source_key`; returns its id.
+
+        Saving an export whose rows are already stored (same file, or the same
+        content downloaded again) only returns the existing id.
+        """
+        self.manifest = self._read_manifest()
+        content = content_key(grants)
+        for snapshot_id, info in self.manifest.items():
+            if info.get("content_key") == content or info["source_key"] == source_key:
+                return snapshot_id
+        exported_at = pd.Timestamp(exported_at or datetime.now(timezone.utc)).strftime("%Y-%m-%d")
+        snapshot_id = f"{exported_at}_{content[:8]}"
+        frame = grants.drop(columns=EXCLUDED_COLUMNS, errors="ignore")
+        tmp = self.path(snapshot_id) + ".tmp"
+        frame.to_parquet(tmp, index=False, compression="zstd")
+        os.replace(tmp, self.path(snapshot_id))
+        self.manifest[snapshot_id] = {
+            "source_key": source_key,
+            "content_key": content,
+            "exported_at": exported_at,
+            "rows": len(frame),
+            "bytes": os.path.getsize(self.path(snapshot_id)),
+        }
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(tmp, self.manifest_path)
+        return snapshot_id
+
+    def versions(self):
+        """Snapshot ids, oldest export first."""
+        return sorted(self.manifest, key=lambda s: (self.manifest[s]["exported_at"], s))
+
+    def previous(self, snapshot_id):
+        """The version stored before `snapshot_id`, or None."""
+        versions = self.versions()
+        i = versions.index(snapshot_id) if snapshot_id in versions else len(versions)
+        return versions[i - 1] if i > 0 else None
+
+    def read(self, snapshot_id, columns=None):
+        """A snapshot (only `columns` that it has, when given)."""
+        if columns is not None:
+            import pyarrow.parquet as pq
+
+            available = set(pq.read_schema(self.path(snapshot_id)).names)
+            columns = [c for c in columns if c in available]
+        return pd.read_parquet(self.path(snapshot_id), columns=columns)
+
+
+# === Diffing ===
+
+def _hashed(frame, tracked, as_text):
+    """Index by hashed grant id, with a uint64 row hash over the `tracked` columns.
+
+    `rest_hash` leaves the budget out, so a budget that only moved within
+    BUDGET_TOLERANCE is not reported as some other change. Columns in
+    `as_text` are hashed as strings (their dtype differs between the two
+    versions); the rest are hashed natively, which is much faster.
+    """
+    hashable = frame[["grant_id"] + tracked].astype({c: str for c in as_text})
+    out = frame.reindex(columns=DIFF_COLUMNS)
+    out["row_hash"] = pd.util.hash_pandas_object(hashable[tracked], index=False).to_numpy()
+    rest = [c for c in tracked if c != "nsf_total_budget"]
+    out["rest_hash"] = pd.util.hash_pandas_object(hashable[rest], index=False).to_numpy() if rest else 0
+    out.index = pd.Index(pd.util.hash_pandas_object(hashable["grant_id"], index=False).to_numpy(), name="key")
+    return out[~out.index.duplicated(keep="last")]
+
+
+def diff_frames(old, new):
+    """Changes between two snapshot frames, one row per (grant, change)."""
+    # only columns both versions have, or every row would look changed
+    tracked = [c for c in DIFF_COLUMNS[1:] if c in old.columns and c in new.columns]
+    as_text = [c for c in ["grant_id"] + tracked if old[c].dtype != new[c].dtype]
+    old, new = _hashed(old, tracked, as_text), _hashed(new, tracked, as_text)
+    joined = old.join(new, how="outer", lsuffix="_old", rsuffix="_new")
+    in_old, in_new = joined["row_hash_old"].notna(), joined["row_hash_new"].notna()
+    changed = joined[~in_old | ~in_new | (joined["row_hash_old"] != joined["row_hash_new"])]
+    in_old, in_new = in_old[changed.index], in_new[changed.index]
+
+    def side(column):
+        # the new value, or the old one for removed grants
+        return changed[f"{column}_new"].where(in_new, changed[f"{column}_old"])
+
+    budget_old = pd.to_numeric(changed["nsf_total_budget_old"], errors="coerce")
+    budget_new = pd.to_numeric(changed["nsf_total_budget_new"], errors="coerce")
+    base = pd.DataFrame({
+        "grant_id": side("grant_id"),
+        "org_state": side("org_state"),
+        "institution": side("org_canonical"),
+        "budget_old": budget_old,
+        "budget_new": budget_new,
+        # an added grant brings its whole budget, a removed one takes it away
+        "budget_delta": budget_new.fillna(0) - budget_old.fillna(0),
+    }, index=changed.index)
+
+    both = in_old & in_new
+    masks = {"added": ~in_old, "removed": ~in_new}
+    for (column, before, after), name in STATUS_CHANGES.items():
+        if column in tracked:
+            was = changed[f"{column}_old"].fillna(False).astype(bool)
+            now = changed[f"{column}_new"].fillna(False).astype(bool)
+            masks[name] = both & (was == before) & (now == after)
+    masks["budget_changed"] = both & ((budget_new - budget_old).abs() > BUDGET_TOLERANCE)
+    rest_changed = changed["rest_hash_old"] != changed["rest_hash_new"]
+    masks["other"] = both & rest_changed & ~np.logical_or.reduce([m.to_numpy() for m in masks.values()])
+
+    frames = [base[mask].assign(change=name) for name, mask in masks.items() if mask.any()]
+    columns = ["grant_id", "change", "org_state", "institution", "budget_old", "budget_new", "budget_delta"]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)[columns]
+
+
+def summarize_changes(changes, by=None):
+    """Count and budget delta per change (and per `by` column, when given)."""
+    keys = ([by] if by else []) + ["change"]
+    if not len(changes):
+        return pd.DataFrame(columns=keys + ["grants", "budget_delta"])
+    summary = (
+        changes.groupby(keys, dropna=False)
+        .agg(grants=("grant_id", "size"), budget_delta=("budget_delta", "sum"))
+        .reset_index()
+    )
+    summary["label"] = summary["change"].map(CHANGE_LABELS)
+    return summary.sort_values("grants", ascending=False, ignore_index=True)
+
+
+@lru_cache(maxsize=16)
+def diff_snapshots(old_id, new_id, directory=DEFAULT_SNAPSHOT_DIR):
+    """Changes from snapshot `old_id` to `new_id` (cached; snapshots never change).
+
+    Returns a dict with `changes` plus the `summary`, `by_state` and
+    `by_institution` rollups.
+    """
+    store = SnapshotStore(directory)
+    changes = diff_frames(store.read(old_id, DIFF_COLUMNS), store.read(new_id, DIFF_COLUMNS))
+    return {
+        "old": old_id,
+        "new": new_id,
+        "changes": changes,
+        "summary": summarize_changes(changes),
+        "by_state": summarize_changes(changes, "org_state"),
+        "by_institution": summarize_changes(changes, "institution"),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage export snapshots.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list")
+    add = sub.add_parser("add", help="snapshot an export CSV (e.g. an older download)")
+    add.add_argument("csv")
+    add.add_argument("--date", help="export date (default: file modification date)")
+    diff = sub.add_parser("diff")
+    diff.add_argument("old")
+    diff.add_argument("new")
+    parser.add_argument("--dir", default=DEFAULT_SNAPSHOT_DIR)
+    args = parser.parse_args(argv)
+    store = SnapshotStore(args.dir)
+
+    if args.command == "list":
+        for snapshot_id in store.versions():
+            info = store.manifest[snapshot_id]
+            print(f"{snapshot_id:<24}{info['rows']:>10,} rows{info['bytes'] / 1024:>10.1f} KB")
+    elif args.command == "add":
+        from institutions import DEFAULT_MAPPING_PATH, InstitutionResolver
+        from pipeline import clean_nsf_data
+        from text_store import TEXT_FIELDS, source_fingerprint
+
+        grants = clean_nsf_data(pd.read_csv(args.csv, usecols=lambda c: c not in TEXT_FIELDS))
+        if "org_name" in grants.columns:
+            grants["org_canonical"] = InstitutionResolver(DEFAULT_MAPPING_PATH).canonical_names(grants["org_name"])
+        date = args.date or datetime.fromtimestamp(os.path.getmtime(args.csv), timezone.utc)
+        print(store.save(grants, source_fingerprint(args.csv), date))
+    else:
+        result = diff_snapshots(args.old, args.new, args.dir)
+        print(result["summary"].to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""Content-addressed cache of serialized Vega-Lite specs.
+
+Every rerun of app.py used to rebuild and re-serialize all panels and the
+final concat even when nothing changed. Specs are keyed by a hash of the
+chart's input DataFrames plus its parameters, kept in a bounded in-memory LRU,
+and mirrored as JSON files in one directory so a restarted server starts warm.
+Files are written through a temporary name and `os.replace`, and an entry
+that cannot be read (e.g. left by a crash) counts as a miss. The same
+directory can hold the notebooks' data artifacts, instead of the
+`altair-data-<hash>.json` files they leave in the working directory.
+"""
+import contextlib
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import altair as alt
+import pandas as pd
+
+DEFAULT_CACHE_DIR = "data/cache/specs"
+
+
+def frame_digest(frame):
+    """Stable hash of a DataFrame's values, index, columns and dtypes."""
+    h = hashlib.sha1()
+    h.update(repr(list(frame.columns)).encode())
+    h.update(repr([str(t) for t in frame.dtypes]).encode())
+    h.update(pd.util.hash_pandas_object(frame, index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def spec_key(name, frames=(), params=None):
+    """Cache key for chart `name` built from `frames` with `params`."""
+    h = hashlib.sha1(name.encode())
+    for frame in frames:
+        h.update(frame_digest(frame).encode())
+    h.update(json.dumps(params or {}, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+class SpecCache:
+    """Bounded LRU of ready-to-send Vega-Lite spec dicts with hit/miss counts."""
+
+    def __init__(self, max_entries=64, directory=DEFAULT_CACHE_DIR):
+        self.max_entries = max_entries
+        self.directory = directory
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._prune_disk()
+
+    def _prune_disk(self):
+        # keep at most max_entries spec files, newest first
+        files = [
+            os.path.join(self.directory, name)
+            for name in os.listdir(self.directory)
+            if name.endswith(".json")
+        ]
+        files.sort(key=os.path.getmtime, reverse=True)
+        for path in files[self.max_entries:]:
+            os.remove(path)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        # second tier: spec written by an earlier process
+        if self.directory and os.path.exists(self._path(key)):
+            try:
+                with open(self._path(key)) as f:
+                    spec = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                # evicted meanwhile, or truncated: rebuild it
+                return None
+            self._store(key, spec, write=False)
+            with self._lock:
+                self.hits += 1
+            return spec
+        return None
+
+    def put(self, key, spec):
+        self._store(key, spec, write=True)
+        return spec
+
+    def _store(self, key, spec, write):
+        if write and self.directory:
+            tmp = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(spec, f)
+            os.replace(tmp, self._path(key))
+        with self._lock:
+            self._entries[key] = spec
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                old_key, _ = self._entries.popitem(last=False)
+                self.evictions += 1
+                if self.directory:
+                    # another process may have removed it already
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(self._path(old_key))
+
+    def get_or_build(self, key, build):
+        """Return the cached spec for `key`, calling `build()` on a miss.
+
+        `build` may return an Altair chart or an already serialized dict.
+        """
+        spec = self.get(key)
+        if spec is not None:
+            return spec
+        with self._lock:
+            self.misses += 1
+        chart = build()
+        spec = chart if isinstance(chart, dict) else chart.to_dict()
+        return self.put(key, spec)
+
+    def clear(self):
+        with self._lock:
+            keys = list(self._entries)
+            self._entries.clear()
+        if self.directory:
+            for name in os.listdir(self.directory):
+                if name.endswith(".json"):
+                    os.remove(os.path.join(self.directory, name))
+        return keys
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+def concat_specs(specs, columns, config=None, **top_level):
+    """Compose cached panel specs into one concat spec without re-serializing them.
+
+    Panel datasets are merged into the top-level `datasets` (they are content
+    addressed, so identical data is shipped once).
+    """
+    datasets = {}
+    panels = []
+    for spec in specs:
+        panel = dict(spec)
+        datasets.update(panel.pop("datasets", {}))
+        panel.pop("$schema", None)
+        panel.pop("config", None)
+        panels.append(panel)
+    out = {"$schema": specs[0].get("$schema"), "config": config or {}}
+    out.update(top_level)
+    out.update({"concat": panels, "columns": columns, "datasets": datasets})
+    return out
+
+
+def enable_artifact_dir(directory=os.path.join(DEFAULT_CACHE_DIR, "data")):
+    """Write Altair's external data files into `directory` (for notebook use).
+
+    Replacement for `alt.data_transformers.enable('json')`, which drops
+    `altair-data-<hash>.json` files into the working directory.
+    """
+    os.makedirs(directory, exist_ok=True)
+    alt.data_transformers.enable(
+        "json", filename=os.path.join(directory, "{prefix}-{hash}.{extension}")
+    )
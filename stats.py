@@ -0,0 +1,343 @@
+"""Association tests behind the Q4/Q5 questions.
+
+Q4 and Q5 ask whether flagged words and Cruz-list membership go together with
+termination and reinstatement. This module answers with numbers instead of
+bar heights:
+
+- 2x2 contingency tests (Pearson chi-square, Fisher's exact test) and effect
+  sizes (odds ratio, relative risk, risk difference, phi) for `in_cruz_list`;
+- point-biserial correlation and Cohen's d for `flagged_words_count`;
+- a logistic regression (IRLS in NumPy) of the outcome on both, reported as
+  odds ratios.
+
+Confidence intervals are percentile bootstrap intervals. Resamples are drawn
+in batches and evaluated vectorized: a 2x2 table resample is one multinomial
+draw, and a row resample is a vector of per-row weights, so the batched
+logistic fit is a weighted IRLS over the same design matrix. Row resamples
+work on the distinct (predictor, outcome) patterns (`compress_rows`), so the
+cost grows with the number of patterns, not of grants. Batches run in-process
+unless resamples x patterns exceeds POOL_MIN_WORK, where spreading them over a
+process pool outweighs starting one. Resamples whose statistic is not finite
+(a separated logistic fit, an empty group) are left out of the interval and
+counted in `ci_dropped`. `association_statistics` caches its table on disk
+keyed by the dataset version and the input columns, so it is computed once
+per export.
+"""
+import hashlib
+import contextlib
+import json
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_STATS_DIR = "data/cache/stats"
+OUTCOMES = ["reinstated", "terminated"]
+N_RESAMPLES = 20000
+BATCH_SIZE = 1000
+CI_LEVEL = 0.95
+# resamples x row patterns above which the batches go to a process pool: a
+# resample costs ~0.25-0.5 us per pattern in-process (the export has a few
+# dozen patterns, 0.2 s for 20k resamples), starting spawned workers about a
+# second, so a pool only pays off from several seconds of work
+POOL_MIN_WORK = 20_000_000
+
+
+# === 2x2 tables ===
+
+def contingency_table(exposure, outcome):
+    """[[a, b], [c, d]]: rows exposure True/False, columns outcome True/False."""
+    exposure = np.asarray(exposure, dtype=bool)
+    outcome = np.asarray(outcome, dtype=bool)
+    return np.array([
+        [np.sum(exposure & outcome), np.sum(exposure & ~outcome)],
+        [np.sum(~exposure & outcome), np.sum(~exposure & ~outcome)],
+    ])
+
+
+def chi_square_test(table):
+    """Pearson chi-square statistic and p-value (1 degree of freedom)."""
+    table = np.asarray(table, dtype=float)
+    expected = table.sum(axis=1, keepdims=True) * table.sum(axis=0, keepdims=True) / table.sum()
+    if np.any(expected == 0):
+        return np.nan, np.nan
+    chi2 = float(((table - expected) ** 2 / expected).sum())
+    return chi2, math.erfc(math.sqrt(chi2 / 2))
+
+
+def fisher_exact(table):
+    """Two-sided p-value of Fisher's exact test."""
+    (a, b), (c, d) = np.asarray(table, dtype=int)
+    n, row1, col1 = a + b + c + d, a + b, a + c
+    log_fact = np.concatenate([[0.0], np.cumsum(np.log(np.arange(1, n + 1)))])
+
+    def log_choose(m, k):
+        return log_fact[m] - log_fact[k] - log_fact[m - k]
+
+    support = np.arange(max(0, row1 + col1 - n), min(row1, col1) + 1)
+    log_pmf = log_choose(row1, support) + log_choose(n - row1, col1 - support) - log_choose(n, col1)
+    observed = log_pmf[support == a][0]
+    return float(min(1.0, np.exp(log_pmf[log_pmf <= observed + 1e-7]).sum()))
+
+
+def table_effects(tables):
+    """Odds ratio, relative risk, risk difference and phi for (..., 2, 2) tables.
+
+    A 0.5 continuity correction is added to every cell of tables with a zero cell.
+    """
+    t = np.asarray(tables, dtype=float)
+    a, b, c, d = t[..., 0, 0], t[..., 0, 1], t[..., 1, 0], t[..., 1, 1]
+    zero = (a == 0) | (b == 0) | (c == 0) | (d == 0)
+    ac, bc, cc, dc = (x + 0.5 * zero for x in (a, b, c, d))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        risk_exposed = a / (a + b)
+        risk_other = c / (c + d)
+        return {
+            "odds_ratio": (ac * dc) / (bc * cc),
+            "relative_risk": (ac / (ac + bc)) / (cc / (cc + dc)),
+            "risk_difference": risk_exposed - risk_other,
+            "phi": (a * d - b * c) / np.sqrt((a + b) * (c + d) * (a + c) * (b + d)),
+        }
+
+
+# === Continuous predictor ===
+
+def weighted_group_effects(x, outcome, weights):
+    """Point-biserial r and Cohen's d of `x` between outcome groups, per weight row."""
+    x = np.asarray(x, dtype=float)
+    g = np.asarray(outcome, dtype=float)
+    w = np.atleast_2d(weights).astype(float)
+    n = w.sum(axis=1)
+    n1 = w @ g
+    n0 = n - n1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = (w @ x) / n
+        mean1 = (w @ (x * g)) / n1
+        mean0 = (w @ (x * (1 - g))) / n0
+        var = (w @ x ** 2) / n - mean ** 2
+        var1 = (w @ (x ** 2 * g)) / n1 - mean1 ** 2
+        var0 = (w @ (x ** 2 * (1 - g))) / n0 - mean0 ** 2
+        pooled = np.sqrt((n1 * var1 + n0 * var0) / (n - 2))
+        p1 = n1 / n
+        return {
+            "point_biserial_r": (mean1 - mean0) * np.sqrt(p1 * (1 - p1)) / np.sqrt(var),
+            "cohens_d": (mean1 - mean0) / pooled,
+        }
+
+
+# === Logistic regression ===
+
+def fit_logistic(X, y, weights=None, max_iter=50, tol=1e-8):
+    """Batched IRLS. Returns (coef, cov) with shapes (b, k) and (b, k, k).
+
+    `weights` is (b, n) (one row of case weights per fit) or None for a single
+    unweighted fit. Fits that do not converge (e.g. separated data) give NaN.
+    """
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y, dtype=float)
+    w = np.ones((1, len(y))) if weights is None else np.atleast_2d(weights).astype(float)
+    beta = np.zeros((len(w), X.shape[1]))
+    converged = np.zeros(len(w), dtype=bool)
+    ridge = 1e-10 * np.eye(X.shape[1])
+    for _ in range(max_iter):
+        p = 1 / (1 + np.exp(-np.clip(beta @ X.T, -35, 35)))
+        info = np.einsum("bn,nk,nl->bkl", w * p * (1 - p), X, X) + ridge
+        score = (w * (y - p)) @ X
+        step = np.linalg.solve(info, score[..., None])[..., 0]
+        beta += step
+        converged = np.abs(step).max(axis=1) < tol
+        if converged.all():
+            break
+    cov = np.linalg.inv(info)
+    beta[~converged] = np.nan
+    return beta, cov
+
+
+def logistic_odds_ratios(frame, outcome, predictors):
+    """Odds ratio, Wald 95% interval and p-value per predictor."""
+    patterns, counts = compress_rows(*(frame[p] for p in predictors), frame[outcome])
+    X = np.column_stack([np.ones(len(patterns)), patterns[:, :-1]])
+    beta, cov = fit_logistic(X, patterns[:, -1], counts)
+    se = np.sqrt(np.diag(cov[0]))
+    rows = []
+    for j, name in enumerate(predictors, start=1):
+        z = beta[0, j] / se[j]
+        rows.append({
+            "predictor": name,
+            "odds_ratio": math.exp(beta[0, j]),
+            "wald_low": math.exp(beta[0, j] - 1.96 * se[j]),
+            "wald_high": math.exp(beta[0, j] + 1.96 * se[j]),
+            "p_value": math.erfc(abs(z) / math.sqrt(2)) if np.isfinite(z) else np.nan,
+        })
+    return rows
+
+
+# === Bootstrap ===
+
+def compress_rows(*columns):
+    """Distinct rows of the given columns and how often each occurs.
+
+    Resampling grants with replacement is the same as drawing multinomial counts
+    over these patterns, and a fit on (patterns, counts) equals the fit on the
+    rows; with a 0/1 and a small integer predictor there are only a few dozen.
+    """
+    stacked = np.column_stack([np.asarray(c, dtype=float) for c in columns])
+    patterns, counts = np.unique(stacked, axis=0, return_counts=True)
+    return patterns, counts
+
+
+def _bootstrap_batch(job, seed, size):
+    """One batch of resampled statistics (runs in a worker process)."""
+    rng = np.random.default_rng(seed)
+    kind = job["kind"]
+    if kind == "table":
+        table = np.asarray(job["table"])
+        n = int(table.sum())
+        cells = rng.multinomial(n, table.ravel() / n, size=size).reshape(size, 2, 2)
+        return table_effects(cells)
+    counts = np.asarray(job["counts"])
+    weights = rng.multinomial(int(counts.sum()), counts / counts.sum(), size=size)
+    patterns = np.asarray(job["patterns"])
+    if kind == "groups":
+        return weighted_group_effects(patterns[:, 0], patterns[:, 1], weights)
+    if kind == "logistic":
+        X = np.column_stack([np.ones(len(patterns)), patterns[:, :-1]])
+        beta, _ = fit_logistic(X, patterns[:, -1], weights)
+        return {name: np.exp(beta[:, j + 1]) for j, name in enumerate(job["names"])}
+    raise ValueError(f"Unknown bootstrap job {kind!r}")
+
+
+def pool_workers(n_resamples, n_patterns, workers=None):
+    """Worker processes for a bootstrap over `n_patterns` distinct rows.
+
+    An explicit `workers` wins; otherwise 1 (in-process) below POOL_MIN_WORK
+    and one per CPU above it.
+    """
+    if workers is not None:
+        return workers
+    return (os.cpu_count() or 1) if n_resamples * n_patterns >= POOL_MIN_WORK else 1
+
+
+def process_pool(workers=1):
+    """Pool for `bootstrap`, or a null context when one worker is all there is."""
+    if workers <= 1:
+        return contextlib.nullcontext(None)
+    # spawn, not fork: the Streamlit server process is multi-threaded
+    return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def bootstrap(job, n_resamples=N_RESAMPLES, batch_size=BATCH_SIZE, seed=0, pool=None):
+    """Percentile intervals for every statistic of `job`, as {name: (low, high, dropped)}.
+
+    `dropped` counts the resamples whose statistic was not finite.
+    """
+    n_batches = max(1, math.ceil(n_resamples / batch_size))
+    seeds = np.random.SeedSequence(seed).spawn(n_batches)
+    sizes = [min(batch_size, n_resamples - i * batch_size) for i in range(n_batches)]
+    if pool is not None:
+        batches = list(pool.map(_bootstrap_batch, [job] * n_batches, seeds, sizes))
+    else:
+        batches = [_bootstrap_batch(job, s, n) for s, n in zip(seeds, sizes)]
+    alpha = (1 - CI_LEVEL) / 2 * 100
+    out = {}
+    for name in batches[0]:
+        values = np.concatenate([b[name] for b in batches])
+        finite = values[np.isfinite(values)]
+        low, high = np.percentile(finite, [alpha, 100 - alpha]) if len(finite) else (np.nan, np.nan)
+        out[name] = (low, high, len(values) - len(finite))
+    return out
+
+
+# === Everything for the dashboard ===
+
+def _predictors(grants):
+    return [p for p in ("in_cruz_list", "flagged_words_count") if p in grants.columns]
+
+
+def compute_association_statistics(grants, n_resamples=N_RESAMPLES, seed=0, workers=None):
+    """One row per (outcome, predictor, measure) with estimate, CI and p-value.
+
+    `workers=None` picks in-process or a pool from the workload (`pool_workers`).
+    """
+    outcomes = {
+        outcome: grants[outcome].fillna(False).astype(bool).to_numpy()
+        for outcome in OUTCOMES if outcome in grants.columns
+    }
+    # the logistic job resamples the most patterns (every predictor and the outcome)
+    predictors = grants[_predictors(grants)].fillna(0)
+    n_patterns = max((len(compress_rows(*predictors.T.to_numpy(), y)[0]) for y in outcomes.values()), default=0)
+    with process_pool(pool_workers(n_resamples, n_patterns, workers)) as pool:
+        return _association_rows(grants, outcomes, n_resamples, seed, pool)
+
+
+def _association_rows(grants, outcomes, n_resamples, seed, pool):
+    rows = []
+
+    def add(outcome, predictor, measure, estimate, ci=(np.nan, np.nan, 0), p_value=np.nan):
+        rows.append({
+            "outcome": outcome, "predictor": predictor, "measure": measure,
+            "estimate": float(estimate), "ci_low": float(ci[0]), "ci_high": float(ci[1]),
+            "ci_dropped": int(ci[2]), "p_value": float(p_value), "n": len(grants),
+        })
+
+    for outcome, y in outcomes.items():
+        if y.all() or not y.any():
+            # no variation (e.g. every grant in the export is terminated)
+            add(outcome, "-", "no variation in outcome", np.nan)
+            continue
+
+        if "in_cruz_list" in grants.columns:
+            table = contingency_table(grants["in_cruz_list"].fillna(False).astype(bool), y)
+            chi2, chi2_p = chi_square_test(table)
+            fisher_p = fisher_exact(table)
+            effects = table_effects(table)
+            ci = bootstrap({"kind": "table", "table": table.tolist()}, n_resamples, seed=seed, pool=pool)
+            add(outcome, "in_cruz_list", "chi_square", chi2, p_value=chi2_p)
+            for measure, value in effects.items():
+                add(outcome, "in_cruz_list", measure, value, ci[measure],
+                    fisher_p if measure == "odds_ratio" else np.nan)
+
+        if "flagged_words_count" in grants.columns:
+            x = grants["flagged_words_count"].fillna(0).to_numpy(dtype=float)
+            effects = weighted_group_effects(x, y, np.ones(len(y)))
+            patterns, counts = compress_rows(x, y)
+            ci = bootstrap(
+                {"kind": "groups", "patterns": patterns, "counts": counts}, n_resamples, seed=seed, pool=pool
+            )
+            for measure, value in effects.items():
+                add(outcome, "flagged_words_count", measure, value[0], ci[measure])
+
+        predictors = _predictors(grants)
+        if predictors:
+            frame = grants[predictors].fillna(0).astype(float).assign(**{outcome: y})
+            patterns, counts = compress_rows(*(frame[p] for p in predictors), y)
+            ci = bootstrap(
+                {"kind": "logistic", "patterns": patterns, "counts": counts, "names": predictors},
+                n_resamples, seed=seed, pool=pool,
+            )
+            for row in logistic_odds_ratios(frame, outcome, predictors):
+                add(outcome, row["predictor"], "adjusted_odds_ratio", row["odds_ratio"],
+                    ci[row["predictor"]], row["p_value"])
+    return pd.DataFrame(rows)
+
+
+def association_statistics(grants, version, path=DEFAULT_STATS_DIR, n_resamples=N_RESAMPLES, seed=0, workers=None):
+    """`compute_association_statistics`, cached on disk per dataset version, inputs and settings.
+
+    The inputs are part of the key because the outcomes need not come from the
+    export alone (the pipeline takes reinstatement from the event store).
+    """
+    columns = [c for c in OUTCOMES + _predictors(grants) if c in grants.columns]
+    inputs = hashlib.sha1(pd.util.hash_pandas_object(grants[columns], index=False).to_numpy().tobytes()).hexdigest()
+    key = hashlib.sha1(json.dumps([version, inputs, n_resamples, seed, CI_LEVEL]).encode()).hexdigest()
+    cache_path = os.path.join(path, f"{key}.json") if path else None
+    if cache_path and os.path.exists(cache_path):
+        return pd.read_json(cache_path, orient="records")
+    table = compute_association_statistics(grants, n_resamples, seed, workers)
+    if cache_path:
+        os.makedirs(path, exist_ok=True)
+        table.to_json(cache_path, orient="records")
+    return table
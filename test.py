@@ -1,9 +1,11 @@
 import app as st
 import pandas as pd
 import numpy as np
-import re
 import altair as alt
 
+from tokens import TokenCorpus
+from watchlists import Watchlists
+
 st.set_page_config(page_title="NSF Terminations Dashboard", layout="wide")
 
 
@@ -61,21 +63,20 @@ for col in numeric_cols:
 flag_list = [str(w).lower().strip(", ") for w in flagged_words["flagged_word"]]
 
 
-def count_flagged(text):
-    if pd.isna(text):
-        return 0
-    text = text.lower()
-    return sum(len(re.findall(r"\b{}\b".format(re.escape(w)), text)) for w in flag_list)
+# tokenize the abstracts once; counts are integer matches over token IDs
+abstract_corpus = TokenCorpus.from_texts(df["abstract"])
+flagged_matrix = abstract_corpus.count_matrix(flag_list)
+df["text_row"] = np.arange(len(df))
 
 
-df["flagged_words_count"] = df["abstract"].apply(count_flagged)
+df["flagged_words_count"] = flagged_matrix.sum(axis=1)
 
 ##########################################################
-# 4. MERGE CRUZ LIST
+# 4. CRUZ LIST (watchlist bitset, no merge)
 ##########################################################
-cruz = cruz_data.rename(columns={"grant_number": "grant_id"})
-df = df.merge(cruz[["grant_id", "in_cruz_list"]], on="grant_id", how="left")
-df["in_cruz_list"] = df["in_cruz_list"].fillna(False)
+watchlists = Watchlists(df["grant_id"])
+watchlists.register_frame("cruz", cruz_data)
+df["in_cruz_list"] = watchlists.mask("cruz")
 
 ##########################################################
 # 5. PREPARE DATA
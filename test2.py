@@ -1,9 +1,11 @@
 import app as st
 import pandas as pd
 import numpy as np
-import re
 import altair as alt
 
+from tokens import TokenCorpus
+from watchlists import Watchlists
+
 st.set_page_config(page_title="NSF Terminations Dashboard", layout="wide")
 
 
@@ -64,22 +66,21 @@ for col in numeric_cols:
 flag_list = [str(w).lower().strip(", ") for w in flagged_words["flagged_word"]]
 
 
-def count_flagged(text):
-    if pd.isna(text):
-        return 0
-    text = text.lower()
-    return sum(len(re.findall(rf"\\b{re.escape(w)}\\b", text)) for w in flag_list)
+# tokenize the abstracts once; counts are integer matches over token IDs
+abstract_corpus = TokenCorpus.from_texts(df["abstract"])
+flagged_matrix = abstract_corpus.count_matrix(flag_list)
+df["text_row"] = np.arange(len(df))
 
 
-df["flagged_words_count"] = df["abstract"].apply(count_flagged)
+df["flagged_words_count"] = flagged_matrix.sum(axis=1)
 
 
 ##########################################################
-# 4. MERGE CRUZ LIST
+# 4. CRUZ LIST (watchlist bitset, no merge)
 ##########################################################
-cruz = cruz_data.rename(columns={"grant_number": "grant_id"})
-df = df.merge(cruz[["grant_id", "in_cruz_list"]], on="grant_id", how="left")
-df["in_cruz_list"] = df["in_cruz_list"].fillna(False)
+watchlists = Watchlists(df["grant_id"])
+watchlists.register_frame("cruz", cruz_data)
+df["in_cruz_list"] = watchlists.mask("cruz")
 
 
 ##########################################################
@@ -164,14 +165,13 @@ chart_q4_left = (
 
 
 # ------------- RIGHT GRAPH (Top 15 flagged words)
-pattern = r"\b(" + "|".join(re.escape(w) for w in flag_list) + r")\b"
-
+# reuse the abstract token matrix, restricted to the terminated rows
 word_counts = (
-    df_q4["abstract"]
-    .str.lower()
-    .str.findall(pattern)  # ✔ WORD-LEVEL MATCHING
-    .explode()
-    .value_counts()
+    pd.Series(flagged_matrix[df_q4["text_row"]].sum(axis=0), index=flag_list)
+    .groupby(level=0)
+    .first()
+    .loc[lambda s: s > 0]
+    .sort_values(ascending=False)
     .head(15)
     .reset_index()
 )
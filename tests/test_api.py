@@ -0,0 +1,89 @@
+import gzip
+import json
+import threading
+import urllib.error
+import urllib.request
+from types import SimpleNamespace
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from api import Catalog, aggregate_frames, make_server
+
+AGGREGATES = {
+    "state_cancellations": pd.DataFrame({"state": ["TX", "CA"], "cancelled_grants": [3, 2]}),
+    "top_words": pd.DataFrame({"word": [f"w{i}" for i in range(100)], "count": range(100)}),
+    "budget_rollups": {("institution", "total"): pd.DataFrame({"name": ["A"], "value": [1.5]})},
+    "statistics_note": "not a frame",
+}
+
+
+@pytest.fixture(scope="module")
+def get():
+    dataset = SimpleNamespace(version="v1", aggregates=AGGREGATES)
+    server = make_server(SimpleNamespace(catalog=Catalog(dataset)), port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def get(path, **headers):
+        request = urllib.request.Request(f"http://127.0.0.1:{server.server_port}{path}", headers=headers)
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, response.headers, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers, e.read()
+
+    yield get
+    server.shutdown()
+    server.server_close()
+
+
+def test_nested_aggregates_are_flattened():
+    assert set(aggregate_frames(AGGREGATES)) == {
+        "state_cancellations", "top_words", "budget_rollups/institution/total"}
+
+
+def test_index_and_json(get):
+    status, _, body = get("/api/")
+    assert status == 200
+    assert {e["path"] for e in json.loads(body)["endpoints"]} == {
+        "/api/state_cancellations", "/api/top_words", "/api/budget_rollups/institution/total"}
+    status, headers, body = get("/api/budget_rollups/institution/total")
+    assert json.loads(body) == [{"name": "A", "value": 1.5}]
+    assert headers["X-Dataset-Version"] == "v1"
+
+
+def test_etag_revalidation(get):
+    _, headers, _ = get("/api/state_cancellations")
+    etag = headers["ETag"]
+    status, headers, body = get("/api/state_cancellations", **{"If-None-Match": etag})
+    assert (status, body, headers["ETag"]) == (304, b"", etag)
+    assert get("/api/state_cancellations", **{"If-None-Match": "W/" + etag})[0] == 304
+    assert get("/api/state_cancellations", **{"If-None-Match": '"other"'})[0] == 200
+
+
+def test_gzip_variant(get):
+    status, headers, body = get("/api/top_words", **{"Accept-Encoding": "gzip"})
+    assert headers["Content-Encoding"] == "gzip" and headers["ETag"].endswith('-gz"')
+    assert len(json.loads(gzip.decompress(body))) == 100
+    # the plain ETag also revalidates the gzip variant
+    plain = get("/api/top_words")[1]["ETag"]
+    assert get("/api/top_words", **{"Accept-Encoding": "gzip", "If-None-Match": plain})[0] == 304
+    # small bodies are never compressed
+    assert "Content-Encoding" not in get("/api/state_cancellations", **{"Accept-Encoding": "gzip"})[1]
+    assert "Content-Encoding" not in get("/api/top_words", **{"Accept-Encoding": "gzip;q=0"})[1]
+
+
+def test_arrow_format(get):
+    for path, headers in [("/api/state_cancellations.arrow", {}),
+                          ("/api/state_cancellations?format=arrow", {}),
+                          ("/api/state_cancellations", {"Accept": "application/vnd.apache.arrow.stream"})]:
+        status, response_headers, body = get(path, **headers)
+        assert response_headers["Content-Type"] == "application/vnd.apache.arrow.stream"
+        assert pa.ipc.open_stream(body).read_all().to_pandas().equals(AGGREGATES["state_cancellations"])
+
+
+def test_errors(get):
+    assert get("/api/nope")[0] == 404
+    assert get("/api/top_words?format=xml")[0] == 400
+    assert get("/elsewhere")[0] == 404
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from budget import ALL_STATES, budget_view, compute_budget_rollups, compute_state_rollups
+
+
+@pytest.fixture
+def grants():
+    return pd.DataFrame({
+        "org_name": ["A", "A", "B", "C", "C"],
+        "org_state": ["TX", "TX", "CA", "CA", None],
+        "directorate": ["BIO", "GEO", "BIO", "BIO", "GEO"],
+        "nsf_total_budget": [100.0, np.nan, 50.0, np.nan, 10.0],
+        "estimated_budget": [1.0, 40.0, 2.0, np.nan, 3.0],
+        "nsf_obligated": [np.nan] * 5,
+    })
+
+
+def test_fallback_applies_before_summing(grants):
+    table = compute_budget_rollups(grants)[("institution", "total")].set_index("name")
+    assert table.loc["A", "value"] == 140  # the missing total falls back to the estimate
+    assert table.loc["A", "coverage"] == 1
+
+
+def test_groups_without_a_value_are_nan_not_zero(grants):
+    rollups = compute_budget_rollups(grants)
+    table = rollups[("institution", "total")]
+    assert table["name"].tolist() == ["A", "B", "C"]
+    assert table.set_index("name").loc["C", ["value", "reported", "grant_count"]].tolist() == [10, 1, 2]
+    obligated = rollups[("institution", "obligated")]
+    assert obligated["value"].isna().all()
+    assert budget_view(rollups, "institution", "obligated").empty
+    assert rollups[("all", "total")]["value"].tolist() == [200]
+
+
+def test_state_rollups_rank_within_each_state(grants):
+    table = compute_state_rollups(grants, top=1)[("institution", "total")]
+    top = table.set_index("state")["name"].to_dict()
+    assert top == {"TX": "A", "CA": "B", "Unknown": "C", ALL_STATES: "A"}
+    assert ("state", "total") not in compute_state_rollups(grants)
+
+
+def test_state_rollups_match_the_overall_rollup(grants):
+    overall = compute_budget_rollups(grants)[("directorate", "total")].set_index("name")["value"]
+    states = compute_state_rollups(grants)[("directorate", "total")]
+    per_state = states[states["state"] != ALL_STATES].groupby("name")["value"].sum()
+    all_rows = states[states["state"] == ALL_STATES].set_index("name")["value"]
+    pd.testing.assert_series_equal(per_state.sort_index(), overall.sort_index(), check_names=False)
+    pd.testing.assert_series_equal(all_rows.sort_index(), overall.sort_index(), check_names=False)
+
+
+def test_unknown_rollup_raises(grants):
+    with pytest.raises(KeyError):
+        budget_view(compute_budget_rollups(grants), "program", "total")
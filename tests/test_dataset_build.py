@@ -0,0 +1,76 @@
+import threading
+
+import pytest
+
+from pipeline import DatasetBuild
+
+
+class StagedLoad:
+    """Fake `load_dataset` that publishes one stage each time `step()` is called."""
+
+    def __init__(self, stages, error=None):
+        self.stages = stages
+        self.error = error
+        self.go = threading.Semaphore(0)
+
+    def step(self, n=1):
+        for _ in range(n):
+            self.go.release()
+
+    def __call__(self, on_ready):
+        for stage in self.stages:
+            self.go.acquire()
+            for name, value in stage.items():
+                on_ready(name, value)
+        self.go.acquire()
+        if self.error is not None:
+            raise self.error
+        return "dataset"
+
+
+def test_wait_blocks_until_names_are_published():
+    load = StagedLoad([{"a": 1}, {"b": 2}])
+    build = DatasetBuild(load)
+    assert not build.ready(["a"])
+    assert build.wait(["a"], timeout=0.05) is False
+    load.step()
+    assert build.wait(["a"], timeout=5)
+    assert build.get("a") == 1 and not build.ready(["a", "b"])
+    load.step(2)
+    assert build.result(timeout=5) == "dataset"
+    assert dict(build.aggregates()) == {"a": 1, "b": 2}
+    assert set(build.ready_after) == {"a", "b"}
+
+
+def test_wait_any_returns_the_ready_groups():
+    load = StagedLoad([{"a": 1}, {"b": 2}])
+    build = DatasetBuild(load)
+    assert build.wait_any([["b"], ["a"]], timeout=0.05) == []
+    load.step()
+    assert build.wait_any([["b"], ["a"]], timeout=5) == [1]
+    load.step(2)
+    build.result(timeout=5)
+    assert build.wait_any([["b"], ["a"]]) == [0, 1]
+
+
+def test_missing_name_counts_as_ready_once_finished():
+    load = StagedLoad([{"a": 1}])
+    build = DatasetBuild(load)
+    load.step()
+    assert build.wait(["a", "topics"], timeout=0.05) is False
+    load.step()
+    assert build.wait(["a", "topics"], timeout=5)
+    assert build.get("topics") is None
+
+
+def test_errors_reach_every_waiter():
+    load = StagedLoad([{"a": 1}], error=ValueError("bad export"))
+    build = DatasetBuild(load)
+    load.step(2)
+    with pytest.raises(ValueError, match="bad export"):
+        build.result(timeout=5)
+    # already published aggregates do not hide the failure
+    for call in (lambda: build.wait(["a"]), lambda: build.wait_any([["a"]]), build.result):
+        with pytest.raises(ValueError):
+            call()
+    assert isinstance(build.error, ValueError)
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from dedup import (
+    DEFAULT_THRESHOLD, cluster_sizes, connected_components, duplicate_clusters,
+    exact_jaccard, shingle_sets,
+)
+from tokens import TokenCorpus
+
+WORDS = [f"w{i}" for i in range(5000)]
+
+
+def abstract(rng, n=200):
+    return list(rng.choice(WORDS, n))
+
+
+def edited(tokens, *positions):
+    tokens = list(tokens)
+    for i in positions:
+        tokens[i] = "edit"
+    return tokens
+
+
+def test_exact_jaccard_of_shingle_sets():
+    rng = np.random.default_rng(0)
+    base = abstract(rng)
+    corpus = TokenCorpus.from_texts([" ".join(base), " ".join(edited(base, 100)), " ".join(base[:100])])
+    sim = exact_jaccard(shingle_sets(corpus), np.array([[0, 1], [0, 2], [1, 1]]))
+    # one replaced word changes 5 of 196 shingles
+    assert sim[0] == pytest.approx(191 / 201)
+    assert sim[1] == pytest.approx(96 / 196)
+    assert sim[2] == 1
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_one_word_edits_cluster_and_distinct_abstracts_do_not(seed):
+    rng = np.random.default_rng(seed)
+    bases = [abstract(rng) for _ in range(60)]
+    texts = []
+    for i, base in enumerate(bases):
+        texts.append(base)
+        if i % 3 == 0:
+            texts.append(edited(base, rng.integers(200)))
+    # same topic words, different text: sharing the first half is far below the threshold
+    texts.append(bases[1][:100] + abstract(rng, 100))
+    clusters = duplicate_clusters(TokenCorpus.from_texts([" ".join(t) for t in texts]))
+    sizes = cluster_sizes(clusters)
+    assert (sizes == 2).sum() == 2 * 20 and sizes.max() == 2
+    assert sizes[-1] == 1
+
+
+def test_borderline_pairs_follow_the_exact_similarity():
+    rng = np.random.default_rng(7)
+    base = abstract(rng)
+    below = edited(base, *range(0, 200, 40))  # 5 edits change 21 shingles: J = 175/217
+    above = edited(base, 0, 195)              # edits near the ends change 6: J = 190/202
+    corpus = TokenCorpus.from_texts([" ".join(t) for t in (base, below, above)])
+    sets = shingle_sets(corpus)
+    sim = exact_jaccard(sets, np.array([[0, 1], [0, 2]]))
+    assert sim[0] < DEFAULT_THRESHOLD < sim[1]
+    clusters = duplicate_clusters(corpus)
+    assert clusters.tolist() == [0, 1, 0]
+
+
+def test_empty_and_short_documents_stay_singletons():
+    corpus = TokenCorpus.from_texts(["", "", "short text", "short text", None])
+    clusters = duplicate_clusters(corpus)
+    assert clusters[0] == 0 and clusters[1] == 1
+    assert clusters[3] == 2  # identical short texts are one shingle each
+
+
+def test_connected_components_takes_the_lowest_member():
+    pairs = np.array([[3, 4], [1, 3], [5, 6]])
+    assert connected_components(7, pairs).tolist() == [0, 1, 2, 1, 1, 5, 5]
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+from density import compute_density_splom, density_splom_chart, field_edges
+
+
+def frame(n=1000):
+    rng = np.random.default_rng(0)
+    budget = rng.uniform(0, 100, n)
+    budget[:3] = [1e6, -1e6, np.nan]  # two far outliers and a missing value
+    return pd.DataFrame({"budget": budget, "words": rng.integers(0, 6, n)})
+
+
+def test_integer_fields_get_one_bin_per_value():
+    edges = field_edges(np.array([0, 1, 2, 5, 5], dtype=float), bins=30, clip=(0, 100))
+    assert edges.tolist() == [-0.5, 0.5, 1.5, 2.5, 3.5, 4.5, 5.5]
+    assert len(field_edges(np.linspace(0, 1, 500), bins=30)) == 31
+
+
+def test_bins_and_outliers_account_for_every_pair_row():
+    grants = frame()
+    splom = compute_density_splom(grants, ["budget", "words"], bins=20, max_outliers=100)
+    lo, hi = np.nanpercentile(grants["budget"], [0.5, 99.5])
+    budget = grants["budget"].to_numpy()
+    inside = (budget >= lo) & (budget <= hi)
+
+    hist = splom["hist"].groupby("field")["count"].sum()
+    assert hist["words"] == len(grants)
+    assert hist["budget"] == inside.sum()
+    # every row with both values is either in a 2D bin or an outlier
+    cells, outliers = splom["cells"], splom["outliers"]
+    assert cells["count"].sum() == inside.sum()
+    assert cells["count"].sum() + len(outliers) == grants["budget"].notna().sum()
+    assert {1e6, -1e6} <= set(outliers["x"])
+    assert ((outliers["x"] < lo) | (outliers["x"] > hi)).all()
+    assert (cells["count"] > 0).all()
+
+
+def test_outlier_sample_is_capped_and_reproducible():
+    grants = frame()
+    first = compute_density_splom(grants, ["budget", "words"], max_outliers=3, seed=1)
+    assert len(first["outliers"]) == 3
+    again = compute_density_splom(grants, ["budget", "words"], max_outliers=3, seed=1)
+    pd.testing.assert_frame_equal(first["outliers"], again["outliers"])
+    assert compute_density_splom(grants, ["budget", "words"], max_outliers=0)["outliers"].empty
+
+
+def test_payload_does_not_grow_with_rows():
+    small = density_splom_chart(compute_density_splom(frame(1000), ["budget", "words"])).to_dict()
+    large = density_splom_chart(compute_density_splom(frame(20000), ["budget", "words"])).to_dict()
+    assert len(str(large)) < 1.5 * len(str(small))
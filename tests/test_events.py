@@ -0,0 +1,74 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+from events import GrantEventStore
+
+
+def export(*rows):
+    return pd.DataFrame(rows, columns=["grant_id", "terminated", "reinstated",
+                                       "termination_date", "reinstatement_date"])
+
+
+@pytest.fixture
+def store(tmp_path):
+    return GrantEventStore(str(tmp_path / "events"))
+
+
+def test_every_grant_in_an_export_is_seen(store):
+    store.ingest(export((1, True, False, "2025-04-18", None), (2, False, False, None, None)), "a")
+    assert store.status(2) is not None
+    assert not store.status(2)["terminated"] and store.status(2)["in_export"]
+    assert store.status(3) is None
+    assert store.events().groupby("event").size().to_dict() == {"first_seen": 2, "terminated": 1}
+    assert store.status(1)["last_event"] == "terminated"
+
+
+def test_transitions_between_exports(store):
+    store.ingest(export((1, True, False, "2025-04-18", None), (2, False, False, None, None)), "a")
+    assert store.ingest(export((1, True, True, "2025-04-18", "2025-06-01")), "b") == 2
+    log = store.events()
+    assert log[log["source"] == "b"].set_index("grant_id")["event"].to_dict() == {
+        "1": "reinstated", "2": "dropped_from_export"}
+    assert not store.status(2)["in_export"]
+
+    store.ingest(export((1, True, False, "2025-04-18", None), (2, True, False, "2025-07-01", None)), "c")
+    log = store.events()
+    assert sorted(log.loc[log["source"] == "c", "event"]) == [
+        "reinstatement_revoked", "returned_to_export", "terminated"]
+    assert store.status(2)["terminated"] and store.status(2)["in_export"]
+    assert store.ingest(export((1, False, False, None, None)), "c") == 0  # seen before
+
+
+def test_snapshot_survives_a_restart(store):
+    store.ingest(export((1, True, True, "2025-04-18", "2025-05-08")), "a")
+    again = GrantEventStore(store.directory)
+    pd.testing.assert_frame_equal(again.snapshot, store.snapshot, check_dtype=False)
+    assert again.next_seq == store.next_seq
+    assert again.reinstatement_days().tolist() == [20]
+    assert again.statuses([1, 9])["reinstated"].isna().tolist() == [False, True]
+
+
+def test_state_as_of_replays_by_effective_date(store):
+    store.ingest(export((1, True, False, "2025-04-18", None)), "a", observed_at="2025-05-01T00:00:00+00:00")
+    store.ingest(export((1, True, True, "2025-04-18", "2025-06-01")), "b", observed_at="2025-06-02T00:00:00+00:00")
+    before = store.state_as_of("2025-05-15")
+    after = store.state_as_of("2025-06-15")
+    assert before.loc["1"].tolist() == [True, False]
+    assert after.loc["1"].tolist() == [True, True]
+
+
+def test_two_stores_on_one_directory_ingest_an_export_once(store):
+    # e.g. the app and api.py, both loaded before either ingested
+    other = GrantEventStore(store.directory)
+    first = export((1, True, False, "2025-04-18", None), (2, False, False, None, None))
+    with ThreadPoolExecutor(2) as pool:
+        appended = sorted(pool.map(lambda s: s.ingest(first, "a"), [store, other]))
+    assert appended == [0, 3]
+    # the store that lost the race picked up the other's snapshot and sequence
+    assert other.ingest(export((1, True, True, "2025-04-18", "2025-06-01")), "b") == 2
+    assert store.ingest(export((1, False, False, None, None)), "b") == 0
+    log = store.events()
+    assert log["seq"].tolist() == list(range(5))
+    assert store.status(1)["reinstated"]
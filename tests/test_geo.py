@@ -0,0 +1,64 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+from geo import (
+    build_geometry_tiers, choose_tier, decode_arcs, encode_topology, join_values,
+    load_tier, simplify_arc, tier_path,
+)
+
+
+def square(x, y, size=1.0, n=50):
+    """Closed ring with `n` points per side (all but the corners are collinear)."""
+    t = np.linspace(0, size, n, endpoint=False)
+    sides = [np.c_[x + t, np.full(n, y)], np.c_[np.full(n, x + size), y + t],
+             np.c_[x + size - t, np.full(n, y + size)], np.c_[np.full(n, x), y + size - t]]
+    return np.vstack(sides + [[[x, y]]])
+
+
+def topology():
+    # two states, each one closed arc
+    arcs = [square(0, 0), square(2, 0)]
+    states = [{"type": "Polygon", "id": "01", "arcs": [[0]]},
+              {"type": "Polygon", "id": "02", "arcs": [[~1]]}]
+    return encode_topology({"states": {"geometries": states}}, arcs)
+
+
+def test_simplify_keeps_corners_and_endpoints():
+    ring = square(0, 0)
+    simplified = simplify_arc(ring, 0.01)
+    assert len(simplified) == 5
+    assert np.allclose(simplified[0], ring[0]) and np.allclose(simplified[-1], ring[-1])
+
+
+def test_encode_round_trips_coordinates():
+    topo = topology()
+    arcs = decode_arcs(topo)
+    assert np.allclose(arcs[1].min(axis=0), [2, 0], atol=1e-4)
+    assert np.allclose(arcs[1].max(axis=0), [3, 1], atol=1e-4)
+
+
+def test_build_and_choose_tiers(tmp_path):
+    source = tmp_path / "us.json"
+    source.write_text(json.dumps(topology()))
+    tier_dir = str(tmp_path / "tiers")
+    manifest = build_geometry_tiers(str(source), tier_dir)
+    assert set(manifest["tiers"]) == {"states_small", "states"}
+    assert choose_tier(260) == "states_small"
+    assert choose_tier(800) == "states"
+    small = load_tier("states_small", tier_dir)
+    assert [g["id"] for g in small["objects"]["states"]["geometries"]] == ["01", "02"]
+    # the collinear points of each side are simplified away
+    assert [len(a) for a in small["arcs"]] == [5, 5]
+    assert tier_path("states", tier_dir).endswith("tiers/states.json")
+
+
+def test_join_values_copies_and_fills_missing():
+    topo = topology()
+    values = pd.DataFrame({"id": [1], "state": ["AL"], "cancelled_grants": [7]})
+    joined = join_values(topo, "states", values, "id", ["state", "cancelled_grants"])
+    props = [g["properties"] for g in joined["objects"]["states"]["geometries"]]
+    assert props == [{"state": "AL", "cancelled_grants": 7}, {"state": None, "cancelled_grants": None}]
+    assert "properties" not in topo["objects"]["states"]["geometries"][0]
+    assert joined["arcs"] is topo["arcs"]
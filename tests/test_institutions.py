@@ -0,0 +1,70 @@
+from institutions import InstitutionResolver, normalize_name, split_name
+
+
+def test_normalization():
+    assert normalize_name("The Ohio State University") == "ohio state university"
+    assert normalize_name("Regents of the Univ. of Michigan") == "university of michigan"
+    assert split_name("University of Michigan - Ann Arbor") == ("university of michigan", "ann arbor")
+    # a hyphen inside the institution's own name is not a campus
+    assert split_name("Winston-Salem State University") == ("winston salem state university", "")
+
+
+def test_spellings_resolve_to_one_id():
+    resolver = InstitutionResolver(path=None)
+    ids = resolver.resolve([
+        "Ohio State University", "The Ohio State University", "OHIO STATE UNIVERSITY",
+        "Regents of the University of Michigan - Ann Arbor", "University of Michigan",
+        "Ohio University",
+    ]).tolist()
+    assert ids[0] == ids[1] == ids[2]
+    assert ids[3] == ids[4]  # single campus folds into the base name
+    assert len(set(ids)) == 3
+
+
+def test_campuses_of_one_base_stay_separate():
+    resolver = InstitutionResolver(path=None)
+    ids = resolver.resolve([
+        "University of California - Berkeley", "University of California - Davis",
+        "University of California, Berkeley",
+    ]).tolist()
+    assert ids[0] != ids[1] and ids[0] == ids[2]
+
+
+def test_canonical_names_use_most_frequent_spelling():
+    resolver = InstitutionResolver(path=None)
+    names = ["Ohio State University"] * 2 + ["The Ohio State University"]
+    assert set(resolver.canonical_names(names)) == {"Ohio State University"}
+
+
+def test_mapping_is_reused_from_disk(tmp_path):
+    path = str(tmp_path / "institutions.json")
+    first = InstitutionResolver(path=path).resolve(["Ohio State University", "Duke University"])
+    resolver = InstitutionResolver(path=path)
+    assert resolver.aliases == dict(zip(["Ohio State University", "Duke University"], first))
+    assert resolver.resolve(["Duke University", "Rice University"]).tolist() == [first[1], 2]
+
+
+def test_ambiguous_abbreviations_are_not_expanded():
+    resolver = InstitutionResolver(path=None)
+    ids = resolver.resolve(["Ohio St University", "Ohio Saint University"]).tolist()
+    assert ids[0] != ids[1]
+
+
+def groups(resolver, names):
+    ids = resolver.resolve(names)
+    return {frozenset(n for n, i in zip(names, ids) if i == cid) for cid in set(ids)}
+
+
+def test_ids_do_not_depend_on_input_order_or_batches():
+    names = [
+        "University of Michigan", "University of Michigan - Ann Arbor",
+        "University of Michigan - Dearborn", "Duke University", "Duke Univ",
+    ]
+    expected = groups(InstitutionResolver(path=None), names)
+    assert expected == groups(InstitutionResolver(path=None), names[::-1])
+    # Ann Arbor folds into the base until Dearborn shows up in a later batch
+    resolver = InstitutionResolver(path=None)
+    first = resolver.resolve(names[:2]).tolist()
+    assert first[0] == first[1]
+    resolver.resolve(names[2:])
+    assert groups(resolver, names) == expected
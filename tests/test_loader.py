@@ -0,0 +1,40 @@
+import time
+
+import pytest
+
+from loader import SourceLoader
+
+
+def slow(value, seconds):
+    time.sleep(seconds)
+    return value
+
+
+def test_results_and_per_source_timings():
+    loader = SourceLoader(max_workers=2)
+    loader.submit("a", slow, 1, 0.05)
+    loader.submit("b", slow, 2, 0.0)
+    assert loader.has("a") and not loader.has("c")
+    assert (loader.result("a"), loader.result("b")) == (1, 2)
+    loader.shutdown()
+    timings = loader.report().set_index("source")["seconds"]
+    assert timings["a"] >= 0.05
+    assert timings["b"] < timings["a"]
+
+
+def test_wall_time_stops_when_the_last_source_finishes():
+    loader = SourceLoader()
+    loader.submit("a", slow, 1, 0.05)
+    loader.shutdown()
+    time.sleep(0.2)  # later pipeline stages must not count as load time
+    wall = loader.report().set_index("source")["seconds"]["wall"]
+    assert 0.05 <= wall < 0.2
+
+
+def test_load_errors_are_reraised():
+    loader = SourceLoader()
+    loader.submit("bad", lambda: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        loader.result("bad")
+    loader.shutdown()
+    assert "bad" in loader.timings
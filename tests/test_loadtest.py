@@ -0,0 +1,44 @@
+from streamlit.testing.v1 import AppTest
+
+import server_transforms
+from loadtest import change_widgets, clear_caches, compare_reports
+
+WIDGET_APP = '''
+import streamlit as st
+LABELS = {"a": "First", "b": "Second"}
+st.selectbox("lookup", list(LABELS), format_func=lambda k: LABELS[k])
+st.radio("suffix", ["any", "all"], format_func=lambda h: f"{h} of the lists")
+st.radio("plain", ["x", "y"])
+'''
+
+
+def test_change_widgets_only_sets_accepted_labels(tmp_path):
+    path = tmp_path / "widgets.py"
+    path.write_text(WIDGET_APP)
+    at = AppTest.from_file(str(path))
+    at.run()
+    assert change_widgets(at, 1) == 2  # the re-formatting radio is left alone
+    at.run()
+    assert not at.exception
+    assert at.selectbox[0].value == "b"  # the label maps back to its raw option
+    assert at.radio[1].value == "y"
+
+
+def test_compare_reports():
+    old = {"runs": [{"scenario": "warm", "latency": {"p50_ms": 10, "p95_ms": 20, "p99_ms": 30},
+                     "throughput_reruns_per_s": 4, "cpu_utilisation": 0.5,
+                     "rss_growth_per_session_mb": 0, "payload_bytes_per_session": 100}]}
+    new = {"runs": [dict(old["runs"][0], latency={"p50_ms": 5, "p95_ms": 20, "p99_ms": None})]}
+    rows = {metric: change for _, metric, _, _, change in compare_reports(old, new)}
+    assert rows["p50_ms"] == -50.0 and rows["p99_ms"] is None
+    assert rows["rss_growth_per_session_mb"] is None
+
+
+def test_clear_caches_empties_memory_and_disk_caches(tmp_path):
+    cache_dir = tmp_path / "cache"
+    (cache_dir / "tokens").mkdir(parents=True)
+    (cache_dir / "institutions.json").write_text("{}")
+    server_transforms._cache["k"] = ([], {})
+    clear_caches(str(cache_dir))
+    assert not cache_dir.exists()
+    assert not server_transforms._cache
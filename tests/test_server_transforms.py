@@ -0,0 +1,78 @@
+import altair as alt
+import pandas as pd
+import pytest
+
+from server_transforms import (
+    Unsupported, apply_transforms, bin_params, evaluate_expression,
+    pre_transform_spec, translate_expression,
+)
+
+
+def test_translate_expression():
+    assert translate_expression("datum.a === 'x'") == "_d['a'] == 'x'"
+    assert translate_expression('datum["b c"] * 2') == "_d['b c'] * 2"
+    with pytest.raises(Unsupported):
+        translate_expression("isValid(datum.a)")
+
+
+def test_evaluate_expression_with_functions():
+    frame = pd.DataFrame({"n": [1.0, 2.5], "s": ["3", "x"]})
+    assert evaluate_expression("toString(datum.n) + '%'", frame).tolist() == ["1%", "2.5%"]
+    assert evaluate_expression("toNumber(datum.s)", frame).isna().tolist() == [False, True]
+
+
+def test_bin_params_match_vega():
+    # vega bin({extent: [0, 97], maxbins: 10}) -> start 0, stop 100, step 10
+    assert bin_params((0, 97), maxbins=10) == (0, 100, 10)
+    assert bin_params((0.3, 4.2), maxbins=20) == pytest.approx((0.2, 4.2, 0.2))
+
+
+def test_filter_bin_and_aggregate():
+    frame = pd.DataFrame({"v": [1, 3, 12, 15, 40], "g": list("aabbb")})
+    out = apply_transforms(frame, [
+        {"filter": "datum.v > 2"},
+        {"bin": {"maxbins": 5}, "field": "v", "as": "b"},
+        {"aggregate": [{"op": "count", "as": "n"}], "groupby": ["b"]},
+    ])
+    # the maximum falls into the last bin, as in Vega
+    assert dict(zip(out["b"], out["n"])) == {0: 1, 10: 2, 30: 1}
+
+
+def test_joinaggregate_and_cumulative_window():
+    frame = pd.DataFrame({"g": list("aab"), "c": [1, 3, 5]})
+    out = apply_transforms(frame, [
+        {"joinaggregate": [{"op": "sum", "field": "c", "as": "t"}], "groupby": ["g"]},
+        {"window": [{"op": "sum", "field": "c", "as": "cum"}], "groupby": ["g"],
+         "sort": [{"field": "c"}]},
+    ])
+    assert out["t"].tolist() == [4, 4, 5]
+    assert out["cum"].tolist() == [1, 4, 5]
+
+
+def test_pre_transform_spec_evaluates_encoding_aggregate():
+    data = pd.DataFrame({"v": [1, 2, 2, 9]})
+    spec = alt.Chart(data).mark_bar().encode(
+        alt.X("v:Q", bin=alt.Bin(maxbins=5)), y="count()").to_dict()
+    out = pre_transform_spec(spec)
+    (rows,) = out["datasets"].values()
+    assert sum(r["__count"] for r in rows) == 4
+    assert out["encoding"]["x"]["bin"]["binned"] is True
+    assert "x2" in out["encoding"]
+
+
+def test_selection_driven_views_stay_client_side():
+    data = pd.DataFrame({"a": ["x", "y"], "n": [1, 2]})
+    pick = alt.selection_point(fields=["a"])
+    spec = alt.Chart(data).mark_bar().encode(x="a:N", y="sum(n):Q").add_params(
+        pick).transform_filter(pick).to_dict()
+    out = pre_transform_spec(spec)
+    assert out["transform"] == spec["transform"]
+    assert out["datasets"] == spec["datasets"]
+
+
+def test_view_that_fails_to_evaluate_is_left_to_vega():
+    data = pd.DataFrame({"s": ["a", "b"]})
+    spec = alt.Chart(data).mark_point().encode(x="t:Q").transform_calculate(t="datum.s - 1").to_dict()
+    out = pre_transform_spec(spec)
+    assert out["transform"] == spec["transform"]
+    assert out["datasets"] == spec["datasets"]
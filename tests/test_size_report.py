@@ -0,0 +1,62 @@
+import pandas as pd
+import pytest
+
+import size_report
+from size_report import check_budgets, panel_sizes, parse_size
+
+
+def report(sizes):
+    return pd.DataFrame({"key": list(sizes), "bytes": list(sizes.values()), "detail": ""})
+
+
+def test_parse_size():
+    assert parse_size("150KB") == 150 * 1024
+    assert parse_size(" 1.5 mb ") == int(1.5 * 1024 ** 2)
+    assert parse_size(512) == 512
+    with pytest.raises(ValueError):
+        parse_size("lots")
+
+
+def test_most_specific_budget_wins():
+    checked = check_budgets(
+        report({"chart.a.F1": 120_000, "chart.a.F2": 120_000, "chart.b.F1": 120_000, "wire.a": 10}),
+        {"chart.*": "100KB", "chart.a.*": "200KB", "chart.a.F2": "100KB"},
+    ).set_index("key")
+    assert checked["budget"].iloc[:3].tolist() == [200 * 1024, 100 * 1024, 100 * 1024]
+    assert checked["over"].to_dict() == {
+        "chart.a.F1": False, "chart.a.F2": True, "chart.b.F1": True, "wire.a": False}
+    assert pd.isna(checked.loc["wire.a", "budget"])
+
+
+def test_at_budget_passes():
+    checked = check_budgets(report({"memory.stage.grants": 64 * 1024 ** 2}), {"memory.stage.grants": "64MB"})
+    assert not checked["over"].any()
+
+
+def test_main_fails_when_over_budget(monkeypatch, tmp_path, capsys):
+    budgets = tmp_path / "budgets.json"
+    budgets.write_text('{"chart.*": "1KB"}')
+    monkeypatch.setattr(size_report, "build_report", lambda app: report({"chart.x.F1": 2048}))
+    with pytest.raises(SystemExit) as exit_info:
+        size_report.main(["--budgets", str(budgets)])
+    assert exit_info.value.code == 1
+    assert "1 measurement(s) over budget: chart.x.F1" in capsys.readouterr().out
+
+    monkeypatch.setattr(size_report, "build_report", lambda app: report({"chart.x.F1": 512}))
+    size_report.main(["--budgets", str(budgets)])
+    assert "All measurements within budget." in capsys.readouterr().out
+
+
+def test_shared_datasets_count_toward_each_panel():
+    spec = {
+        "datasets": {"d": [{"a": 1}]},
+        "concat": [
+            {"data": {"name": "d"}, "mark": "bar"},
+            {"layer": [{"data": {"name": "d"}, "mark": "point"}, {"data": {"values": [{"b": 2}]}, "mark": "rule"}]},
+        ],
+    }
+    sizes = panel_sizes(spec).set_index("panel")
+    shared = len('[{"a":1}]')
+    assert sizes.loc["F1", "data_bytes"] == shared
+    assert sizes.loc["F2", "data_bytes"] == shared + len('[{"b":2}]')
+    assert (sizes["total_bytes"] == sizes["spec_bytes"] + sizes["data_bytes"]).all()
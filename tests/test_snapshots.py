@@ -0,0 +1,85 @@
+import pandas as pd
+import pytest
+
+from snapshots import SnapshotStore, diff_frames, diff_snapshots
+
+
+def export(rows):
+    return pd.DataFrame(rows, columns=["grant_id", "record_sha1", "terminated", "reinstated",
+                                       "org_state", "org_canonical", "nsf_total_budget"])
+
+
+OLD = export([
+    (1, "a", True, False, "TX", "Rice", 100.0),
+    (2, "b", True, False, "TX", "UT", 200.0),
+    (3, "c", False, False, "CA", "UCLA", 300.0),
+    (4, "d", True, True, "CA", "UCLA", 50.0),
+])
+NEW = export([
+    (1, "a", True, False, "TX", "Rice", 100.0),     # unchanged
+    (2, "b2", True, True, "TX", "UT", 200.0),       # reinstated
+    (3, "c", True, False, "CA", "UCLA", 350.0),     # terminated and budget changed
+    (5, "e", True, False, "NY", "NYU", 80.0),       # added; 4 is removed
+])
+
+
+def test_diff_frames_classifies_changes():
+    changes = diff_frames(OLD, NEW)
+    got = sorted(zip(changes["grant_id"], changes["change"]))
+    assert got == [(2, "reinstated"), (3, "budget_changed"), (3, "newly_terminated"),
+                   (4, "removed"), (5, "added")]
+    delta = changes.drop_duplicates("grant_id").set_index("grant_id")["budget_delta"]
+    assert delta.to_dict() == {2: 0, 3: 50, 4: -50, 5: 80}
+
+
+def test_other_changes_and_float_noise():
+    new = OLD.assign(record_sha1=["a", "b", "c", "x"], nsf_total_budget=OLD["nsf_total_budget"] + 0.1)
+    changes = diff_frames(OLD, new)
+    assert changes[["grant_id", "change"]].values.tolist() == [[4, "other"]]
+
+
+def test_ids_of_different_dtypes_still_match():
+    changes = diff_frames(OLD, OLD.astype({"grant_id": str}))
+    assert changes.empty
+
+
+def test_store_and_diff_snapshots(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    old_id = store.save(OLD.assign(abstract="text"), "old-key", "2025-05-01")
+    new_id = store.save(NEW, "new-key", "2025-06-01")
+    assert store.save(NEW, "new-key") == new_id
+    assert store.versions() == [old_id, new_id] and store.previous(new_id) == old_id
+    assert "abstract" not in store.read(old_id).columns
+
+    result = diff_snapshots(old_id, new_id, str(tmp_path))
+    summary = result["summary"].set_index("change")["grants"]
+    assert summary.to_dict() == {"reinstated": 1, "newly_terminated": 1, "budget_changed": 1,
+                                 "added": 1, "removed": 1}
+    by_state = result["by_state"].groupby("org_state")["grants"].sum()
+    assert by_state.to_dict() == {"CA": 3, "NY": 1, "TX": 1}
+    assert result["summary"]["label"].notna().all()
+
+
+@pytest.mark.parametrize("columns", [["grant_id", "record_sha1"], ["grant_id", "terminated"]])
+def test_only_shared_columns_are_tracked(columns):
+    assert diff_frames(OLD, OLD[columns]).empty
+
+
+def test_same_content_is_one_snapshot(tmp_path):
+    store = SnapshotStore(str(tmp_path))
+    first = store.save(OLD, "download-1", "2025-05-01")
+    # downloaded again: a new file fingerprint, same rows in another order
+    assert store.save(OLD.iloc[::-1], "download-2", "2025-05-03") == first
+    second = store.save(NEW, "download-3", "2025-06-01")
+    assert store.previous(second) == first
+
+
+def test_snapshots_added_elsewhere_are_seen(tmp_path):
+    app_store = SnapshotStore(str(tmp_path))
+    current = app_store.save(NEW, "new-key", "2025-06-01")
+    # e.g. `snapshots.py add` in another process
+    older = SnapshotStore(str(tmp_path)).save(OLD, "old-key", "2025-05-01")
+    assert SnapshotStore(str(tmp_path)).versions() == [older, current]
+    assert app_store.save(NEW.iloc[:2], "newer-key", "2025-07-01") in app_store.manifest
+    assert set(app_store.manifest) >= {older, current}
+    assert not [p for p in tmp_path.iterdir() if p.suffix == ".tmp"]
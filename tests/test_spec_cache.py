@@ -0,0 +1,75 @@
+import altair as alt
+import pandas as pd
+
+from spec_cache import SpecCache, concat_specs, enable_artifact_dir, frame_digest, spec_key
+
+
+def frame(values):
+    return pd.DataFrame({"x": values, "y": [str(v) for v in values]})
+
+
+def test_keys_follow_content_and_params():
+    assert frame_digest(frame([1, 2])) == frame_digest(frame([1, 2]))
+    assert frame_digest(frame([1, 2])) != frame_digest(frame([2, 1]))
+    assert frame_digest(frame([1, 2])) != frame_digest(frame([1, 2]).astype({"x": float}))
+    assert spec_key("a", [frame([1])], {"p": 1}) == spec_key("a", [frame([1])], {"p": 1})
+    assert spec_key("a", [frame([1])], {"p": 1}) != spec_key("a", [frame([1])], {"p": 2})
+    assert spec_key("a", [frame([1])]) != spec_key("b", [frame([1])])
+
+
+def test_lru_eviction_and_stats(tmp_path):
+    cache = SpecCache(max_entries=2, directory=str(tmp_path))
+    for key in "abc":
+        cache.put(key, {"k": key})
+    assert cache.get("a") is None  # evicted, file removed too
+    assert not (tmp_path / "a.json").exists()
+    assert cache.get("c") == {"k": "c"}
+    stats = cache.stats()
+    assert (stats["entries"], stats["evictions"], stats["hits"]) == (2, 1, 1)
+
+
+def test_get_or_build_builds_once_and_serializes_charts():
+    cache = SpecCache(directory=None)
+    calls = []
+
+    def build():
+        calls.append(1)
+        return alt.Chart(frame([1, 2])).mark_bar().encode(x="x:Q")
+
+    first = cache.get_or_build("k", build)
+    second = cache.get_or_build("k", build)
+    assert first is second and isinstance(first, dict)
+    assert len(calls) == 1 and cache.stats()["misses"] == 1
+
+
+def test_restarted_cache_reads_disk_entries(tmp_path):
+    SpecCache(directory=str(tmp_path)).put("k", {"mark": "bar"})
+    assert SpecCache(directory=str(tmp_path)).get("k") == {"mark": "bar"}
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_unreadable_entry_is_a_miss(tmp_path):
+    (tmp_path / "k.json").write_text('{"mark": "ba')  # half-written
+    cache = SpecCache(directory=str(tmp_path))
+    assert cache.get("k") is None
+    assert cache.get_or_build("k", lambda: {"mark": "bar"}) == {"mark": "bar"}
+    assert SpecCache(directory=str(tmp_path)).get("k") == {"mark": "bar"}
+
+
+def test_concat_specs_merges_datasets():
+    a = {"$schema": "s", "config": {"x": 1}, "mark": "bar", "datasets": {"d1": [1]}}
+    b = {"mark": "line", "datasets": {"d1": [1], "d2": [2]}}
+    out = concat_specs([a, b], columns=2, config={"c": 1}, title="t")
+    assert out["datasets"] == {"d1": [1], "d2": [2]}
+    assert [p["mark"] for p in out["concat"]] == ["bar", "line"]
+    assert "config" not in out["concat"][0] and out["config"] == {"c": 1}
+    assert a["datasets"] == {"d1": [1]}  # cached specs are not mutated
+
+
+def test_artifact_dir_collects_notebook_data_files(tmp_path):
+    try:
+        enable_artifact_dir(str(tmp_path / "data"))
+        alt.Chart(pd.DataFrame({"x": [1, 2]})).mark_point().encode(x="x").to_dict()
+    finally:
+        alt.data_transformers.enable("default")
+    assert [p.name.startswith("altair-data-") for p in (tmp_path / "data").iterdir()] == [True]
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from stats import (
+    POOL_MIN_WORK, association_statistics, bootstrap, chi_square_test, compute_association_statistics,
+    contingency_table, fisher_exact, logistic_odds_ratios, pool_workers, process_pool,
+    table_effects,
+)
+
+
+@pytest.fixture
+def grants():
+    rng = np.random.default_rng(1)
+    n = 400
+    cruz = rng.random(n) < 0.3
+    flagged = rng.poisson(2 + 2 * cruz)
+    reinstated = rng.random(n) < np.where(cruz, 0.2, 0.4)
+    return pd.DataFrame({"in_cruz_list": cruz, "flagged_words_count": flagged,
+                         "reinstated": reinstated, "terminated": True})
+
+
+def test_two_by_two_tests():
+    table = [[10, 20], [30, 40]]
+    chi2, p = chi_square_test(table)
+    assert chi2 == pytest.approx(4 / 12 + 4 / 18 + 4 / 28 + 4 / 42)
+    assert 0 < p < 1
+    assert fisher_exact([[6, 2], [1, 4]]) == pytest.approx(0.1025641, rel=1e-5)
+    effects = table_effects(table)
+    assert effects["odds_ratio"] == pytest.approx(10 * 40 / (20 * 30))
+    assert effects["risk_difference"] == pytest.approx(10 / 30 - 30 / 70)
+
+
+def test_contingency_table_orientation():
+    exposure = [True, True, False, False, False]
+    outcome = [True, False, True, True, False]
+    assert contingency_table(exposure, outcome).tolist() == [[1, 1], [2, 1]]
+
+
+def test_logistic_with_one_binary_predictor_matches_the_table(grants):
+    (row,) = logistic_odds_ratios(grants.astype(float), "reinstated", ["in_cruz_list"])
+    table = contingency_table(grants["in_cruz_list"], grants["reinstated"])
+    assert row["odds_ratio"] == pytest.approx(table_effects(table)["odds_ratio"], rel=1e-6)
+    assert row["wald_low"] < row["odds_ratio"] < row["wald_high"]
+
+
+def test_bootstrap_is_reproducible_and_brackets_the_estimate():
+    job = {"kind": "table", "table": [[30, 70], [60, 40]]}
+    ci = bootstrap(job, n_resamples=2000, batch_size=500, seed=3)
+    assert ci == bootstrap(job, n_resamples=2000, batch_size=500, seed=3)
+    low, high, dropped = ci["odds_ratio"]
+    assert dropped == 0
+    assert low < table_effects(job["table"])["odds_ratio"] < high
+
+
+def test_pool_matches_in_process():
+    job = {"kind": "table", "table": [[30, 70], [60, 40]]}
+    with process_pool(2) as pool:
+        pooled = bootstrap(job, n_resamples=1000, batch_size=250, seed=5, pool=pool)
+    assert pooled == bootstrap(job, n_resamples=1000, batch_size=250, seed=5)
+
+
+def test_pool_threshold_is_on_resamples_times_patterns(monkeypatch):
+    monkeypatch.setattr("os.cpu_count", lambda: 4)
+    assert pool_workers(20000, 50) == 1
+    assert pool_workers(20000, POOL_MIN_WORK // 20000 - 1) == 1
+    assert pool_workers(20000, POOL_MIN_WORK // 20000) == 4
+    assert pool_workers(20000, 50, workers=3) == 3
+
+
+def test_non_finite_resamples_are_counted():
+    # one grant in the exposed group: most resamples leave that row empty
+    job = {"kind": "groups", "patterns": np.array([[5.0, 1.0], [1.0, 0.0], [2.0, 0.0]]),
+           "counts": np.array([1, 20, 20])}
+    ci = bootstrap(job, n_resamples=1000, batch_size=250, seed=2)
+    assert 0 < ci["cohens_d"][2] < 1000
+
+
+def test_association_rows(grants):
+    table = compute_association_statistics(grants, n_resamples=500)
+    assert set(table["outcome"]) == {"reinstated", "terminated"}
+    assert table.loc[table["outcome"] == "terminated", "measure"].tolist() == ["no variation in outcome"]
+    adjusted = table[table["measure"] == "adjusted_odds_ratio"].set_index("predictor")
+    assert adjusted.loc["in_cruz_list", "estimate"] < 1
+    assert (adjusted["ci_low"] < adjusted["ci_high"]).all()
+    assert (table["ci_dropped"] == 0).all()
+
+
+def test_cache_is_keyed_on_the_outcome_not_only_the_version(grants, tmp_path):
+    first = association_statistics(grants, "v1", str(tmp_path), n_resamples=200)
+    flipped = grants.assign(reinstated=~grants["reinstated"])
+    second = association_statistics(flipped, "v1", str(tmp_path), n_resamples=200)
+    assert len(list(tmp_path.iterdir())) == 2
+    assert not first["estimate"].equals(second["estimate"])
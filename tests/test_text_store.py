@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+from text_store import build_text_store, open_text_store
+
+
+def make_frame(texts):
+    return pd.DataFrame({"abstract": texts, "project_title": [f"t{i}" for i in range(len(texts))]})
+
+
+def test_round_trip_with_missing_and_unicode(tmp_path):
+    frame = make_frame(["héllo wörld", np.nan, "", "plain"])
+    store = build_text_store(frame, ["abstract", "project_title"], str(tmp_path), "k1")
+    assert len(store) == 4
+    assert list(store.iter_texts("abstract")) == ["héllo wörld", "", "", "plain"]
+    assert store.get("project_title", 3) == "t3"
+    assert store.texts("abstract", rows=[3, 0]).tolist() == ["plain", "héllo wörld"]
+    assert store.nbytes("abstract") == len("héllo wörld".encode()) + len("plain")
+
+
+def test_open_rejects_stale_or_incomplete_stores(tmp_path):
+    assert open_text_store(str(tmp_path)) is None
+    build_text_store(make_frame(["a"]), ["abstract"], str(tmp_path), "k1")
+    assert open_text_store(str(tmp_path), source_key="k1") is not None
+    assert open_text_store(str(tmp_path), source_key="k2") is None
+    assert open_text_store(str(tmp_path), fields=["abstract", "project_title"]) is None
+
+
+def test_rebuild_leaves_open_readers_intact(tmp_path):
+    old = build_text_store(make_frame(["old text", "second"]), ["abstract"], str(tmp_path), "k1")
+    assert old.get("abstract", 0) == "old text"  # mapped now
+    new = build_text_store(make_frame(["new", "texts", "here"]), ["abstract"], str(tmp_path), "k2")
+    # the old reader still sees its own, complete generation
+    assert list(old.iter_texts("abstract")) == ["old text", "second"]
+    assert list(new.iter_texts("abstract")) == ["new", "texts", "here"]
+    assert open_text_store(str(tmp_path)).source_key == "k2"
+
+
+def test_only_two_generations_are_kept(tmp_path):
+    for i in range(4):
+        build_text_store(make_frame([f"v{i}"]), ["abstract"], str(tmp_path), f"k{i}")
+    blobs = sorted(p.name for p in tmp_path.glob("*.bin"))
+    assert len(blobs) == 2
+    assert not list(tmp_path.glob("*.tmp"))
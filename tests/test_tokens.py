@@ -0,0 +1,91 @@
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from text_store import build_text_store
+from tokens import TokenCorpus, ensure_token_corpus, tokenize
+
+TEXTS = [
+    "Equity in STEM: at-risk students and diversity, equity & inclusion.",
+    "Climate change; climate-change adaptation. Social justice!",
+    None,
+    "",
+    "diversity equity diversity at risk",
+    "ends with social",
+    "justice starts here",
+]
+PHRASES = ["equity", "diversity", "at-risk", "climate change", "social justice", "stem", "absent"]
+
+
+def regex_count(text, phrase):
+    if not isinstance(text, str):
+        return 0
+    return len(re.findall(r"\b" + re.escape(phrase) + r"\b", text.lower()))
+
+
+def test_count_matrix_matches_regex_baseline():
+    corpus = TokenCorpus.from_texts(TEXTS)
+    counts = corpus.count_matrix(PHRASES)
+    expected = np.array([[regex_count(t, p) for p in PHRASES] for t in TEXTS])
+    np.testing.assert_array_equal(counts, expected)
+
+
+def test_phrases_do_not_cross_documents():
+    corpus = TokenCorpus.from_texts(TEXTS)
+    # "social" ends one document and "justice" starts the next
+    assert corpus.phrase_counts("social justice").tolist() == [0, 1, 0, 0, 0, 0, 0]
+
+
+def test_phrases_need_their_own_separators_and_do_not_overlap():
+    texts = ["at - risk and at-risk", "climate\nchange, climate change", "equity equity equity", "a b a b a"]
+    phrases = ["at-risk", "climate change", "equity equity", "a b a"]
+    counts = TokenCorpus.from_texts(texts).count_matrix(phrases)
+    expected = np.array([[regex_count(t, p) for p in phrases] for t in texts])
+    np.testing.assert_array_equal(counts, expected)
+    assert counts[2, 2] == 1 and counts[3, 3] == 1
+
+
+def test_duplicate_phrases_keep_their_columns():
+    corpus = TokenCorpus.from_texts(TEXTS)
+    counts = corpus.count_matrix(["equity", "diversity", "equity"])
+    np.testing.assert_array_equal(counts[:, 0], counts[:, 2])
+
+
+def test_subset_keeps_vocabulary_and_order():
+    corpus = TokenCorpus.from_texts(TEXTS)
+    sub = corpus.subset([4, 0])
+    assert len(sub) == 2
+    assert [sub.vocab[i] for i in sub.doc_tokens(0)] == tokenize(TEXTS[4])
+    np.testing.assert_array_equal(sub.count_matrix(PHRASES), corpus.count_matrix(PHRASES)[[4, 0]])
+
+
+def test_ngram_counts_stay_inside_documents():
+    corpus = TokenCorpus.from_texts(["a b", "b a"])
+    grams = {tuple(corpus.vocab[t] for t in g): c for g, c in corpus.ngram_counts(2).items()}
+    assert grams == {("a", "b"): 1, ("b", "a"): 1}
+
+
+def test_cached_corpus_is_reused_until_the_source_changes(tmp_path):
+    frame = pd.DataFrame({"abstract": TEXTS})
+    store = build_text_store(frame, ["abstract"], str(tmp_path / "store"), "k1")
+    first = ensure_token_corpus(store, "abstract", str(tmp_path / "tokens"))
+    again = ensure_token_corpus(store, "abstract", str(tmp_path / "tokens"))
+    assert isinstance(again.ids, np.memmap)  # loaded from disk
+    np.testing.assert_array_equal(first.count_matrix(PHRASES), again.count_matrix(PHRASES))
+    changed = build_text_store(pd.DataFrame({"abstract": ["equity"]}), ["abstract"], str(tmp_path / "store"), "k2")
+    assert len(ensure_token_corpus(changed, "abstract", str(tmp_path / "tokens"))) == 1
+
+
+def test_saving_a_new_generation_keeps_the_previous_files(tmp_path):
+    cache = str(tmp_path / "corpus")
+    old = TokenCorpus.from_texts(TEXTS)
+    old.save(cache, "a")
+    mapped = TokenCorpus.load(cache)
+    TokenCorpus.from_texts(["new text"]).save(cache, "b")
+    # the corpus mapped before the second save still reads its own arrays
+    np.testing.assert_array_equal(mapped.count_matrix(PHRASES), old.count_matrix(PHRASES))
+    assert len(TokenCorpus.load(cache)) == 1
+    TokenCorpus.from_texts(["newer"]).save(cache, "c")
+    assert len([n for n in os.listdir(cache) if n.startswith("ids.")]) == 2
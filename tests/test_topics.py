@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from tokens import TokenCorpus
+from topics import MODEL_FILE, TopicModel, compute_topics
+
+OCEAN = "ocean coral reef marine salinity currents plankton fisheries tides coastal".split()
+BRAIN = "neurons cortex synapse cognition memory neural plasticity dopamine brain imaging".split()
+
+
+@pytest.fixture
+def corpus():
+    rng = np.random.default_rng(0)
+    texts = [" ".join(rng.choice(OCEAN if i % 2 else BRAIN, 30)) for i in range(120)]
+    return TokenCorpus.from_texts(texts)
+
+
+def fitted(corpus, docs=range(100)):
+    model = TopicModel(num_topics=2)
+    model.update(corpus, np.array(docs), [f"g{i}" for i in docs])
+    return model
+
+
+def test_topics_separate_the_vocabularies(corpus):
+    model = fitted(corpus)
+    topics = model.assign(corpus, np.arange(120))
+    assert len(set(topics[::2])) == 1 and len(set(topics[1::2])) == 1
+    assert topics[0] != topics[1]
+    terms = {frozenset(t) for t in model.top_terms(5)}
+    assert all(t <= set(OCEAN) or t <= set(BRAIN) for t in terms)
+
+
+def test_update_only_learns_new_keys(corpus):
+    model = fitted(corpus)
+    df, n_docs = model.df.copy(), model.n_docs
+    assert model.update(corpus, np.arange(100), [f"g{i}" for i in range(100)]) == 0
+    assert model.update(corpus, np.arange(90, 120), [f"g{i}" for i in range(90, 120)]) == 20
+    assert model.n_docs == n_docs + 20 and model.df.sum() > df.sum()
+
+
+def test_save_load_round_trip(corpus, tmp_path):
+    model = fitted(corpus)
+    model.save(str(tmp_path))
+    assert [p.name for p in tmp_path.iterdir()] == [MODEL_FILE]
+    loaded = TopicModel.load(str(tmp_path), num_topics=2)
+    assert loaded.terms == model.terms and loaded.seen == model.seen
+    np.testing.assert_array_equal(loaded.centroids, model.centroids)
+    np.testing.assert_array_equal(loaded.assign(corpus, np.arange(120)), model.assign(corpus, np.arange(120)))
+    assert TopicModel.load(str(tmp_path), num_topics=3).centroids is None
+
+
+def test_model_without_metadata_refits(tmp_path):
+    np.savez(tmp_path / MODEL_FILE, df=np.zeros(3), counts=np.zeros(2), centroids=np.zeros((2, 3)))
+    assert TopicModel.load(str(tmp_path), num_topics=2).centroids is None
+
+
+def test_compute_topics(corpus, tmp_path):
+    grants = pd.DataFrame({
+        "grant_id": range(120), "text_row": range(120), "terminated": [i < 100 for i in range(120)],
+        "nsf_total_budget": 1.0,
+    })
+    topic, summary = compute_topics(grants, corpus, str(tmp_path), num_topics=2)
+    assert (topic[100:] == -1).all() and (topic[:100] >= 0).all()
+    assert summary["cancelled_grants"].sum() == 100
+    assert (tmp_path / MODEL_FILE).exists()
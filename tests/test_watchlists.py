@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from watchlists import Watchlists, grant_keys, read_watchlist
+
+IDS = [101, 102, 103, 104, 105, 106]
+
+
+@pytest.fixture
+def lists():
+    watchlists = Watchlists(IDS)
+    watchlists.register("a", [101, 102, 103])
+    watchlists.register("b", ["103", "104"])
+    return watchlists
+
+
+def test_grant_keys_match_across_dtypes():
+    assert grant_keys(pd.Series([101.0, np.nan]))[0] == "101"
+    assert grant_keys([" 101", 102]).tolist() == ["101", "102"]
+    assert Watchlists(pd.Series(IDS, dtype=float)).register("x", ["101", 106]) == 2
+
+
+def test_bit_operations(lists):
+    assert lists.sizes().to_dict() == {"a": 3, "b": 2}
+    assert lists.mask(lists.combine(["a", "b"], "any")).tolist() == [True] * 4 + [False] * 2
+    assert lists.mask(lists.combine(["a", "b"], "all")).tolist() == [False, False, True, False, False, False]
+    assert lists.count(lists.invert(lists.bits["a"])) == 3
+    assert lists.count(lists.combine([])) == 0
+    assert lists.overlap().values.tolist() == [[3, 1], [1, 2]]
+
+
+def test_breakdown_and_rates(lists):
+    reinstated = np.array([True, False, True, True, False, False])
+    table = lists.breakdown(reinstated, ["a"]).set_index(["member", "status_label"])
+    assert table["count"].to_dict() == {
+        ("No", "Terminated"): 2, ("No", "Reinstated"): 1,
+        ("Yes", "Terminated"): 1, ("Yes", "Reinstated"): 2,
+    }
+    assert table.loc[("Yes", "Reinstated"), "percentage"] == pytest.approx(66.7)
+    rates = lists.outcome_rates(reinstated).set_index("list")
+    assert rates["with_outcome"].to_dict() == {"a": 2, "b": 2, "Any watchlist": 3}
+    assert rates.loc["b", "rate"] == 1
+
+
+def test_register_rejects_misaligned_masks(lists):
+    with pytest.raises(ValueError):
+        lists.register_mask("c", [True, False])
+
+
+def test_sync_registers_new_and_changed_files_and_records_errors(lists, tmp_path):
+    (tmp_path / "house.csv").write_text("grant_number;in_house_list\n105;True\n106;False\n")
+    (tmp_path / "broken.csv").write_text("award\n105\n")
+    assert lists.sync(str(tmp_path)) == ["house"]
+    assert lists.mask("house").tolist() == [False] * 4 + [True, False]
+    assert "broken" in lists.errors
+    assert lists.sync(str(tmp_path)) == []
+    (tmp_path / "broken.csv").write_text("grant_id\n101\n")
+    assert lists.sync(str(tmp_path)) == ["broken"] and not lists.errors
+
+
+def test_copy_leaves_the_original_untouched(lists, tmp_path):
+    (tmp_path / "senate.csv").write_text("grant_id\n106\n")
+    copy = lists.copy()
+    copy.sync(str(tmp_path))
+    copy.register("a", [106])
+    assert copy.names == ["a", "b", "senate"] and lists.names == ["a", "b"]
+    assert lists.count(lists.bits["a"]) == 3
+
+
+def test_read_watchlist_separator_from_header(tmp_path):
+    path = tmp_path / "tabs.csv"
+    path.write_text("grant_id\tnote\n101\tx, y\n")
+    assert read_watchlist(path).tolist() == [101]
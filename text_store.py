@@ -0,0 +1,155 @@
+"""Memory-mapped store for the long text fields of the NSF export.
+
+`abstract` (and to a lesser extent `project_title`) dominate the memory of the
+cleaned dataset, but no chart displays them. Each text field is written once
+as a single UTF-8 blob plus an int64 offsets array; the tabular frame only
+keeps a `text_row` column pointing into the store. The blobs are opened with
+`np.memmap`, so several processes reading the same store share the OS page
+cache instead of holding their own copies.
+
+Missing values are stored as empty strings (every consumer in the project
+already treats NaN text as "").
+
+A rebuild never touches files another process may have mapped: each build
+writes a new generation of files (`<field>.<generation>.bin`), then swaps the
+manifest that names it into place with `os.replace`. Only generations older
+than the previous one are deleted.
+"""
+import glob
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+TEXT_FIELDS = ["abstract", "project_title"]
+DEFAULT_STORE_DIR = "data/cache/text_store"
+MANIFEST = "manifest.json"
+
+
+def source_fingerprint(path):
+    """Cheap identity of a source file (size + modification time)."""
+    stat = os.stat(path)
+    return f"{stat.st_size}-{stat.st_mtime_ns}"
+
+
+class TextStore:
+    """Read-only, lazily opened view over a text store directory."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, MANIFEST)) as f:
+            self.manifest = json.load(f)
+        self._blobs = {}
+        self._offsets = {}
+
+    def __len__(self):
+        return self.manifest["rows"]
+
+    @property
+    def fields(self):
+        return list(self.manifest["fields"])
+
+    @property
+    def source_key(self):
+        return self.manifest["source_key"]
+
+    def _file(self, field, suffix):
+        return os.path.join(self.path, f"{field}.{self.manifest['generation']}.{suffix}")
+
+    def _open(self, field):
+        if field not in self._offsets:
+            if field not in self.manifest["fields"]:
+                raise KeyError(f"Text field not in store: {field}")
+            offsets = np.load(self._file(field, "offsets.npy"), mmap_mode="r")
+            blob_path = self._file(field, "bin")
+            # np.memmap refuses zero-length files
+            if os.path.getsize(blob_path) == 0:
+                blob = np.zeros(0, dtype=np.uint8)
+            else:
+                blob = np.memmap(blob_path, dtype=np.uint8, mode="r")
+            self._offsets[field] = offsets
+            self._blobs[field] = blob
+        return self._blobs[field], self._offsets[field]
+
+    def get(self, field, row):
+        """Decode a single text value."""
+        blob, offsets = self._open(field)
+        return bytes(blob[offsets[row]:offsets[row + 1]]).decode("utf-8")
+
+    def iter_texts(self, field, rows=None):
+        """Yield the decoded texts of `field` for `rows` (all rows by default)."""
+        blob, offsets = self._open(field)
+        if rows is None:
+            rows = range(len(offsets) - 1)
+        for row in rows:
+            yield bytes(blob[offsets[row]:offsets[row + 1]]).decode("utf-8")
+
+    def texts(self, field, rows=None, index=None):
+        """Materialize `field` as a Series. Only text-analysis stages should call this."""
+        return pd.Series(list(self.iter_texts(field, rows)), index=index, dtype=object)
+
+    def nbytes(self, field):
+        """Size of the blob backing `field`, in bytes."""
+        blob, _ = self._open(field)
+        return int(blob.shape[0])
+
+
+def _replace_with(path, write):
+    """Write `path` through a temporary file, so it appears complete or not at all."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+def _generation(path):
+    """Generation named by the store's manifest, or None."""
+    try:
+        with open(os.path.join(path, MANIFEST)) as f:
+            return json.load(f).get("generation")
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def build_text_store(frame, fields, path=DEFAULT_STORE_DIR, source_key=""):
+    """Write `frame[fields]` to `path` (row i of the store is row i of `frame`)."""
+    os.makedirs(path, exist_ok=True)
+    previous = _generation(path)
+    generation = f"{time.time_ns():x}"
+    for field in fields:
+        encoded = [
+            b"" if pd.isna(v) else str(v).encode("utf-8") for v in frame[field]
+        ]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        _replace_with(os.path.join(path, f"{field}.{generation}.bin"), lambda f: f.write(b"".join(encoded)))
+        _replace_with(os.path.join(path, f"{field}.{generation}.offsets.npy"), lambda f: np.save(f, offsets))
+
+    # manifest last: a half-written store is never considered valid
+    manifest = {"rows": len(frame), "fields": list(fields), "source_key": source_key, "generation": generation}
+    _replace_with(os.path.join(path, MANIFEST), lambda f: f.write(json.dumps(manifest).encode()))
+
+    # readers of the previous generation keep their files; older ones go
+    keep = {generation, previous}
+    for name in glob.glob(os.path.join(path, "*.bin")) + glob.glob(os.path.join(path, "*.offsets.npy")):
+        parts = os.path.basename(name).split(".")
+        if len(parts) < 3 or parts[1] not in keep:
+            os.remove(name)
+    return TextStore(path)
+
+
+def open_text_store(path=DEFAULT_STORE_DIR, source_key=None, fields=None):
+    """Open an existing store, or return None if it is missing or stale."""
+    if not os.path.exists(os.path.join(path, MANIFEST)):
+        return None
+    store = TextStore(path)
+    if "generation" not in store.manifest:
+        # written before generations existed: rebuild
+        return None
+    if source_key is not None and store.source_key != source_key:
+        return None
+    if fields is not None and not set(fields) <= set(store.fields):
+        return None
+    return store
@@ -0,0 +1,269 @@
+"""Tokenize-once corpus of integer token IDs.
+
+Every text analysis used to lowercase and regex-scan the raw strings again.
+Here each text field is tokenized a single time into a vocabulary plus a flat
+int32 array of token IDs with per-document offsets, cached on disk next to the
+text store. Word-boundary matching of flagged words/phrases then becomes
+integer comparisons on NumPy arrays.
+
+Tokens are runs of word characters (`\\w+`) or single punctuation characters.
+Each token also records the separator before it (the whitespace between it
+and the previous token, interned as a small id), so a multi-token phrase only
+matches where the text spells it the same way: "at-risk" does not match
+"at - risk", nor "climate change" "climate\\nchange". Matches of one phrase
+are counted without overlaps, left to right, so the counts equal
+`len(re.findall(r"\\b<phrase>\\b", text.lower()))` as before.
+
+The cached arrays are written as a new generation of files and the manifest
+naming it is swapped in last with `os.replace` (as in text_store.py), so a
+process that has the previous files memory-mapped keeps reading them.
+"""
+import glob
+import json
+import os
+import re
+import time
+
+import numpy as np
+
+DEFAULT_CORPUS_DIR = "data/cache/tokens"
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+MANIFEST = "manifest.json"
+# bumped when the cached layout changes, so older caches are rebuilt
+CORPUS_FORMAT = 2
+ARRAYS = ["ids", "offsets", "gaps"]
+
+
+def tokenize(text):
+    """Lowercase and split a string into tokens."""
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+def tokenize_with_gaps(text):
+    """Tokens of a string, each with the text between it and the previous token."""
+    text = str(text).lower()
+    tokens, gaps, end = [], [], 0
+    for m in TOKEN_PATTERN.finditer(text):
+        tokens.append(m.group())
+        gaps.append(text[end:m.start()])
+        end = m.end()
+    return tokens, gaps
+
+
+def _replace_with(path, write):
+    """Write `path` through a temporary file, so it appears complete or not at all."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+class TokenCorpus:
+    """Documents stored as token-ID arrays over a shared vocabulary."""
+
+    def __init__(self, vocab, ids, offsets, separators=("",), gaps=None):
+        self.vocab = list(vocab)
+        self.index = {tok: i for i, tok in enumerate(self.vocab)}
+        self.ids = ids
+        self.offsets = offsets
+        # separator id before every token (into `separators`)
+        self.separators = list(separators)
+        self.separator_index = {sep: i for i, sep in enumerate(self.separators)}
+        self.gaps = np.zeros(len(ids), dtype=np.int32) if gaps is None else gaps
+        self._doc_of_token = None
+
+    @classmethod
+    def from_texts(cls, texts):
+        """Tokenize an iterable of strings (NaN/None count as empty documents)."""
+        index = {}
+        separators = {"": 0}
+        ids, gaps = [], []
+        offsets = [0]
+        for text in texts:
+            if isinstance(text, str):
+                tokens, seps = tokenize_with_gaps(text)
+                ids.extend(index.setdefault(tok, len(index)) for tok in tokens)
+                gaps.extend(separators.setdefault(sep, len(separators)) for sep in seps)
+            offsets.append(len(ids))
+        return cls(
+            list(index),
+            np.asarray(ids, dtype=np.int32),
+            np.asarray(offsets, dtype=np.int64),
+            list(separators),
+            np.asarray(gaps, dtype=np.int32),
+        )
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def doc_of_token(self):
+        """Document number of every token position."""
+        if self._doc_of_token is None:
+            self._doc_of_token = np.repeat(
+                np.arange(len(self), dtype=np.int32), np.diff(self.offsets)
+            )
+        return self._doc_of_token
+
+    def doc_lengths(self):
+        return np.diff(self.offsets)
+
+    def doc_tokens(self, doc):
+        return self.ids[self.offsets[doc]:self.offsets[doc + 1]]
+
+    def subset(self, docs):
+        """Corpus of just `docs` (in that order), sharing this vocabulary."""
+        docs = np.asarray(docs, dtype=np.int64)
+        lengths = self.offsets[docs + 1] - self.offsets[docs]
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        # position of every kept token in the full ids array
+        positions = np.repeat(self.offsets[docs] - offsets[:-1], lengths) + np.arange(offsets[-1])
+        corpus = TokenCorpus.__new__(TokenCorpus)
+        corpus.vocab, corpus.index = self.vocab, self.index
+        corpus.separators, corpus.separator_index = self.separators, self.separator_index
+        corpus.ids, corpus.offsets = np.asarray(self.ids)[positions], offsets
+        corpus.gaps = np.asarray(self.gaps)[positions]
+        corpus._doc_of_token = None
+        return corpus
+
+    def encode(self, phrase):
+        """Token IDs of `phrase`, or None if any of its tokens never occurs."""
+        try:
+            return np.array([self.index[t] for t in tokenize(phrase)], dtype=np.int32)
+        except KeyError:
+            return None
+
+    def _encode_gaps(self, phrase):
+        """Separator ids between the tokens of `phrase`, or None if one never occurs."""
+        try:
+            return np.array([self.separator_index[g] for g in tokenize_with_gaps(phrase)[1][1:]], dtype=np.int32)
+        except KeyError:
+            return None
+
+    def phrase_starts(self, phrase):
+        """Token positions where `phrase` starts (never crossing a document end).
+
+        Matches need the phrase's own separators between its tokens and do not
+        overlap (the leftmost one wins, as with `re.findall`).
+        """
+        pattern = self.encode(phrase)
+        k = 0 if pattern is None else len(pattern)
+        n = len(self.ids)
+        gaps = self._encode_gaps(phrase) if k > 1 else None
+        if k == 0 or n < k or (k > 1 and gaps is None):
+            return np.zeros(0, dtype=np.int64)
+        mask = self.ids[:n - k + 1] == pattern[0]
+        for j in range(1, k):
+            mask &= self.ids[j:n - k + 1 + j] == pattern[j]
+            mask &= self.gaps[j:n - k + 1 + j] == gaps[j - 1]
+        starts = np.flatnonzero(mask)
+        if k > 1:
+            ends = self.offsets[self.doc_of_token[starts] + 1]
+            starts = starts[starts + k <= ends]
+            if np.any(np.diff(starts) < k):
+                # self-overlapping phrase ("a b a" in "a b a b a"): keep non-overlapping ones
+                kept, next_free = [], -1
+                for start in starts:
+                    if start >= next_free:
+                        kept.append(start)
+                        next_free = start + k
+                starts = np.asarray(kept, dtype=starts.dtype)
+        return starts
+
+    def phrase_counts(self, phrase):
+        """Occurrences of `phrase` in each document."""
+        starts = self.phrase_starts(phrase)
+        return np.bincount(self.doc_of_token[starts], minlength=len(self))
+
+    def count_matrix(self, phrases):
+        """(documents x phrases) matrix of occurrence counts."""
+        unique = list(dict.fromkeys(phrases))
+        if len(unique) < len(phrases):
+            counts = self.count_matrix(unique)
+            return counts[:, [unique.index(p) for p in phrases]]
+        counts = np.zeros((len(self), len(phrases)), dtype=np.int32)
+        # single-token phrases: one pass over the corpus via a term -> column lookup
+        lookup = np.full(len(self.vocab), -1, dtype=np.int64)
+        multi = []
+        for col, phrase in enumerate(phrases):
+            pattern = self.encode(phrase)
+            if pattern is None or len(pattern) == 0:
+                continue
+            if len(pattern) == 1:
+                lookup[pattern[0]] = col
+            else:
+                multi.append(col)
+        if len(self.ids):
+            cols = lookup[self.ids]
+            hit = cols >= 0
+            flat = self.doc_of_token[hit].astype(np.int64) * len(phrases) + cols[hit]
+            counts += np.bincount(flat, minlength=counts.size).reshape(counts.shape).astype(np.int32)
+        for col in multi:
+            counts[:, col] = self.phrase_counts(phrases[col])
+        return counts
+
+    def term_frequencies(self):
+        """Total occurrences of every vocabulary entry."""
+        return np.bincount(self.ids, minlength=len(self.vocab))
+
+    def ngram_counts(self, n):
+        """Counts of every n-gram (as tuples of token IDs) inside documents."""
+        if len(self.ids) < n:
+            return {}
+        starts = np.arange(len(self.ids) - n + 1)
+        starts = starts[starts + n <= self.offsets[self.doc_of_token[starts] + 1]]
+        grams = np.stack([self.ids[starts + j] for j in range(n)], axis=1)
+        uniq, counts = np.unique(grams, axis=0, return_counts=True)
+        return {tuple(int(t) for t in g): int(c) for g, c in zip(uniq, counts)}
+
+    def save(self, path, source_key=""):
+        """Write a new generation of the corpus files, then the manifest naming it."""
+        os.makedirs(path, exist_ok=True)
+        previous = _read_manifest(path).get("generation")
+        generation = f"{time.time_ns():x}"
+        for name in ARRAYS:
+            array = np.asarray(getattr(self, name))
+            _replace_with(os.path.join(path, f"{name}.{generation}.npy"), lambda f: np.save(f, array))
+        vocab = json.dumps({"vocab": self.vocab, "separators": self.separators}).encode()
+        _replace_with(os.path.join(path, f"vocab.{generation}.json"), lambda f: f.write(vocab))
+        manifest = {"docs": len(self), "source_key": source_key, "format": CORPUS_FORMAT, "generation": generation}
+        _replace_with(os.path.join(path, MANIFEST), lambda f: f.write(json.dumps(manifest).encode()))
+        # readers of the previous generation keep their files; older ones go
+        keep = {generation, previous}
+        for name in glob.glob(os.path.join(path, "*.npy")) + glob.glob(os.path.join(path, "vocab*.json")):
+            parts = os.path.basename(name).split(".")
+            if len(parts) != 3 or parts[1] not in keep:
+                os.remove(name)
+
+    @classmethod
+    def load(cls, path):
+        generation = _read_manifest(path)["generation"]
+        with open(os.path.join(path, f"vocab.{generation}.json")) as f:
+            words = json.load(f)
+        ids, offsets, gaps = (
+            np.load(os.path.join(path, f"{name}.{generation}.npy"), mmap_mode="r") for name in ARRAYS
+        )
+        return cls(words["vocab"], ids, offsets, words["separators"], gaps)
+
+
+def _read_manifest(path):
+    manifest_path = os.path.join(path, MANIFEST)
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+def ensure_token_corpus(text_store, field, path=DEFAULT_CORPUS_DIR):
+    """Load the cached corpus for a text-store field, tokenizing it if stale."""
+    field_dir = os.path.join(path, field)
+    manifest = _read_manifest(field_dir)
+    if (
+        manifest.get("format") == CORPUS_FORMAT
+        and manifest["source_key"] == text_store.source_key
+        and manifest["docs"] == len(text_store)
+    ):
+        return TokenCorpus.load(field_dir)
+    corpus = TokenCorpus.from_texts(text_store.iter_texts(field))
+    corpus.save(field_dir, text_store.source_key)
+    return corpus
@@ -0,0 +1,274 @@
+"""Research topics of the cancelled grants: TF-IDF + minibatch spherical k-means.
+
+Abstracts are turned into sparse TF-IDF rows straight from the token corpus
+(sublinear term frequency, stop words and short/numeric tokens dropped, rows
+L2-normalized) and clustered with minibatch spherical k-means (cosine
+similarity to unit-length centroids). Everything is NumPy, CPU-only; sparse
+rows are plain (row, column, value) arrays.
+
+The model is persisted under data/cache/topics and updated incrementally:
+`TopicModel.update(corpus, docs, keys)` only learns from documents whose keys
+(grant ids) it has not seen, extending the vocabulary, the document
+frequencies behind the IDF weights and the centroids. Documents already seen
+keep shaping the centroids through the per-topic counts, and every document is
+re-assigned to its nearest centroid on each run (one sparse-dense product).
+Deleting the directory refits from scratch.
+
+Collaborative copies of one abstract (see dedup.py) are fed once, so a
+project split over many institutions does not pull a topic towards itself.
+"""
+import json
+import os
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_TOPIC_DIR = "data/cache/topics"
+MODEL_FILE = "model.npz"
+NUM_TOPICS = 12
+BATCH_SIZE = 256
+# passes over the documents of the first fit; later updates make one pass
+FIRST_FIT_EPOCHS = 5
+TOP_TERMS = 8
+STOP_WORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being
+below between both but by can could did do does doing down during each few for from further had has
+have having he her here hers herself him himself his how i if in into is it its itself just me more
+most my myself no nor not now of off on once only or other our ours ourselves out over own same she
+should so some such than that the their theirs them themselves then there these they this those
+through to too under until up very was we were what when where which while who whom why will with
+would you your yours yourself yourselves
+project research proposal award program support students student study studies using used use new
+work also nsf broader impacts intellectual merit reflects statutory mission deemed worthy evaluation
+foundation criteria review
+""".split())
+TERM_PATTERN = re.compile(r"[a-z][a-z\-]{2,}")
+
+
+class TopicModel:
+    """Vocabulary, document frequencies and centroids of the topic clustering."""
+
+    def __init__(self, num_topics=NUM_TOPICS, seed=0):
+        self.num_topics = num_topics
+        self.seed = seed
+        self.terms = []
+        self.term_index = {}
+        self.df = np.zeros(0, dtype=np.int64)
+        self.n_docs = 0
+        self.centroids = None
+        self.counts = np.zeros(num_topics, dtype=np.int64)
+        self.seen = set()
+
+    # === Features ===
+
+    def _columns(self, corpus, grow):
+        """Model column of every corpus vocabulary entry (-1 = not a feature)."""
+        columns = np.full(len(corpus.vocab), -1, dtype=np.int64)
+        for token_id, token in enumerate(corpus.vocab):
+            if token in STOP_WORDS or not TERM_PATTERN.fullmatch(token):
+                continue
+            col = self.term_index.get(token)
+            if col is None and grow:
+                col = self.term_index[token] = len(self.terms)
+                self.terms.append(token)
+            if col is not None:
+                columns[token_id] = col
+        if grow and len(self.terms) > len(self.df):
+            self.df = np.concatenate([self.df, np.zeros(len(self.terms) - len(self.df), dtype=np.int64)])
+            if self.centroids is not None:
+                pad = np.zeros((self.num_topics, len(self.terms) - self.centroids.shape[1]))
+                self.centroids = np.hstack([self.centroids, pad])
+        return columns
+
+    def _term_counts(self, corpus, docs, columns):
+        """Sparse (row, column, count) term counts of `docs` (rows numbered 0..len(docs)-1)."""
+        sub = corpus.subset(docs)
+        cols = columns[np.asarray(sub.ids)]
+        keep = cols >= 0
+        flat = sub.doc_of_token[keep].astype(np.int64) * len(self.terms) + cols[keep]
+        cells, counts = np.unique(flat, return_counts=True)
+        return cells // len(self.terms), cells % len(self.terms), counts
+
+    def tfidf(self, rows, cols, counts, n_rows):
+        """L2-normalized sublinear TF-IDF values for sparse term counts."""
+        idf = np.log((1 + self.n_docs) / (1 + self.df[cols])) + 1
+        values = (1 + np.log(counts)) * idf
+        norms = np.sqrt(np.bincount(rows, weights=values ** 2, minlength=n_rows))
+        return values / np.where(norms > 0, norms, 1)[rows]
+
+    def _similarities(self, rows, cols, values, n_rows):
+        """(n_rows x topics) cosine similarities to the centroids."""
+        sims = np.zeros((n_rows, self.num_topics))
+        for t in range(self.num_topics):
+            sims[:, t] = np.bincount(rows, weights=values * self.centroids[t, cols], minlength=n_rows)
+        return sims
+
+    # === Fitting ===
+
+    def update(self, corpus, docs, keys):
+        """Learn from the documents among `docs` whose `keys` are new; returns how many."""
+        docs, keys = np.asarray(docs), [str(k) for k in keys]
+        new = np.array([k not in self.seen for k in keys], dtype=bool)
+        if not new.any():
+            return 0
+        columns = self._columns(corpus, grow=True)
+        rows, cols, counts = self._term_counts(corpus, docs[new], columns)
+        self.df += np.bincount(cols, minlength=len(self.terms))
+        self.n_docs += int(new.sum())
+        values = self.tfidf(rows, cols, counts, int(new.sum()))
+
+        rng = np.random.default_rng(self.seed + self.n_docs)
+        n = int(new.sum())
+        if self.centroids is None:
+            self.centroids = self._seed_centroids(rows, cols, values, n, rng)
+            epochs = FIRST_FIT_EPOCHS
+        else:
+            epochs = 1
+        # the sparse rows come out of np.unique sorted by row
+        row_starts = np.searchsorted(rows, np.arange(n + 1))
+        for _ in range(epochs):
+            for batch in np.array_split(rng.permutation(n), max(1, n // BATCH_SIZE)):
+                self._minibatch_step(batch, cols, values, row_starts)
+        self.seen.update(k for k, is_new in zip(keys, new) if is_new)
+        return n
+
+    def _seed_centroids(self, rows, cols, values, n, rng, sample=2000):
+        """k-means++ seeding on a sample: each next start document is drawn with
+        probability proportional to its squared cosine distance from the chosen ones."""
+        centroids = np.zeros((self.num_topics, len(self.terms)))
+        pool = np.sort(rng.choice(n, size=min(n, sample), replace=False))
+        in_pool = np.isin(rows, pool)
+        p_rows = np.searchsorted(pool, rows[in_pool])
+        p_cols, p_values = cols[in_pool], values[in_pool]
+        best = np.zeros(len(pool))
+        for t in range(min(self.num_topics, len(pool))):
+            weights = np.clip(1 - best, 0, None) ** 2
+            pick = rng.choice(len(pool), p=weights / weights.sum()) if weights.sum() > 0 else rng.integers(len(pool))
+            picked = p_rows == pick
+            centroids[t, p_cols[picked]] = p_values[picked]
+            sims = np.bincount(p_rows, weights=p_values * centroids[t, p_cols], minlength=len(pool))
+            best = np.maximum(best, sims)
+        return centroids
+
+    def _minibatch_step(self, batch, cols, values, row_starts):
+        # gather the batch's sparse rows, renumbered 0..len(batch)-1
+        lengths = row_starts[batch + 1] - row_starts[batch]
+        idx = np.repeat(row_starts[batch] - np.r_[0, np.cumsum(lengths)[:-1]], lengths) + np.arange(lengths.sum())
+        b_rows = np.repeat(np.arange(len(batch)), lengths)
+        b_cols, b_values = cols[idx], values[idx]
+        nearest = self._similarities(b_rows, b_cols, b_values, len(batch)).argmax(axis=1)
+        for t in np.unique(nearest):
+            members = nearest[b_rows] == t
+            n_t = int((nearest == t).sum())
+            self.counts[t] += n_t
+            # per-topic learning rate 1/count (Sculley's minibatch k-means)
+            rate = n_t / self.counts[t]
+            total = np.bincount(b_cols[members], weights=b_values[members], minlength=len(self.terms))
+            centroid = (1 - rate) * self.centroids[t] + rate * total / n_t
+            norm = np.linalg.norm(centroid)
+            self.centroids[t] = centroid / norm if norm > 0 else centroid
+
+    def assign(self, corpus, docs):
+        """Nearest topic of each of `docs` (-1 for documents with no feature terms)."""
+        docs = np.asarray(docs)
+        if self.centroids is None or not len(docs):
+            return np.full(len(docs), -1)
+        columns = self._columns(corpus, grow=False)
+        rows, cols, counts = self._term_counts(corpus, docs, columns)
+        values = self.tfidf(rows, cols, counts, len(docs))
+        sims = self._similarities(rows, cols, values, len(docs))
+        topics = sims.argmax(axis=1)
+        topics[np.bincount(rows, minlength=len(docs)) == 0] = -1
+        return topics
+
+    def top_terms(self, k=TOP_TERMS):
+        """The `k` most distinctive terms of every topic (weight above the topics' average)."""
+        if self.centroids is None:
+            return [[] for _ in range(self.num_topics)]
+        contrast = self.centroids - self.centroids.mean(axis=0)
+        order = np.argsort(-contrast, axis=1)[:, :k]
+        return [[self.terms[i] for i in row if contrast[t, i] > 0] for t, row in enumerate(order)]
+
+    # === Persistence ===
+
+    def save(self, path=DEFAULT_TOPIC_DIR):
+        """Write the arrays and the metadata (terms, seen keys) as one file, atomically.
+
+        They must stay in step (`terms` indexes `df` and the centroid columns),
+        so they share model.npz, written under a temporary name and moved into
+        place: a reader sees the old model or the new one, never a mix.
+        """
+        os.makedirs(path, exist_ok=True)
+        meta = json.dumps({
+            "num_topics": self.num_topics, "seed": self.seed, "n_docs": self.n_docs,
+            "terms": self.terms, "seen": sorted(self.seen),
+        })
+        target = os.path.join(path, MODEL_FILE)
+        tmp = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(
+                f, meta=np.array(meta), df=self.df, counts=self.counts,
+                centroids=self.centroids if self.centroids is not None else np.zeros((0, 0)),
+            )
+        os.replace(tmp, target)
+
+    @classmethod
+    def load(cls, path=DEFAULT_TOPIC_DIR, num_topics=NUM_TOPICS):
+        """The persisted model, or a fresh one if none matches `num_topics`."""
+        try:
+            with np.load(os.path.join(path, MODEL_FILE)) as stored:
+                arrays = {name: stored[name] for name in stored.files}
+            meta = json.loads(str(arrays["meta"]))
+        except (FileNotFoundError, KeyError):
+            # no model yet, or one saved before the metadata moved into model.npz
+            return cls(num_topics)
+        if meta["num_topics"] != num_topics:
+            return cls(num_topics)
+        model = cls(num_topics, meta["seed"])
+        model.terms = meta["terms"]
+        model.term_index = {t: i for i, t in enumerate(model.terms)}
+        model.n_docs = meta["n_docs"]
+        model.seen = set(meta["seen"])
+        model.df, model.counts = arrays["df"], arrays["counts"]
+        model.centroids = arrays["centroids"] if arrays["centroids"].size else None
+        return model
+
+
+def compute_topics(grants, corpus, path=DEFAULT_TOPIC_DIR, num_topics=NUM_TOPICS):
+    """Update the persisted model with new cancelled grants and summarize topics.
+
+    Returns (topic per grant row, -1 if none; per-topic table with label,
+    top terms, cancelled grants and their total budget).
+    """
+    model = TopicModel.load(path, num_topics)
+    cancelled = grants[grants["terminated"]]
+    docs = cancelled["text_row"].to_numpy()
+    if "duplicate_cluster" in cancelled.columns:
+        # one document per collaborative project
+        first = ~cancelled["duplicate_cluster"].duplicated().to_numpy()
+        learned = model.update(corpus, docs[first], cancelled["grant_id"].to_numpy()[first])
+    else:
+        learned = model.update(corpus, docs, cancelled["grant_id"].to_numpy())
+    if learned:
+        model.save(path)
+
+    topic = pd.Series(-1, index=grants.index, dtype="int64")
+    topic[cancelled.index] = model.assign(corpus, docs)
+    terms = model.top_terms()
+    summary = pd.DataFrame({
+        "topic": range(num_topics),
+        "label": [" · ".join(t[:3]) or f"Topic {i + 1}" for i, t in enumerate(terms)],
+        "terms": [", ".join(t) for t in terms],
+    })
+    per_topic = (
+        grants.loc[cancelled.index]
+        .assign(topic=topic[cancelled.index])
+        .groupby("topic")
+        .agg(cancelled_grants=("grant_id", "size"), total_budget=("nsf_total_budget", "sum"))
+    )
+    summary = summary.join(per_topic, on="topic").fillna({"cancelled_grants": 0, "total_budget": 0})
+    summary["cancelled_grants"] = summary["cancelled_grants"].astype(int)
+    summary = summary[summary["cancelled_grants"] > 0]
+    return topic, summary.sort_values("cancelled_grants", ascending=False, ignore_index=True)
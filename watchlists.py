@@ -0,0 +1,199 @@
+"""Grant watchlists (the Cruz list, other congressional or agency lists) as bitsets.
+
+Membership used to be one hard-coded merge of the Cruz list into the grants
+frame. `Watchlists` keeps the grant ids of the current export once and stores
+each registered list as a bitset aligned to the grant rows (`np.packbits`, one
+bit per grant), so registering another list is a hash lookup of its ids, not a
+merge of the whole table. Unions, intersections, overlaps and Q5-style
+outcome breakdowns are bitwise AND/OR over the packed arrays plus a popcount.
+
+List files are CSVs (`,`, `;`, tab or `|` separated) with the grant ids in a `grant_id` or
+`grant_number` column; an optional `in_*` column marks which rows are members,
+as in the Cruz list. `Watchlists.sync()` registers every CSV under
+data/watchlists by file name, and on later calls only the new or changed ones,
+so a list dropped there shows up without rebuilding the dataset. Sync a
+`copy()` of a `Watchlists` other threads may be reading; registering is not
+thread-safe.
+"""
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_WATCHLIST_DIR = "data/watchlists"
+ID_COLUMNS = ["grant_id", "grant_number"]
+# set bits of every byte value
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.int64)
+
+
+def grant_keys(values):
+    """Grant ids as strings, so numeric and text ids of one grant compare equal."""
+    ids = pd.Series(values)
+    if pd.api.types.is_float_dtype(ids):
+        ids = ids.astype("Int64")
+    return ids.astype(str).str.strip().to_numpy()
+
+
+def watchlist_ids(frame):
+    """Member grant ids of a list file's rows."""
+    id_column = next((c for c in ID_COLUMNS if c in frame.columns), None)
+    if id_column is None:
+        raise ValueError(f"Watchlist has none of the id columns {ID_COLUMNS}: {list(frame.columns)}")
+    flag = next((c for c in frame.columns if c.startswith("in_")), None)
+    if flag is None:
+        return frame[id_column].dropna()
+    member = frame[flag]
+    if member.dtype != bool:
+        member = member.astype(str).str.strip().str.lower().isin(["true", "1", "yes"])
+    return frame.loc[member, id_column].dropna()
+
+
+def watchlist_files(directory=DEFAULT_WATCHLIST_DIR):
+    """{list name: (mtime_ns, size)} of the list files in `directory`."""
+    files = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.csv"))):
+        stat = os.stat(path)
+        files[os.path.splitext(os.path.basename(path))[0]] = (stat.st_mtime_ns, stat.st_size)
+    return files
+
+
+def read_watchlist(path):
+    """Member grant ids of a list file; the separator is taken from its header."""
+    with open(path, newline="") as f:
+        header = f.readline()
+    sep = next((s for s in (";", "\t", "|") if s in header), ",")
+    return watchlist_ids(pd.read_csv(path, sep=sep))
+
+
+class Watchlists:
+    """Per-list membership bitsets over the rows of one grants frame."""
+
+    def __init__(self, grant_ids):
+        self.keys = pd.Index(grant_keys(grant_ids))
+        self.n = len(self.keys)
+        self.bits = {}
+        self._files = {}
+        # list files that could not be read, with the reason
+        self.errors = {}
+        self._all = np.packbits(np.ones(self.n, dtype=bool))
+
+    @property
+    def names(self):
+        return list(self.bits)
+
+    def copy(self):
+        """A Watchlists over the same grants whose lists can be changed independently."""
+        other = Watchlists.__new__(Watchlists)
+        other.keys, other.n, other._all = self.keys, self.n, self._all
+        # bitsets are replaced on register, never modified, so they can be shared
+        other.bits, other._files, other.errors = dict(self.bits), dict(self._files), dict(self.errors)
+        return other
+
+    # === Registering ===
+
+    def register(self, name, ids):
+        """Add (or replace) list `name` from its member grant ids; returns the matched grants."""
+        return self.register_mask(name, self.keys.isin(grant_keys(ids)))
+
+    def register_frame(self, name, frame):
+        """Add list `name` from a list file's rows (see `watchlist_ids`)."""
+        return self.register(name, watchlist_ids(frame))
+
+    def register_mask(self, name, mask):
+        """Add list `name` from a boolean membership per grant row."""
+        mask = np.asarray(mask, dtype=bool)
+        if len(mask) != self.n:
+            raise ValueError(f"Membership of {name!r} has {len(mask)} rows, expected {self.n}")
+        self.bits[name] = np.packbits(mask)
+        return int(mask.sum())
+
+    def sync(self, directory=DEFAULT_WATCHLIST_DIR):
+        """Register the list files in `directory` that are new or changed; returns their names."""
+        changed = []
+        for name, stamp in watchlist_files(directory).items():
+            if self._files.get(name) == stamp:
+                continue
+            self._files[name] = stamp
+            try:
+                self.register(name, read_watchlist(os.path.join(directory, f"{name}.csv")))
+            except (ValueError, pd.errors.ParserError) as e:
+                self.errors[name] = str(e)
+                continue
+            self.errors.pop(name, None)
+            changed.append(name)
+        return changed
+
+    # === Bit operations ===
+
+    def pack(self, mask):
+        """A boolean per grant row (e.g. an outcome) as a bitset."""
+        return np.packbits(np.asarray(mask, dtype=bool))
+
+    def mask(self, bits):
+        """Boolean per grant row of a list name or a bitset."""
+        if isinstance(bits, str):
+            bits = self.bits[bits]
+        return np.unpackbits(bits, count=self.n).astype(bool)
+
+    def invert(self, bits):
+        return ~bits & self._all
+
+    def combine(self, names, how="any"):
+        """Bitset of the grants on any (union) or all (intersection) of `names`."""
+        if not names:
+            return np.zeros_like(self._all)
+        op = np.bitwise_or if how == "any" else np.bitwise_and
+        return op.reduce([self.bits[name] for name in names])
+
+    @staticmethod
+    def count(bits):
+        return int(POPCOUNT[bits].sum())
+
+    # === Reports ===
+
+    def sizes(self):
+        return pd.Series({name: self.count(bits) for name, bits in self.bits.items()}, dtype="int64")
+
+    def overlap(self, names=None):
+        """(lists x lists) grants on both lists; the diagonal is each list's size."""
+        names = self.names if names is None else list(names)
+        counts = [[self.count(self.bits[a] & self.bits[b]) for b in names] for a in names]
+        return pd.DataFrame(counts, index=pd.Index(names, name="list"), columns=names)
+
+    def breakdown(self, outcome, names=None, how="any", labels=("Terminated", "Reinstated")):
+        """Q5-style counts: grants on / off the combined `names` per outcome.
+
+        `outcome` is a boolean per grant row (or its bitset); `labels` name its
+        False and True values. Columns: member ("Yes"/"No"), status_label,
+        status_order, count, row_total, percentage.
+        """
+        names = self.names if names is None else list(names)
+        outcome = outcome if np.asarray(outcome).dtype == np.uint8 else self.pack(outcome)
+        on = self.combine(names, how)
+        rows = []
+        for member, bits in (("No", self.invert(on)), ("Yes", on)):
+            for order, status in ((0, self.invert(outcome)), (1, outcome)):
+                count = self.count(bits & status)
+                if count:
+                    rows.append({"member": member, "status_label": labels[order],
+                                 "status_order": order, "count": count})
+        table = pd.DataFrame(rows, columns=["member", "status_label", "status_order", "count"])
+        table["row_total"] = table.groupby("member")["count"].transform("sum")
+        table["percentage"] = (table["count"] / table["row_total"] * 100).round(1)
+        return table
+
+    def outcome_rates(self, outcome, names=None):
+        """Per list and for their union: members, how many have `outcome`, and the rate."""
+        names = self.names if names is None else list(names)
+        outcome = self.pack(outcome)
+        groups = [(name, self.bits[name]) for name in names]
+        if len(names) > 1:
+            groups.append(("Any watchlist", self.combine(names, "any")))
+        rows = []
+        for name, bits in groups:
+            members = self.count(bits)
+            hits = self.count(bits & outcome)
+            rows.append({"list": name, "grants": members, "with_outcome": hits,
+                         "rate": round(hits / members, 4) if members else float("nan")})
+        return pd.DataFrame(rows, columns=["list", "grants", "with_outcome", "rate"])